@@ -0,0 +1,197 @@
+"""Compares the MIME body extraction engine with the previous implementation.
+
+Builds a synthetic corpus of Gmail `format='full'` payloads (plain text,
+newsletter HTML, nested multipart with attachments, a very large HTML body)
+and reports throughput in MB of decoded body per second:
+
+    python benchmarks/bench_extract_text.py --messages 200
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+
+from agent.gmail_agent.tools.utils import decode_base64  # noqa: E402
+from agent.gmail_agent.tools.utils import extract_clean_text  # noqa: E402
+from agent.gmail_agent.tools.utils import html_to_text  # noqa: E402
+
+WORDS = (
+    'meeting invoice project update quarterly report lunch deadline team '
+    'review budget launch customer feedback schedule travel offer'
+).split()
+
+Payload = Dict[str, Any]
+
+
+def legacy_extract_clean_text(payload: Payload) -> str:
+    """The previous implementation, kept here for comparison."""
+    body = ''
+
+    if 'parts' in payload:
+        for part in payload['parts']:
+            if part['mimeType'] == 'text/plain':
+                body = decode_base64(part['body'].get('data', ''))
+            elif part['mimeType'] == 'text/html':
+                html_content = decode_base64(part['body'].get('data', ''))
+                soup = BeautifulSoup(html_content, 'html.parser')
+                body = soup.get_text(separator=' ')
+    else:
+        if payload['mimeType'] == 'text/plain':
+            body = decode_base64(payload['body'].get('data', ''))
+        elif payload['mimeType'] == 'text/html':
+            html_content = decode_base64(payload['body'].get('data', ''))
+            soup = BeautifulSoup(html_content, 'html.parser')
+            body = soup.get_text(separator=' ')
+
+    body = re.sub(r'[\u200B\u200C\u00AD\u034F]', '', body)
+    body = re.sub(r'http[s]?://\S+', '', body)
+    body = ' '.join(body.split())
+    return body
+
+
+def leaf(mime_type: str, text: str, filename: str = '') -> Payload:
+    data = base64.urlsafe_b64encode(text.encode()).decode()
+    return {
+        'mimeType': mime_type, 'filename': filename,
+        'body': {'size': len(text), 'data': data},
+    }
+
+
+def multipart(mime_type: str, *parts: Payload) -> Payload:
+    return {'mimeType': mime_type, 'body': {'size': 0}, 'parts': list(parts)}
+
+
+def paragraphs(rng: random.Random, n: int) -> List[str]:
+    return [
+        ' '.join(rng.choices(WORDS, k=40)) + ' https://example.com/x?id=1'
+        for _ in range(n)
+    ]
+
+
+def newsletter(rng: random.Random, n: int) -> str:
+    rows = ''.join(
+        f'<tr><td style="padding:8px;font-family:Arial">'
+        f'<a href="https://example.com/{i}">{text}</a>&nbsp;&amp;</td></tr>'
+        for i, text in enumerate(paragraphs(rng, n))
+    )
+    return (
+        '<html><head><style>td {color: #333}</style></head><body>'
+        '<script>var tracking = 1;</script>'
+        f'<table width="600">{rows}</table></body></html>'
+    )
+
+
+def corpus(n_messages: int, seed: int = 0) -> List[Payload]:
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(n_messages):
+        text = '\n\n'.join(paragraphs(rng, 20))
+        html = newsletter(rng, 20)
+        kind = i % 4
+        if kind == 0:
+            payloads.append(leaf('text/plain', text))
+        elif kind == 1:
+            payloads.append(leaf('text/html', html))
+        elif kind == 2:
+            payloads.append(
+                multipart(
+                    'multipart/alternative',
+                    leaf('text/plain', text), leaf('text/html', html),
+                ),
+            )
+        else:
+            payloads.append(
+                multipart(
+                    'multipart/mixed',
+                    multipart(
+                        'multipart/alternative',
+                        leaf('text/plain', text), leaf('text/html', html),
+                    ),
+                    leaf('application/pdf', 'x' * 50_000, 'report.pdf'),
+                ),
+            )
+    # A few very large marketing emails
+    for _ in range(max(1, n_messages // 100)):
+        payloads.append(leaf('text/html', newsletter(rng, 20_000)))
+    return payloads
+
+
+def body_bytes(payload: Payload) -> int:
+    """Bytes of text the previous implementation had to decode."""
+    if 'parts' in payload:
+        return sum(map(body_bytes, payload['parts']))
+    if payload['mimeType'].startswith('text/'):
+        return payload['body']['size']
+    return 0
+
+
+def throughput(
+    fn: Callable[[Payload], str], payloads: List[Payload], repeat: int,
+) -> float:
+    total = sum(map(body_bytes, payloads))
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return total / best / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    payloads = corpus(args.messages)
+    total = sum(map(body_bytes, payloads)) / 1e6
+    print(f'corpus: {len(payloads)} messages, {total:.1f} MB of text parts')
+
+    missed = sum(
+        1 for payload in payloads
+        if extract_clean_text(payload)
+        and not legacy_extract_clean_text(payload)
+    )
+    print(f'bodies only found by the new engine: {missed}')
+
+    print('full extraction:')
+    for name, fn in (
+        ('previous', legacy_extract_clean_text),
+        ('engine', extract_clean_text),
+    ):
+        rate = throughput(fn, payloads, args.repeat)
+        print(f'{name:<10} {rate:8.1f} MB/s')
+
+    # HTML conversion alone, on the same bytes and without the size cap
+    html = newsletter(random.Random(1), 5_000)
+
+    def soup_text() -> str:
+        return BeautifulSoup(html, 'html.parser').get_text(separator=' ')
+
+    for name, convert in (
+        ('BeautifulSoup', soup_text),
+        ('html_to_text', lambda: html_to_text(html)),
+    ):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            convert()
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f'{name:<14} {len(html) / elapsed / 1e6:8.1f} MB/s (HTML only)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Compares sequential and concurrent dispatch of cross-domain requests.
+
+Runs the supervisor and the two worker nodes of the main graph offline: the
+supervisor model is scripted and the Gmail and Calendar subgraphs are
+replaced by stubs that sleep for a simulated latency. A request with an
+independent Gmail part and Calendar part is handled once worker by worker
+(supervisor → gmail → supervisor → calendar → supervisor) and once with
+both workers dispatched together, reporting the supervisor calls and the
+wall-clock time of each:
+
+    python benchmarks/bench_fan_out.py --llm-latency 0.8 --agent-latency 4
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+# Offline settings, applied before the agent modules read them
+for _name, _value in {
+    'AZURE_OPENAI_API_KEY': 'offline',
+    'AZURE_OPENAI_ENDPOINT': 'https://offline.openai.azure.com',
+    'OPENAI_API_VERSION': '2024-06-01',
+    'CHECKPOINTER_URL': 'memory',
+    'MEMORY_STORE_PATH': '',
+    'LLM_CACHED_NODES': '',
+}.items():
+    os.environ.setdefault(_name, _value)
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.messages import HumanMessage  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+from langgraph.graph import START  # noqa: E402
+from langgraph.graph import StateGraph  # noqa: E402
+
+from agent import main_graph_nodes as nodes  # noqa: E402
+from agent.state import AssistantState  # noqa: E402
+
+REQUEST = (
+    'Summarize my unread emails and list my meetings for tomorrow.'
+)
+
+
+class StubAgent:
+    """Subgraph stand-in answering after `latency` seconds."""
+
+    def __init__(self, name: str, latency: float) -> None:
+        self.name = name
+        self.latency = latency
+
+    async def astream(self, inputs: dict, config=None):
+        await asyncio.sleep(self.latency)
+        yield {
+            'messages': inputs['messages'] + [
+                AIMessage(content=f'{self.name} is done.'),
+            ],
+        }
+
+
+def scripted_supervisor(routes: List[str], latency: float, calls: list):
+    """Returns a supervisor model answering `routes` in turn."""
+    async def respond(_):
+        calls.append(routes[len(calls)])
+        await asyncio.sleep(latency)
+        return {'next': calls[-1]}
+    return RunnableLambda(respond)
+
+
+def build_graph():
+    builder = StateGraph(AssistantState)
+    builder.add_edge(START, 'supervisor')
+    builder.add_node('supervisor', nodes.supervisor_node)
+    builder.add_node('calendar_agent', nodes.calendar_agent_node)
+    builder.add_node('gmail_agent', nodes.gmail_agent_node)
+    return builder.compile()
+
+
+async def run(routes: List[str], llm_latency: float) -> tuple:
+    calls: list = []
+    supervisor = scripted_supervisor(routes, llm_latency, calls)
+    nodes.structured_llm = lambda schema, node: supervisor
+    graph = build_graph()
+    start = time.perf_counter()
+    result = await graph.ainvoke(
+        {'messages': [HumanMessage(content=REQUEST)]},
+    )
+    elapsed = time.perf_counter() - start
+    replies = [
+        message.name for message in result['messages']
+        if message.name in nodes.PARALLEL_WORKERS
+    ]
+    return len(calls), elapsed, replies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--llm-latency', type=float, default=0.8)
+    parser.add_argument('--agent-latency', type=float, default=4.0)
+    args = parser.parse_args()
+
+    # The nodes print and log every call; keep the report readable
+    logging.disable(logging.INFO)
+    devnull = open(os.devnull, 'w')
+    calendar_agent = StubAgent('calendar_agent', args.agent_latency)
+    gmail_agent = StubAgent('gmail_agent', args.agent_latency)
+    nodes.get_calendar_agent = lambda: calendar_agent
+    nodes.get_gmail_agent = lambda: gmail_agent
+
+    # The first run imports and creates the clients the nodes use
+    with contextlib.redirect_stdout(devnull):
+        asyncio.run(run(['FINISH'], 0))
+
+    for name, routes in [
+        ('sequential', ['gmail_agent', 'calendar_agent', 'FINISH']),
+        ('fan-out', ['both', 'FINISH']),
+    ]:
+        with contextlib.redirect_stdout(devnull):
+            calls, elapsed, replies = asyncio.run(
+                run(routes, args.llm_latency),
+            )
+        print(
+            f'{name:<11} {calls} supervisor calls  {elapsed:6.2f} s  '
+            f"replies: {', '.join(replies)}",
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Compares sequential and batched metadata fetches in fetch_inbox_messages.
+
+Runs against a local fake Gmail endpoint with a fixed per-request latency:
+
+    python benchmarks/bench_fetch_inbox.py --messages 50 --latency 0.02
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+
+from agent.gmail_agent.tools.utils import batch_get_messages  # noqa: E402
+from fake_gmail import FakeGmailServer  # noqa: E402
+
+METADATA = {'format': 'metadata', 'metadataHeaders': ['Subject', 'From']}
+
+
+def sequential(service: Any, message_ids: List[str]) -> List[Any]:
+    """The previous implementation: one messages.get round trip each."""
+    return [
+        service.users().messages().get(
+            userId='me', id=msg_id, **METADATA,
+        ).execute()
+        for msg_id in message_ids
+    ]
+
+
+def batched(service: Any, message_ids: List[str]) -> List[Any]:
+    return batch_get_messages(service, message_ids, **METADATA)
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with FakeGmailServer(args.messages, args.latency) as server:
+        service = server.service()
+        listing = service.users().messages().list(userId='me').execute()
+        message_ids = [m['id'] for m in listing['messages']]
+
+        assert sequential(service, message_ids) == batched(
+            service, message_ids,
+        )
+
+        seq = timed(lambda: sequential(service, message_ids), args.repeat)
+        bat = timed(lambda: batched(service, message_ids), args.repeat)
+
+    print(
+        f'{len(message_ids)} messages, {args.latency * 1000:.0f} ms '
+        'latency per request',
+    )
+    print(f'sequential messages.get: {seq * 1000:8.1f} ms')
+    print(f'batched messages.get:    {bat * 1000:8.1f} ms')
+    print(f'speedup:                 {seq / bat:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Measures search latency of the long-term memory stores.
+
+Fills a `NumpyVectorStore` and, for comparison, LangGraph's `InMemoryStore`
+with synthetic memories spread over many users, using a local embedder so
+no Azure calls are made, then reports the search latency for one user's
+namespace, the time to reopen the persisted store and how often the query
+embedding cache saved an embedding call:
+
+    python benchmarks/bench_memory_store.py --memories 200000 --dims 1536
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langgraph.store.base import PutOp
+from langgraph.store.memory import InMemoryStore
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+
+from agent.shared.vector_store import NumpyVectorStore  # noqa: E402
+
+WORDS = (
+    'meeting invoice project dentist birthday flight hotel budget manager '
+    'sister vegetarian allergy gym tennis piano deadline report travel'
+).split()
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic random vectors seeded by the text, counting calls."""
+
+    def __init__(self, dims: int) -> None:
+        self.dims = dims
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode()).digest()
+        seed = int.from_bytes(digest[:8], 'big')
+        return np.random.default_rng(seed).standard_normal(
+            self.dims, dtype=np.float32,
+        ).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        return self._vector(text)
+
+
+def fill(store, n: int, users: int, rng: random.Random) -> None:
+    batch = []
+    for i in range(n):
+        text = ' '.join(rng.choices(WORDS, k=8)) + f' #{i}'
+        namespace = (f'user-{i % users}', 'memories')
+        batch.append(PutOp(namespace, str(i), {'data': text}))
+        if len(batch) == 5000:
+            store.batch(batch)
+            batch = []
+    if batch:
+        store.batch(batch)
+
+
+def search_latency(store, users: int, queries: int) -> List[float]:
+    rng = random.Random(1)
+    timings = []
+    for _ in range(queries):
+        user = rng.randrange(users)
+        query = ' '.join(rng.choices(WORDS, k=4))
+        start = time.perf_counter()
+        store.search((f'user-{user}', 'memories'), query=query, limit=2)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: List[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f'{name:<16} p50 {statistics.median(timings):7.2f} ms  '
+        f'p95 {p95:7.2f} ms',
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--memories', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--dims', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument(
+        '--compare', type=int, default=20_000,
+        help='memories loaded into InMemoryStore for comparison (0 skips)',
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        embeddings = HashEmbeddings(args.dims)
+        index = {'embed': embeddings, 'dims': args.dims}
+        store = NumpyVectorStore(path, index=index)
+        start = time.perf_counter()
+        fill(store, args.memories, args.users, random.Random(0))
+        print(
+            f'{args.memories} memories, {args.users} users, {args.dims} dims: '
+            f'filled in {time.perf_counter() - start:.1f} s',
+        )
+        report('numpy', search_latency(store, args.users, args.queries))
+
+        calls = embeddings.calls
+        search_latency(store, args.users, args.queries)
+        print(
+            f'repeated queries: {embeddings.calls - calls} embedding calls '
+            f'for {args.queries} searches',
+        )
+
+        start = time.perf_counter()
+        reopened = NumpyVectorStore(path, index=index)
+        print(f'reopened in {time.perf_counter() - start:.2f} s')
+        report('numpy reopened', search_latency(
+            reopened, args.users, args.queries,
+        ))
+
+    if args.compare:
+        memory = InMemoryStore(index={'embed': HashEmbeddings(args.dims)})
+        fill(memory, args.compare, args.users, random.Random(0))
+        report(
+            f'InMemoryStore@{args.compare // 1000}k',
+            search_latency(memory, args.users, min(args.queries, 50)),
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Measures search_emails latency over a synthetic mailbox.
+
+Fills a temporary Gmail mirror with synthetic messages, embeds them with a
+deterministic hashing embedder (no network), and times keyword-only and
+hybrid queries:
+
+    python benchmarks/bench_search_emails.py --messages 100000 --dimensions 256
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Dict
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+
+from agent.gmail_agent.tools.mirror import GmailMirror  # noqa: E402
+from agent.gmail_agent.tools.search import EmailSearchIndex  # noqa: E402
+
+WORDS = (
+    'invoice payment meeting schedule project report budget review team '
+    'release deadline contract proposal travel flight hotel booking order '
+    'shipping delivery receipt subscription renewal account security alert '
+    'password newsletter webinar conference agenda minutes feedback survey '
+    'offer discount sale event party birthday holiday vacation lunch dinner'
+).split()
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark']
+QUERIES = [
+    'invoice from Acme',
+    'flight booking confirmation',
+    'security alert password',
+    'project deadline review with Globex',
+    'holiday party',
+]
+
+
+def hashing_embedder(dimensions: int):
+    """A bag-of-words embedder: similar texts get similar vectors."""
+    word_vectors: Dict[str, np.ndarray] = {}
+
+    def word_vector(word: str) -> np.ndarray:
+        if word not in word_vectors:
+            rng = np.random.default_rng(zlib.crc32(word.encode()))
+            word_vectors[word] = rng.standard_normal(dimensions)
+        return word_vectors[word]
+
+    def embed(text: str) -> List[float]:
+        vector = np.zeros(dimensions)
+        for word in text.lower().split():
+            vector += word_vector(word)
+        return vector.tolist()
+
+    return embed
+
+
+def build_mailbox(path: str, n_messages: int) -> GmailMirror:
+    mirror = GmailMirror(path)
+    rng = random.Random(0)
+    # Topic words are mixed with a long Zipf-like tail of filler words
+    filler = [f'word{i}' for i in range(20_000)]
+    filler_weights = [1 / (rank + 1) for rank in range(len(filler))]
+    now_ms = int(time.time() * 1000)
+    for i in range(n_messages):
+        company = rng.choice(COMPANIES)
+        subject = ' '.join(rng.choices(WORDS, k=4)).capitalize()
+        words = rng.choices(WORDS, k=10) + rng.choices(
+            filler, weights=filler_weights, k=50,
+        )
+        rng.shuffle(words)
+        body = ' '.join(words) + f' regards {company}'
+        mirror.store_message(
+            {
+                'id': f'msg{i:07d}',
+                'threadId': f'thread{i:07d}',
+                'internalDate': str(now_ms - i * 60_000),
+                'labelIds': ['INBOX'],
+                'snippet': body[:100],
+                'payload': {
+                    'headers': [
+                        {'name': 'Subject', 'value': subject},
+                        {
+                            'name': 'From',
+                            'value': f'{company} <billing@{company}.com>',
+                        },
+                        {'name': 'Date', 'value': 'Mon, 1 Jan 2024 10:00'},
+                    ],
+                },
+            },
+            body=body,
+            user='bench',
+        )
+    return mirror
+
+
+def percentiles(samples: List[float]) -> str:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    return (
+        f'p50 {statistics.median(samples) * 1000:7.2f} ms   '
+        f'p95 {p95 * 1000:7.2f} ms'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=100_000)
+    parser.add_argument('--dimensions', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    embed = hashing_embedder(args.dimensions)
+    with tempfile.TemporaryDirectory() as directory:
+        path = f'{directory}/gmail_mirror.db'
+
+        start = time.perf_counter()
+        build_mailbox(path, args.messages)
+        keyword = EmailSearchIndex(path)
+        print(
+            f'mirrored + FTS-indexed {args.messages} messages in '
+            f'{time.perf_counter() - start:.1f} s',
+        )
+
+        hybrid = EmailSearchIndex(
+            path,
+            embed_documents=lambda texts: [embed(t) for t in texts],
+            embed_query=embed,
+            embed_batch=5_000,
+        )
+        start = time.perf_counter()
+        while hybrid.update_embeddings(user='bench'):
+            pass
+        print(
+            f'embedded {args.messages} messages ({args.dimensions} dims) in '
+            f'{time.perf_counter() - start:.1f} s',
+        )
+        # Load the vector matrix before timing queries
+        hybrid.search(QUERIES[0], user='bench')
+
+        for name, index in (('keyword (BM25)', keyword), ('hybrid', hybrid)):
+            samples = []
+            for _ in range(args.repeat):
+                for query in QUERIES:
+                    start = time.perf_counter()
+                    index.search(query, limit=10, user='bench')
+                    samples.append(time.perf_counter() - start)
+            print(f'{name:15s} {percentiles(samples)}')
+
+        top = hybrid.search(QUERIES[0], limit=3, user='bench')
+        print(f'top hits for {QUERIES[0]!r}:')
+        for hit in top:
+            print(f"  {hit['sender']:30s} {hit['subject']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Measures the cold start of the assistant.
+
+Each run starts a fresh interpreter, without network access or Azure
+credentials, and times importing `agent.main_graph`, then compiling the
+graph with `get_graph()`. It also lists the heavy modules the import pulled
+in; they should only be loaded when first used:
+
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --max-import 1.5
+
+With `--max-import`, the exit status is 1 when the median import time
+exceeds the limit or a heavy module is loaded on import.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict
+from typing import List
+
+SRC = Path(__file__).parents[1] / 'src'
+
+# Modules the import of the graph must not load
+HEAVY_MODULES = (
+    'langchain_openai', 'openai', 'googleapiclient',
+    'google.oauth2.credentials', 'google_auth_oauthlib', 'httplib2', 'bs4',
+    'numpy',
+)
+
+# Runs in the fresh interpreter and prints its measurements as JSON
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import agent.main_graph
+imported = time.perf_counter()
+heavy = sorted(
+    name for name in {HEAVY_MODULES!r}
+    if name in sys.modules
+)
+agent.main_graph.get_graph()
+compiled = time.perf_counter()
+print(json.dumps({{
+    'import': imported - start,
+    'compile': compiled - imported,
+    'heavy': heavy,
+}}))
+"""
+
+
+def probe(env: Dict[str, str]) -> dict:
+    output = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', PROBE],
+        cwd=SRC, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(name: str, timings: List[float]) -> None:
+    print(
+        f'{name:<8} median {statistics.median(timings):6.3f} s  '
+        f'min {min(timings):6.3f} s',
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument(
+        '--max-import', type=float,
+        help='fail when the median import time exceeds this many seconds',
+    )
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench-startup-')
+    env = {
+        **os.environ,
+        'PYTHONPATH': str(SRC),
+        'AZURE_OPENAI_API_KEY': 'offline',
+        'AZURE_OPENAI_ENDPOINT': 'https://offline.openai.azure.com',
+        'OPENAI_API_VERSION': '2024-06-01',
+        'CHECKPOINTER_URL': 'memory',
+        'MEMORY_STORE_PATH': os.path.join(tmp, 'memory_store'),
+        'LLM_CACHE_PATH': os.path.join(tmp, 'llm_cache.db'),
+    }
+    # The first run warms the OS file cache and writes the bytecode
+    probe(env)
+    results = [probe(env) for _ in range(args.runs)]
+
+    imports = [result['import'] for result in results]
+    report('import', imports)
+    report('compile', [result['compile'] for result in results])
+    heavy = results[-1]['heavy']
+    print(f"heavy modules on import: {', '.join(heavy) or 'none'}")
+
+    if args.max_import is not None:
+        failed = False
+        if statistics.median(imports) > args.max_import:
+            print(f'REGRESSION import slower than {args.max_import} s')
+            failed = True
+        if heavy:
+            print('REGRESSION heavy modules loaded on import')
+            failed = True
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Measures how well the local pre-classifier agrees with the LLM classifier.
+
+Reads user messages from a JSONL file of `{"text": ..., "label": ...}`
+lines, where `label` is the LLM classifier's answer ('normal' or
+'advanced'). Without `--data` a small built-in sample is used. Lines
+without a label are labelled by calling the LLM when `--llm` is given
+(this needs the Azure settings), and `--save` writes the labelled set back
+so later runs are offline:
+
+    python benchmarks/eval_pre_classifier.py
+    python benchmarks/eval_pre_classifier.py --data msgs.jsonl --llm --save
+
+For each confidence threshold it reports how many LLM calls would be
+skipped and how often the local decision matches the LLM.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Dict
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+
+from agent.pre_classifier import PreClassifier  # noqa: E402
+
+SAMPLE = [
+    ('How do I write a professional email?', 'normal'),
+    ('Send an email to my manager saying I will be late.', 'advanced'),
+    ("What's the best way to organize my calendar?", 'normal'),
+    ('Schedule a meeting with Sarah next Monday at 10 AM.', 'advanced'),
+    ('Give me tips to manage email overload.', 'normal'),
+    ("What's on my calendar tomorrow?", 'advanced'),
+    ('Do I have any new emails?', 'advanced'),
+    ('Show me my last 5 emails', 'advanced'),
+    ('Am I free on Friday afternoon?', 'advanced'),
+    ('Cancel my dentist appointment', 'advanced'),
+    ('Reply to the email from John and say thanks', 'advanced'),
+    ('Check my inbox', 'advanced'),
+    ('Delete the team sync event this week', 'advanced'),
+    ('Forward the invoice email to accounting', 'advanced'),
+    ('Any unread messages from Alice?', 'advanced'),
+    ('hi', 'normal'),
+    ('Thanks, that is all', 'normal'),
+    ('Explain how a transformer model works', 'normal'),
+    ('Write a poem about autumn', 'normal'),
+    ('Translate "good morning" into Spanish', 'normal'),
+    ('What is the capital of Australia?', 'normal'),
+    ('Write a python function that reverses a list', 'normal'),
+    ('Why is the sky blue?', 'normal'),
+    ('Give me a recipe for pancakes', 'normal'),
+    ('What are good practices for running a meeting?', 'normal'),
+    ('Yes, go ahead', 'advanced'),
+    ('Book a call with the design team tomorrow at 3pm', 'advanced'),
+    ('Summarize the latest email from my bank', 'advanced'),
+    ('Who is the president of France?', 'normal'),
+    ('Tell me about the history of email', 'normal'),
+]
+
+THRESHOLDS = [0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99]
+
+
+def load(path: str) -> List[Dict[str, str]]:
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def label_with_llm(rows: List[Dict[str, str]]) -> None:
+    from langchain_core.messages import HumanMessage
+
+    from agent.main_graph_nodes import llm_classify
+
+    for row in rows:
+        if not row.get('label'):
+            row['label'] = asyncio.run(
+                llm_classify(HumanMessage(content=row['text'])),
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data', help='JSONL file of labelled messages')
+    parser.add_argument(
+        '--llm', action='store_true',
+        help='label unlabelled lines with the LLM',
+    )
+    parser.add_argument(
+        '--save', action='store_true', help='write the labels back to --data',
+    )
+    args = parser.parse_args()
+
+    if args.data:
+        rows = load(args.data)
+    else:
+        rows = [{'text': text, 'label': label} for text, label in SAMPLE]
+    if args.llm:
+        label_with_llm(rows)
+    if args.save and args.data:
+        with open(args.data, 'w', encoding='utf-8') as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+    rows = [row for row in rows if row.get('label')]
+    if not rows:
+        sys.exit('No labelled messages; pass --llm to label them.')
+
+    model = PreClassifier()
+    predictions = [model.predict(row['text']) for row in rows]
+    print(f'{len(rows)} labelled messages')
+    print('threshold  skipped  agreement(skipped)  agreement(overall)')
+    for threshold in THRESHOLDS:
+        skipped = agree = 0
+        for row, (label, confidence) in zip(rows, predictions):
+            if confidence >= threshold:
+                skipped += 1
+                agree += label == row['label']
+        # Messages left to the LLM agree with it by definition
+        overall = (agree + len(rows) - skipped) / len(rows)
+        print(
+            f'{threshold:9.2f}  {skipped / len(rows):7.0%}  '
+            f'{agree / skipped if skipped else 1:18.0%}  {overall:18.0%}',
+        )
+
+    print('\nconfident disagreements at the default threshold:')
+    for row, (label, confidence) in zip(rows, predictions):
+        if confidence >= model.threshold and label != row['label']:
+            print(f"  {confidence:.2f} {label:<8} {row['text']}")
+
+
+if __name__ == '__main__':
+    main()
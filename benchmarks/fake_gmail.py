@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+import urllib.parse
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+from typing import Dict
+from typing import Tuple
+
+import httplib2
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+MESSAGE_PATH = re.compile(r'^/gmail/v1/users/[^/]+/messages/([^/?]+)')
+LIST_PATH = re.compile(r'^/gmail/v1/users/[^/]+/messages/?$')
+
+
+def fake_message(msg_id: str) -> Dict[str, Any]:
+    return {
+        'id': msg_id,
+        'threadId': msg_id,
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [
+                {'name': 'Subject', 'value': f'Subject of {msg_id}'},
+                {'name': 'From', 'value': f'sender-{msg_id}@example.com'},
+            ],
+            'body': {'data': ''},
+        },
+    }
+
+
+class FakeGmailServer:
+    """A local stand-in for the Gmail API with a fixed per-request latency.
+
+    Serves `messages.list`, `messages.get` and the `/batch`
+    endpoint, which is enough to exercise the inbox tools without network.
+    Message IDs listed in `failing_ids` answer with a 404.
+    """
+
+    def __init__(
+        self, n_messages: int = 50, latency: float = 0.02,
+        failing_ids: Tuple[str, ...] = (),
+    ) -> None:
+        self.n_messages = n_messages
+        self.latency = latency
+        self.failing_ids = set(failing_ids)
+        self.requests = 0
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True,
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self) -> FakeGmailServer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def service(self) -> Any:
+        """Builds a Gmail service object whose requests hit this server."""
+        document = json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+        document['rootUrl'] = f'{self.url}/'
+        return build_from_document(document, http=httplib2.Http())
+
+    def answer(self, method: str, path: str) -> Tuple[int, Dict[str, Any]]:
+        path = urllib.parse.urlsplit(path).path
+        if method == 'GET' and LIST_PATH.match(path):
+            ids = [f'msg{i:05d}' for i in range(self.n_messages)]
+            return 200, {'messages': [{'id': i, 'threadId': i} for i in ids]}
+        match = MESSAGE_PATH.match(path)
+        if method == 'GET' and match:
+            msg_id = match.group(1)
+            if msg_id in self.failing_ids:
+                return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+            return 200, fake_message(msg_id)
+        return 404, {'error': {'code': 404, 'message': 'Unknown path'}}
+
+    def _batch(self, content_type: str, body: bytes) -> Tuple[str, bytes]:
+        request = BytesParser(policy=HTTP).parsebytes(
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + body,
+        )
+        boundary = 'batch_fake_gmail'
+        chunks = []
+        for part in request.iter_parts():
+            request_line = part.get_payload(decode=True).decode().split('\n')
+            method, path = request_line[0].split(' ')[:2]
+            status, payload = self.answer(method, path)
+            content_id = part['Content-ID'].strip('<>')
+            chunks.append(
+                f'--{boundary}\r\n'
+                'Content-Type: application/http\r\n'
+                f'Content-ID: <response-{content_id}>\r\n\r\n'
+                f'HTTP/1.1 {status} OK\r\n'
+                'Content-Type: application/json\r\n\r\n'
+                f'{json.dumps(payload)}\r\n',
+            )
+        chunks.append(f'--{boundary}--\r\n')
+        return (
+            f'multipart/mixed; boundary={boundary}',
+            ''.join(chunks).encode(),
+        )
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send(self, status: int, content_type: str, body: bytes):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                server.requests += 1
+                time.sleep(server.latency)
+                status, payload = server.answer('GET', self.path)
+                self._send(
+                    status, 'application/json', json.dumps(payload).encode(),
+                )
+
+            def do_POST(self) -> None:
+                server.requests += 1
+                time.sleep(server.latency)
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                if self.path.startswith('/batch'):
+                    content_type, payload = server._batch(
+                        self.headers['Content-Type'], body,
+                    )
+                    self._send(200, content_type, payload)
+                else:
+                    self._send(404, 'application/json', b'{}')
+
+        return Handler
@@ -0,0 +1,322 @@
+"""Offline micro-benchmarks of the assistant's hot functions.
+
+Runs without network access or Azure credentials. For each benchmark it
+reports operations per second (best of several rounds) and the memory one
+operation allocates at its peak, measured with tracemalloc:
+
+    python benchmarks/microbench.py
+    python benchmarks/microbench.py --save baseline.json
+    python benchmarks/microbench.py --compare baseline.json --tolerance 0.2
+    python benchmarks/microbench.py --filter calendar
+
+With `--compare`, a benchmark whose throughput dropped, or whose peak
+allocation grew, by more than the tolerance is flagged as a regression and
+the exit status is 1.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+
+# Offline settings, applied before the agent modules read them
+_tmp = tempfile.mkdtemp(prefix='microbench-')
+for _name, _value in {
+    'AZURE_OPENAI_API_KEY': 'offline',
+    'AZURE_OPENAI_ENDPOINT': 'https://offline.openai.azure.com',
+    'OPENAI_API_VERSION': '2024-06-01',
+    'CHECKPOINTER_URL': 'memory',
+    'MEMORY_STORE_PATH': '',
+    'LLM_CACHED_NODES': '',
+    'PERSONAL_INFO_PATH': os.path.join(_tmp, 'personal_info.json'),
+}.items():
+    os.environ.setdefault(_name, _value)
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+
+Op = Callable[[], Any]
+BENCHMARKS: Dict[str, Callable[[], Op]] = {}
+
+
+def benchmark(name: str) -> Callable[[Callable[[], Op]], Callable[[], Op]]:
+    """Registers a setup function that returns the operation to time."""
+    def register(setup: Callable[[], Op]) -> Callable[[], Op]:
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+@benchmark('gmail.extract_clean_text')
+def bench_extract_clean_text() -> Op:
+    from bench_extract_text import corpus
+
+    from agent.gmail_agent.tools.utils import extract_clean_text
+
+    payloads = corpus(40)
+
+    def op() -> None:
+        for payload in payloads:
+            extract_clean_text(payload)
+    return op
+
+
+@benchmark('gmail.decode_base64')
+def bench_decode_base64() -> Op:
+    from agent.gmail_agent.tools.utils import decode_base64
+
+    text = ('Hello Anna, the quarterly report is attached. ' * 200).encode()
+    data = base64.urlsafe_b64encode(text).decode().rstrip('=')
+    return lambda: decode_base64(data)
+
+
+@benchmark('calendar.format_events')
+def bench_format_events() -> Op:
+    from agent.calendar_agent.tools.non_sensitive_tools import format_events
+
+    rng = random.Random(0)
+    start = datetime.datetime(2025, 1, 6, 9)
+    events: List[Dict[str, Any]] = []
+    for i in range(50):
+        begin = start + datetime.timedelta(hours=3 * i)
+        event: Dict[str, Any] = {
+            'id': f'evt{i:04d}abcdef',
+            'calendar': rng.choice(['Work', 'Family', 'Gym']),
+            'start': begin.isoformat() + '+01:00',
+            'end': (begin + datetime.timedelta(hours=1)).isoformat()
+            + '+01:00',
+            'summary': rng.choice(['Standup', 'Dentist', '1:1', 'Review']),
+        }
+        if i % 3 == 0:
+            event['location'] = 'Room 4.02, Main Street 12'
+        if i % 4 == 0:
+            event['description'] = 'Agenda: status, risks, next steps. ' * 4
+        events.append(event)
+    return lambda: format_events(50, events, ['Holidays (timed out)'])
+
+
+@benchmark('calendar.validate_datetime')
+def bench_validate_datetime() -> Op:
+    from agent.calendar_agent.tools.sensitive_tools import validate_datetime
+
+    values = [
+        '2025-03-14T09:30:00Z', '2025-03-14T09:30:00+01:00',
+        '2025-03-14 09:30', 'tomorrow at 10',
+    ]
+
+    def op() -> None:
+        for value in values:
+            validate_datetime(value)
+    return op
+
+
+@benchmark('personal_info.read')
+def bench_read_personal_info() -> Op:
+    from agent.shared.utils import read_personal_info
+    from agent.shared.utils import save_personal_info
+
+    save_personal_info('name', 'Anna')
+    save_personal_info('token_access_path', 'anna@example.com.json')
+    return read_personal_info
+
+
+@benchmark('personal_info.save')
+def bench_save_personal_info() -> Op:
+    from agent.shared.utils import save_personal_info
+
+    counter = iter(range(10**9))
+    return lambda: save_personal_info('last_seen', str(next(counter)))
+
+
+@benchmark('memory_store.search')
+def bench_memory_store_search() -> Op:
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langgraph.store.base import PutOp
+
+    from agent.shared.vector_store import NumpyVectorStore
+
+    dims = 256
+    store = NumpyVectorStore(
+        tempfile.mkdtemp(dir=_tmp),
+        index={'embed': DeterministicFakeEmbedding(size=dims), 'dims': dims},
+    )
+    store.batch(
+        PutOp(
+            (f'user-{i % 20}', 'memories'), str(i),
+            {'data': f'memory number {i} about topic {i % 97}'},
+        )
+        for i in range(20_000)
+    )
+    namespace = ('user-3', 'memories')
+    return lambda: store.search(namespace, query='topic 42', limit=2)
+
+
+@benchmark('graph.classifier_to_supervisor')
+def bench_routing() -> Op:
+    from langchain_core.messages import HumanMessage
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import END
+    from langgraph.graph import START
+    from langgraph.graph import StateGraph
+
+    from agent import main_graph_nodes as nodes
+    from agent.main_graph_nodes import ClassificationOutput
+    from agent.state import AssistantState
+
+    # Stub models: the LLM classifier says 'advanced', the supervisor ends
+    stubs = {
+        'classifier': RunnableLambda(
+            lambda _: ClassificationOutput(classification='advanced'),
+        ),
+        'supervisor': RunnableLambda(lambda _: {'next': 'FINISH'}),
+    }
+    nodes.structured_llm = lambda schema, node: stubs[node]
+
+    builder = StateGraph(AssistantState)
+    builder.add_edge(START, 'classifier')
+    builder.add_node('classifier', nodes.classifier_node)
+    builder.add_node('supervisor', nodes.supervisor_node)
+    for name in ('normal_chatbot', 'calendar_agent', 'gmail_agent'):
+        builder.add_node(name, lambda state: {})
+        builder.add_edge(name, END)
+    graph = builder.compile()
+
+    # Ambiguous enough that the pre-classifier defers to the classifier LLM
+    inputs = {'messages': [HumanMessage(content='Can you handle Tom for me?')]}
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(graph.ainvoke(inputs))
+
+
+def measure(op: Op, min_time: float, rounds: int) -> Dict[str, float]:
+    """
+    Times `op` and measures its allocations.
+
+    Returns:
+        Dict[str, float]: `ops_per_sec`, the best of `rounds` rounds of at
+        least `min_time` seconds each, and `peak_kib`, the largest memory
+        peak of a single call while tracing allocations.
+    """
+    op()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    best = elapsed / number
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        best = min(best, (time.perf_counter() - start) / number)
+
+    tracemalloc.start()
+    peak = 0
+    for _ in range(min(number, 20)):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        op()
+        _, call_peak = tracemalloc.get_traced_memory()
+        peak = max(peak, call_peak - before)
+    tracemalloc.stop()
+    return {'ops_per_sec': 1 / best, 'peak_kib': peak / 1024}
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]], tolerance: float,
+) -> List[str]:
+    """Returns a message for every benchmark that regressed."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['ops_per_sec']:.1f} ops/s, "
+                f"baseline {base['ops_per_sec']:.1f}",
+            )
+        # Small allocations are noisy; ignore changes under 1 KiB
+        if result['peak_kib'] > base['peak_kib'] * (1 + tolerance) + 1:
+            regressions.append(
+                f"{name}: peak {result['peak_kib']:.1f} KiB, "
+                f"baseline {base['peak_kib']:.1f}",
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument('--filter', default='', help='regex on the names')
+    parser.add_argument('--min-time', type=float, default=0.2)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    # The nodes print and log every call; keep the report readable
+    logging.disable(logging.INFO)
+    devnull = open(os.devnull, 'w')
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'benchmark':<34} {'ops/sec':>12} {'peak KiB':>10}")
+    for name, setup in BENCHMARKS.items():
+        if not re.search(args.filter, name):
+            continue
+        with contextlib.redirect_stdout(devnull):
+            result = measure(setup(), args.min_time, args.rounds)
+        results[name] = result
+        print(
+            f"{name:<34} {result['ops_per_sec']:12.1f} "
+            f"{result['peak_kib']:10.1f}",
+        )
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'created': datetime.datetime.now().isoformat(),
+                    'results': results,
+                },
+                file, indent=2,
+            )
+        print(f'saved {args.save}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f'no regressions against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
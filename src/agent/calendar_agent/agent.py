@@ -1,10 +1,15 @@
 from __future__ import annotations
 
-from langgraph.checkpoint.memory import InMemorySaver
+import threading
+from typing import Optional
+
 from langgraph.graph import END
 from langgraph.graph import START
 from langgraph.graph import StateGraph
+from langgraph.graph.state import CompiledStateGraph
 
+from ..shared.checkpointer import get_checkpointer
+from ..shared.graph_utils import create_pending_tools_node
 from ..shared.graph_utils import create_tool_node_with_fallback
 from .nodes import call_chatbot
 from .nodes import human_review_node
@@ -14,41 +19,52 @@ from .nodes import SENSITIVE_TOOLS
 from .state import CalendarAssistantState
 
 
-graph_builder = StateGraph(CalendarAssistantState)
-
-# add node
-graph_builder.add_node('chatbot', call_chatbot)
-graph_builder.add_node(
-    'safe_tools', create_tool_node_with_fallback(SAFE_TOOLS),
-)
-graph_builder.add_node(
-    'sensitive_tools', create_tool_node_with_fallback(
-        SENSITIVE_TOOLS,
-    ),
-)
-graph_builder.add_node(
-    'human_review_node', human_review_node,
-)
-
-# add edges
-graph_builder.add_edge(START,  'chatbot')
-graph_builder.add_conditional_edges(
-    'chatbot', route_tools, {
-        'safe': 'safe_tools',
-        'human_review': 'human_review_node',
-        END: END,
-    },
-)
-
-graph_builder.add_edge('safe_tools', 'chatbot')
-graph_builder.add_edge('sensitive_tools', 'chatbot')
-
-memory = InMemorySaver()
-graph = graph_builder.compile(
-    checkpointer=memory,
-)
-
-# save image of graph
-graph.get_graph().draw_mermaid_png(
-    output_file_path='images/calendar_graph.png',
-)
+def build_graph() -> CompiledStateGraph:
+    """Builds and compiles the calendar agent graph."""
+    graph_builder = StateGraph(CalendarAssistantState)
+
+    # add node
+    graph_builder.add_node('chatbot', call_chatbot)
+    graph_builder.add_node(
+        'safe_tools', create_tool_node_with_fallback(SAFE_TOOLS),
+    )
+    # Runs the approved sensitive calls together with the safe calls of the
+    # same message
+    graph_builder.add_node(
+        'sensitive_tools', create_pending_tools_node(
+            SAFE_TOOLS + SENSITIVE_TOOLS,
+        ),
+    )
+    graph_builder.add_node(
+        'human_review_node', human_review_node,
+    )
+
+    # add edges
+    graph_builder.add_edge(START,  'chatbot')
+    graph_builder.add_conditional_edges(
+        'chatbot', route_tools, {
+            'safe': 'safe_tools',
+            'human_review': 'human_review_node',
+            END: END,
+        },
+    )
+
+    graph_builder.add_edge('safe_tools', 'chatbot')
+    graph_builder.add_edge('sensitive_tools', 'chatbot')
+
+    return graph_builder.compile(
+        checkpointer=get_checkpointer(),
+    )
+
+
+_graph: Optional[CompiledStateGraph] = None
+_graph_lock = threading.Lock()
+
+
+def get_graph() -> CompiledStateGraph:
+    """Returns the calendar agent graph, compiling it on first use."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = build_graph()
+        return _graph
@@ -1,16 +1,19 @@
 from __future__ import annotations
 
+import functools
 from typing import Literal
 
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END
 from langgraph.prebuilt import tools_condition
 from langgraph.types import Command
-from langgraph.types import interrupt
-from llm import model
+from llm import get_model
 
 from ..prompt import CALENDAR_AGENT_SYSTEM_PROMPT
+from ..shared.context import get_context_window
+from ..shared.graph_utils import review_tool_calls
 from .state import CalendarAssistantState
 from .tools import create_calendar_event
 from .tools import delete_calendar_event
@@ -32,17 +35,25 @@ assistant_prompt = ChatPromptTemplate.from_messages(
     ],
 )
 
-assistant_runnable = assistant_prompt | model.bind_tools(
-    SAFE_TOOLS + SENSITIVE_TOOLS,
-)
+
+@functools.lru_cache(maxsize=None)
+def get_assistant_runnable() -> Runnable:
+    """Returns the prompt piped into the tool-calling model."""
+    return assistant_prompt | get_model().bind_tools(
+        SAFE_TOOLS + SENSITIVE_TOOLS,
+    )
 
 
-def call_chatbot(
+async def call_chatbot(
         state: CalendarAssistantState,
         config: RunnableConfig,
 ):
+    history = await get_context_window().fit(
+        state['messages'], CALENDAR_AGENT_SYSTEM_PROMPT, 'calendar_agent',
+    )
+    state = {**state, 'messages': history}
     while True:
-        result = assistant_runnable.invoke(state)
+        result = await get_assistant_runnable().ainvoke(state)
         # If the LLM happens to return an empty response,
         # we will re-prompt it
         # for an actual response.
@@ -65,11 +76,12 @@ def route_tools(state: CalendarAssistantState):
     if next_node == END:
         return END
     ai_message = state['messages'][-1]
-    # This assumes single tool calls.
-    # To handle parallel tool calling, you'd want to
-    # use an ANY condition
-    first_tool_call = ai_message.tool_calls[0]
-    if first_tool_call['name'] in SENSITIVE_TOOL_NAMES:
+    # All calls of the message run together, after a review if any of
+    # them is sensitive
+    if any(
+        tool_call['name'] in SENSITIVE_TOOL_NAMES
+        for tool_call in ai_message.tool_calls
+    ):
         return 'human_review'
     return 'safe'
 
@@ -81,34 +93,45 @@ def human_review_node(state: CalendarAssistantState) -> Command[
         ]
 ]:
     last_message = state['messages'][-1]
-    tool_call = last_message.tool_calls[-1]
+    tool_calls = [
+        tool_call for tool_call in last_message.tool_calls
+        if tool_call['name'] in SENSITIVE_TOOL_NAMES
+    ]
 
-    human_review = interrupt(
-        {
-            'question': 'Is this correct?',
-            # Surface tool calls for review
-            'tool_call': tool_call,
-        },
-    )
+    human_review = review_tool_calls(tool_calls)
 
     review_action = human_review['action']
     review_data = human_review.get('data')
 
-    # if approved, call the tool
+    # if approved, call the tools; 'approved' may narrow it to some calls
+    approved = set()
     if review_action == 'continue':
-        return Command(goto='sensitive_tools')
-
-    # provide feedback to LLM
-    elif review_action == 'feedback':
-        # NOTE: we're adding feedback message as a ToolMessage
-        # to preserve the correct order in the message history
-        # (AI messages with tool calls need
-        #  to be followed by tool call messages)
-        tool_message = {
+        approved = set(
+            human_review.get(
+                'approved', [tool_call['id'] for tool_call in tool_calls],
+            ),
+        )
+
+    # provide feedback to LLM for the calls that were not approved
+    # NOTE: we're adding feedback messages as ToolMessages
+    # to preserve the correct order in the message history
+    # (AI messages with tool calls need
+    #  to be followed by tool call messages)
+    tool_messages = [
+        {
             'role': 'tool',
             # This is our natural language feedback
-            'content': review_data,
+            'content': review_data or 'The user did not approve this call.',
             'name': tool_call['name'],
             'tool_call_id': tool_call['id'],
         }
-        return Command(goto='chatbot', update={'messages': [tool_message]})
+        for tool_call in tool_calls
+        if tool_call['id'] not in approved
+    ]
+
+    # The approved calls run concurrently with the message's safe calls
+    if len(tool_messages) < len(last_message.tool_calls):
+        return Command(
+            goto='sensitive_tools', update={'messages': tool_messages},
+        )
+    return Command(goto='chatbot', update={'messages': tool_messages})
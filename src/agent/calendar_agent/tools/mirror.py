@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import datetime
+import logging
+import os
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from dateutil import parser
+
+from ...shared.concurrency import run_concurrently
+from ...shared.local_db import connect_sqlite
+
+# Set to an empty string to query the Calendar API directly instead
+CALENDAR_MIRROR_PATH = os.getenv('CALENDAR_MIRROR_PATH', 'calendar_mirror.db')
+# Calendars synced less than this many seconds ago are not synced again
+CALENDAR_MIRROR_MAX_AGE = float(os.getenv('CALENDAR_MIRROR_MAX_AGE', 60))
+# How far back the initial full sync of a calendar goes
+CALENDAR_MIRROR_PAST_DAYS = int(os.getenv('CALENDAR_MIRROR_PAST_DAYS', 30))
+# How far ahead the full sync expands recurring events; the calendar is
+# fully synced again once less than half of this window is left
+CALENDAR_MIRROR_FUTURE_DAYS = int(
+    os.getenv('CALENDAR_MIRROR_FUTURE_DAYS', 365),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    user TEXT NOT NULL,
+    calendar_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    summary TEXT,
+    location TEXT,
+    description TEXT,
+    PRIMARY KEY (user, calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS events_start ON events (user, start_ts);
+CREATE INDEX IF NOT EXISTS events_end ON events (user, end_ts);
+CREATE TABLE IF NOT EXISTS sync_state (
+    user TEXT NOT NULL,
+    calendar_id TEXT NOT NULL,
+    sync_token TEXT,
+    synced_at REAL NOT NULL,
+    window_end REAL NOT NULL,
+    PRIMARY KEY (user, calendar_id)
+);
+"""
+
+User = Union[str, os.PathLike, None]
+
+
+def _timestamp(value: Dict[str, str]) -> Tuple[str, float]:
+    """Returns the raw value and UTC epoch of an event `start`/`end`.
+
+    All-day events only have a `date`, which is taken as midnight UTC.
+    """
+    raw = value.get('dateTime') or value['date']
+    parsed = parser.isoparse(raw)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return raw, parsed.timestamp()
+
+
+class CalendarMirror:
+    """
+    Local SQLite copy of the users' calendar events.
+
+    Each calendar is kept current with the Calendar API's incremental sync:
+    the first sync downloads the events and stores the returned
+    `nextSyncToken`, and later syncs only ask for what changed since then.
+    When the API answers 410 Gone the token has expired, so the calendar is
+    cleared and fully synced again.
+    """
+
+    def __init__(
+        self, path: str = CALENDAR_MIRROR_PATH,
+        max_age: float = CALENDAR_MIRROR_MAX_AGE,
+        past_days: int = CALENDAR_MIRROR_PAST_DAYS,
+        future_days: int = CALENDAR_MIRROR_FUTURE_DAYS,
+    ) -> None:
+        self.max_age = max_age
+        self.past_days = past_days
+        self.future_days = future_days
+        self._lock = threading.Lock()
+        self._db = connect_sqlite(path)
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def sync(
+        self, service: Any, calendars: List[Dict[str, Any]], user: User = None,
+        max_workers: int = 8, timeout: float = 10,
+        calendar_list: Optional[List[Dict[str, Any]]] = None,
+    ) -> List[str]:
+        """
+        Brings the mirror of `calendars` up to date.
+
+        Calendars are synced concurrently, at most `max_workers` at a time
+        and `timeout` seconds each. When the user's full `calendar_list` is
+        given, mirrored calendars that are no longer in it are removed;
+        `calendars` may be a subset of it.
+
+        Returns:
+            List[str]: The names of the calendars that could not be synced.
+        """
+        user_key = str(user)
+        if calendar_list is not None:
+            self._retain(
+                user_key, [calendar['id'] for calendar in calendar_list],
+            )
+
+        synced_at = self._synced_at(user_key)
+        now = time.time()
+        stale = [
+            calendar for calendar in calendars
+            if now - synced_at.get(calendar['id'], 0) >= self.max_age
+        ]
+        results = run_concurrently(
+            lambda calendar: self._sync_calendar(service, user_key, calendar),
+            stale, max_workers=max_workers, timeout=timeout,
+        )
+
+        failed = []
+        for calendar, result in zip(stale, results):
+            if isinstance(result, Exception):
+                logging.warning(
+                    f"Failed to sync '{calendar['summary']}': {result!r}",
+                )
+                failed.append(calendar['summary'])
+        return failed
+
+    def upcoming_events(
+        self, calendars: List[Dict[str, Any]], time_min: float,
+        time_max: Optional[float] = None, limit: int = 20, user: User = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns mirrored events that end after `time_min` and start before
+        `time_max`, ordered by start time.
+
+        Args:
+            calendars (List[Dict[str, Any]]): `calendarList` entries of the
+                calendars to search.
+            time_min (float): UTC epoch seconds.
+            time_max (Optional[float]): UTC epoch seconds, or None for no
+                upper bound.
+            limit (int): Maximum number of events to return.
+            user (str | PathLike | None): The user the calendars belong to.
+        """
+        names = {calendar['id']: calendar['summary'] for calendar in calendars}
+        if not names:
+            return []
+        placeholders = ', '.join('?' * len(names))
+        query = (
+            'SELECT * FROM events WHERE user = ? AND end_ts > ? '
+            f'AND calendar_id IN ({placeholders}) '
+        )
+        params: List[Any] = [str(user), time_min, *names]
+        if time_max is not None:
+            query += 'AND start_ts < ? '
+            params.append(time_max)
+        query += 'ORDER BY start_ts, event_id LIMIT ?'
+        params.append(limit)
+
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+
+        events = []
+        for row in rows:
+            event_data: Dict[str, Any] = {
+                'id': row['event_id'],
+                'calendar': names[row['calendar_id']],
+                'start': row['start'],
+                'end': row['end'],
+                'summary': row['summary'],
+            }
+            if row['location'] is not None:
+                event_data['location'] = row['location']
+            if row['description'] is not None:
+                event_data['description'] = row['description']
+            events.append(event_data)
+        return events
+
+    def mark_stale(self, calendar_id: str, user: User = None) -> None:
+        """
+        Makes the next `sync` of a calendar ask the API for its changes.
+
+        Called after a write to the calendar, so the user's own change is
+        seen right away instead of once `max_age` has passed.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                'UPDATE sync_state SET synced_at = 0 '
+                'WHERE user = ? AND calendar_id = ?',
+                (str(user), calendar_id),
+            )
+
+    def _synced_at(self, user: str) -> Dict[str, float]:
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT calendar_id, synced_at FROM sync_state WHERE user = ?',
+                (user,),
+            ).fetchall()
+        return {row['calendar_id']: row['synced_at'] for row in rows}
+
+    def _sync_token(self, user: str, calendar_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT sync_token, window_end FROM sync_state '
+                'WHERE user = ? AND calendar_id = ?',
+                (user, calendar_id),
+            ).fetchone()
+        if row is None:
+            return None
+        # Incremental syncs do not move the window of expanded recurring
+        # events forward; start over once half of it has passed
+        if row['window_end'] - time.time() < self.future_days * 86400 / 2:
+            return None
+        return row['sync_token']
+
+    def _list_changes(
+        self, service: Any, calendar_id: str, sync_token: Optional[str],
+    ) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[float]]:
+        """
+        Lists the changes since `sync_token`, or the events of the sync
+        window when there is none.
+
+        Returns:
+            The events, the next sync token and, for a full sync, the UTC
+            epoch the window ends at.
+        """
+        window_end = None
+        params: Dict[str, Any] = {
+            'calendarId': calendar_id,
+            'singleEvents': True,
+            'maxResults': 2500,
+        }
+        if sync_token:
+            params['syncToken'] = sync_token
+        else:
+            now = datetime.datetime.utcnow()
+            time_min = now - datetime.timedelta(days=self.past_days)
+            time_max = now + datetime.timedelta(days=self.future_days)
+            params['timeMin'] = time_min.isoformat() + 'Z'
+            # Bounds the expansion of recurring events without an end
+            params['timeMax'] = time_max.isoformat() + 'Z'
+            window_end = time_max.replace(
+                tzinfo=datetime.timezone.utc,
+            ).timestamp()
+
+        items: List[Dict[str, Any]] = []
+        while True:
+            response = service.events().list(**params).execute()
+            items.extend(response.get('items', []))
+            if not response.get('nextPageToken'):
+                return items, response.get('nextSyncToken'), window_end
+            params['pageToken'] = response['nextPageToken']
+
+    def _sync_calendar(
+        self, service: Any, user: str, calendar: Dict[str, Any],
+    ) -> None:
+        from googleapiclient.errors import HttpError
+
+        calendar_id = calendar['id']
+        sync_token = self._sync_token(user, calendar_id)
+        try:
+            items, next_token, window_end = self._list_changes(
+                service, calendar_id, sync_token,
+            )
+        except HttpError as e:
+            if e.resp.status != 410 or not sync_token:
+                raise
+            logging.info(
+                f"Sync token expired for '{calendar['summary']}', "
+                'running a full sync',
+            )
+            sync_token = None
+            items, next_token, window_end = self._list_changes(
+                service, calendar_id, None,
+            )
+
+        self._apply(user, calendar_id, items, next_token, window_end)
+
+    def _apply(
+        self, user: str, calendar_id: str, items: Iterable[Dict[str, Any]],
+        sync_token: Optional[str], window_end: Optional[float],
+    ) -> None:
+        """
+        Stores synced events; a full sync, which has a `window_end`,
+        replaces the calendar's events.
+        """
+        full = window_end is not None
+        upserts = []
+        deletes = []
+        for event in items:
+            if event.get('status') == 'cancelled':
+                deletes.append((user, calendar_id, event['id']))
+                continue
+            start, start_ts = _timestamp(event['start'])
+            end, end_ts = _timestamp(event['end'])
+            upserts.append(
+                (
+                    user, calendar_id, event['id'], start, end,
+                    start_ts, end_ts, event.get('summary', '(No title)'),
+                    event.get('location'), event.get('description'),
+                ),
+            )
+
+        with self._lock, self._db:
+            if full:
+                self._db.execute(
+                    'DELETE FROM events WHERE user = ? AND calendar_id = ?',
+                    (user, calendar_id),
+                )
+            self._db.executemany(
+                'DELETE FROM events '
+                'WHERE user = ? AND calendar_id = ? AND event_id = ?',
+                deletes,
+            )
+            self._db.executemany(
+                'INSERT OR REPLACE INTO events VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                upserts,
+            )
+            if full:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?)',
+                    (user, calendar_id, sync_token, time.time(), window_end),
+                )
+            else:
+                self._db.execute(
+                    'UPDATE sync_state SET sync_token = ?, synced_at = ? '
+                    'WHERE user = ? AND calendar_id = ?',
+                    (sync_token, time.time(), user, calendar_id),
+                )
+
+    def _retain(self, user: str, calendar_ids: List[str]) -> None:
+        placeholders = ', '.join('?' * len(calendar_ids))
+        with self._lock, self._db:
+            for table in ('events', 'sync_state'):
+                self._db.execute(
+                    f'DELETE FROM {table} WHERE user = ? '
+                    f'AND calendar_id NOT IN ({placeholders})',
+                    (user, *calendar_ids),
+                )
+
+
+_mirror: Optional[CalendarMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_calendar_mirror() -> Optional[CalendarMirror]:
+    """
+    Returns the process-wide calendar mirror, opening it on first use.
+
+    Returns:
+        Optional[CalendarMirror]: The mirror, or None if it is disabled by
+        setting `CALENDAR_MIRROR_PATH` to an empty string.
+    """
+    global _mirror
+    if not CALENDAR_MIRROR_PATH:
+        return None
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = CalendarMirror(CALENDAR_MIRROR_PATH)
+        return _mirror
@@ -1,18 +1,165 @@
 from __future__ import annotations
 
 import datetime
-from pathlib import Path
+import logging
+import os
 from typing import Any
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
 from typing import Union
 
-from googleapiclient.discovery import build
 from langchain_core.tools import tool
 
+from ...shared.concurrency import run_concurrently
 from ...shared.get_credentials import get_credentials
-from ...shared.utils import read_personal_info
+from ...shared.google_services import get_service
+from ...shared.utils import get_token_access_path
+from .mirror import get_calendar_mirror
+from .utils import calendar_index
+
+
+CALENDAR_FETCH_CONCURRENCY = int(os.getenv('CALENDAR_FETCH_CONCURRENCY', 8))
+# Seconds to wait for the events of a single calendar
+CALENDAR_FETCH_TIMEOUT = float(os.getenv('CALENDAR_FETCH_TIMEOUT', 10))
+
+
+def _epoch(value: datetime.datetime) -> float:
+    return value.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def fetch_calendar_events(
+    service: Any, calendar: Dict[str, Any],
+    time_min: str, time_max: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Fetches the upcoming events of a single calendar.
+
+    Args:
+        service (Any): An authorized Google Calendar service object.
+        calendar (Dict[str, Any]): A `calendarList` entry.
+        time_min (str): Lower bound (RFC 3339) of the events' end time.
+        time_max (Optional[str]): Upper bound (RFC 3339) of the events'
+            start time. If None, there is no upper bound.
+
+    Returns:
+        List[Dict[str, Any]]: The events, reduced to the fields shown to the
+        model.
+    """
+    params: Dict[str, Any] = {
+        'calendarId': calendar['id'],
+        'timeMin': time_min,
+        'maxResults': 20,
+        'singleEvents': True,
+        'orderBy': 'startTime',
+    }
+    if time_max:
+        params['timeMax'] = time_max
+    events_result = service.events().list(**params).execute()
+
+    events: List[Dict[str, Any]] = []
+    for event in events_result.get('items', []):
+        start: str = event.get('start', {}).get(
+            'dateTime', event.get('start', {}).get('date'),
+        )
+        end: str = event.get('end', {}).get(
+            'dateTime', event.get('end', {}).get('date'),
+        )
+        event_data: Dict[str, Any] = {
+            'id': event['id'],
+            'calendar': calendar['summary'],
+            'start': start,
+            'end': end,
+            'summary': event.get('summary', '(No title)'),
+        }
+
+        # Add location and notes only if they exist
+        if 'location' in event:
+            event_data['location'] = event['location']
+        if 'description' in event:
+            event_data['description'] = event['description']
+
+        events.append(event_data)
+    return events
+
+
+def fetch_events_concurrently(
+    service: Any, calendars: List[Dict[str, Any]],
+    time_min: str, time_max: Optional[str] = None,
+    max_workers: int = CALENDAR_FETCH_CONCURRENCY,
+    timeout: float = CALENDAR_FETCH_TIMEOUT,
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Fetches the events of several calendars in parallel.
+
+    At most `max_workers` calendars are queried at once. A calendar that
+    fails or does not answer within `timeout` seconds is skipped, so the
+    events of the other calendars are still returned.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[str]]: The events of all calendars
+        sorted by start time, and the names of the calendars that failed.
+    """
+    results = run_concurrently(
+        lambda calendar: fetch_calendar_events(
+            service, calendar, time_min, time_max,
+        ),
+        calendars, max_workers=max_workers, timeout=timeout,
+    )
+
+    events: List[Dict[str, Any]] = []
+    failed: List[str] = []
+    for calendar, result in zip(calendars, results):
+        if isinstance(result, TimeoutError):
+            logging.warning(f"Timed out fetching '{calendar['summary']}'")
+            failed.append(f"{calendar['summary']} (timed out)")
+        elif isinstance(result, Exception):
+            logging.warning(
+                f"Failed to fetch '{calendar['summary']}': {result!r}",
+            )
+            failed.append(calendar['summary'])
+        else:
+            events.extend(result)
+
+    events.sort(key=lambda x: x['start'])
+    return events, failed
+
+
+def format_events(
+    n: int, events: List[Dict[str, Any]], failed_calendars: List[str],
+) -> str:
+    """
+    Formats events for the model, one block per event.
+
+    Args:
+        n (int): The number of events that was asked for.
+        events (List[Dict[str, Any]]): The events, as returned by
+            `fetch_calendar_events`.
+        failed_calendars (List[str]): Calendars whose events are missing.
+
+    Returns:
+        str: The event listing.
+    """
+    results = f'Next {n} Events Across All Calendars:\n'
+    for event in events:
+        results += (
+            f"Event ID : {event['id']}\n"
+            f"Calendar Name: {event['calendar']} | "
+            f"From {event['start']} To {event['end']}"
+            f"- {event['summary']}\n"
+        )
+        if 'location' in event:
+            results += f"📍 Location: {event['location']}\n"
+        if 'description' in event:
+            results += f"📝 Notes: {event['description']}\n"
+        results += '\n'
+    if failed_calendars:
+        results += (
+            '⚠️ Could not load events from: '
+            f"{', '.join(failed_calendars)}\n"
+        )
+    return results
 
 
 @tool
@@ -41,16 +188,14 @@ def get_next_n_calendar_events(
         event ID, calendar name, start time, event name, location,
         and description.
     """
-    personal_info = read_personal_info()
-    credentials_file_path = personal_info.get('token_access_path', None)
-    credentials_file_path = Path(
-        __file__,
-    ).parents[2] / Path(credentials_file_path)
+    credentials_file_path = get_token_access_path()
     creds = get_credentials(
         token_access_path=credentials_file_path,
     )
     if creds:
-        service = build('calendar', 'v3', credentials=creds)
+        service = get_service(
+            'calendar', 'v3', creds, user=credentials_file_path,
+        )
 
         now = datetime.datetime.utcnow()
 
@@ -76,14 +221,12 @@ def get_next_n_calendar_events(
         time_max_iso: Optional[str] = time_max.isoformat(
         ) + 'Z' if time_max else None
 
-        events_all: List[Dict[str, Any]] = []
-        calendar_list: Dict[str, Any] = service.calendarList().list().execute()
+        calendar_list = calendar_index.calendars(
+            service, user=credentials_file_path,
+        )
 
         # Extract calendar names
-        calendar_names = [
-            calendar['summary']
-            for calendar in calendar_list.get('items', [])
-        ]
+        calendar_names = [calendar['summary'] for calendar in calendar_list]
 
         if (
             calendar_name
@@ -95,76 +238,29 @@ def get_next_n_calendar_events(
                 f"{', '.join(calendar_names)}"
             )
 
-        # Loop through each calendar to fetch events
-        for calendar in calendar_list.get('items', []):
-            if (
-                calendar_name
-                and calendar['summary'].lower() != calendar_name.lower()
-            ):
-                continue  # Skip calendars that don't match the filter
-
-            calendar_id: str = calendar['id']
-            if time_max_iso:
-                events_result = service.events().list(
-                    calendarId=calendar_id,
-                    timeMin=now_iso,
-                    timeMax=time_max_iso,
-                    maxResults=20,
-                    singleEvents=True,
-                    orderBy='startTime',
-                ).execute()
-
-            else:
-                events_result = service.events().list(
-                    calendarId=calendar_id,
-                    timeMin=now_iso,
-                    maxResults=20,
-                    singleEvents=True,
-                    orderBy='startTime',
-                ).execute()
-
-            events: List[Dict[str, Any]] = events_result.get('items', [])
-
-            for event in events:
-                start: str = event.get('start', {}).get(
-                    'dateTime', event.get('start', {}).get('date'),
-                )
-                end: str = event.get('end', {}).get(
-                    'dateTime', event.get('end', {}).get('date'),
-                )
-                event_data: Dict[str, Any] = {
-                    'id': event['id'],
-                    'calendar': calendar['summary'],
-                    'start': start,
-                    'end': end,
-                    'summary': event['summary'],
-                }
-
-                # Add location and notes only if they exist
-                if 'location' in event:
-                    event_data['location'] = event['location']
-                if 'description' in event:
-                    event_data['description'] = event['description']
-
-                events_all.append(event_data)
-
-        # Sort all events by start time
-        events_all = sorted(events_all, key=lambda x: x['start'])
-
-        next_n_events = events_all[:n]
-
-        results = f'Next {n} Events Across All Calendars:\n'
-        for event in next_n_events:
-            results += (
-                f"Event ID : {event['id']}\n"
-                f"Calendar Name: {event['calendar']} | "
-                f"From {event['start']} To {event['end']}"
-                f"- {event['summary']}\n"
+        calendars = [
+            calendar for calendar in calendar_list
+            if not calendar_name
+            or calendar['summary'].lower() == calendar_name.lower()
+        ]
+        mirror = get_calendar_mirror()
+        if mirror:
+            failed_calendars = mirror.sync(
+                service, calendars, user=credentials_file_path,
+                max_workers=CALENDAR_FETCH_CONCURRENCY,
+                timeout=CALENDAR_FETCH_TIMEOUT,
+                calendar_list=calendar_list,
+            )
+            next_n_events = mirror.upcoming_events(
+                calendars, _epoch(now),
+                _epoch(time_max) if time_max else None,
+                limit=n, user=credentials_file_path,
             )
-            if 'location' in event:
-                results += f"📍 Location: {event['location']}\n"
-            if 'description' in event:
-                results += f"📝 Notes: {event['description']}\n"
-            results += '\n'
-        return results
+        else:
+            events_all, failed_calendars = fetch_events_concurrently(
+                service, calendars, now_iso, time_max_iso,
+            )
+            next_n_events = events_all[:n]
+
+        return format_events(n, next_n_events, failed_calendars)
     return 'No events found'
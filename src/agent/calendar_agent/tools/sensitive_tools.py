@@ -2,14 +2,16 @@ from __future__ import annotations
 
 import datetime
 import re
-from pathlib import Path
 from typing import Optional
 
-from googleapiclient.discovery import build
 from langchain_core.tools import tool
 
 from ...shared.get_credentials import get_credentials
-from ...shared.utils import read_personal_info
+from ...shared.google_services import get_service
+from ...shared.utils import get_token_access_path
+from .mirror import get_calendar_mirror
+from .mirror import User
+from .utils import calendar_index
 
 
 def validate_datetime(dt_str: str) -> bool:
@@ -28,6 +30,13 @@ def validate_datetime(dt_str: str) -> bool:
         return False
 
 
+def mark_mirror_stale(calendar_id: str, user: User) -> None:
+    """Makes the next calendar read pick up a write to `calendar_id`."""
+    mirror = get_calendar_mirror()
+    if mirror:
+        mirror.mark_stale(calendar_id, user=user)
+
+
 @tool
 def create_calendar_event(
     start_time: str, end_time: str,
@@ -66,33 +75,22 @@ def create_calendar_event(
             'YYYY-MM-DDTHH:MM:SS±HH:MM).'
         )
 
-    personal_info = read_personal_info()
-    credentials_file_path = personal_info.get('token_access_path', None)
-    credentials_file_path = Path(
-        __file__,
-    ).parents[2] / Path(credentials_file_path)
+    credentials_file_path = get_token_access_path()
     creds = get_credentials(token_access_path=credentials_file_path)
 
     if creds:
-        service = build('calendar', 'v3', credentials=creds)
-
-        # Get list of calendars to match the provided calendar name
-        calendar_list = (
-            service.calendarList()
-            .list()
-            .execute()
-            .get('items', [])
+        service = get_service(
+            'calendar', 'v3', creds, user=credentials_file_path,
         )
-        calendar_id = next(
-            (
-                cal['id'] for cal in calendar_list if cal.get(
-                    'summary',
-                ) == calendar_name
-            ), None,
+
+        # Match the provided calendar name against the cached calendar list
+        calendar = calendar_index.lookup(
+            service, calendar_name, user=credentials_file_path,
         )
 
-        if not calendar_id:
+        if not calendar:
             return f"Error: Calendar '{calendar_name}' not found."
+        calendar_id = calendar['id']
 
         event = {
             'summary': title,
@@ -105,6 +103,7 @@ def create_calendar_event(
         event_result = service.events().insert(
             calendarId=calendar_id, body=event,
         ).execute()
+        mark_mirror_stale(calendar_id, credentials_file_path)
         return f"Event created: {event_result.get('htmlLink')}"
 
 
@@ -124,41 +123,31 @@ def delete_calendar_event(calendar_name: str, event_id: str):
     """
 
     try:
-        personal_info = read_personal_info()
-        credentials_file_path = personal_info.get('token_access_path', None)
-        credentials_file_path = Path(
-            __file__,
-        ).parents[2] / Path(credentials_file_path)
+        credentials_file_path = get_token_access_path()
         creds = get_credentials(
             token_access_path=credentials_file_path,
         )
         if creds:
-            service = build('calendar', 'v3', credentials=creds)
-
-            # Fetch the list of calendars to find the calendar ID
-            calendar_list = (
-                service.calendarList()
-                .list()
-                .execute()
-                .get('items', [])
+            service = get_service(
+                'calendar', 'v3', creds, user=credentials_file_path,
             )
-            calendar_id = next(
-                (
-                    cal['id'] for cal in calendar_list if cal.get(
-                        'summary',
-                    ) == calendar_name
-                ), None,
+
+            # Look up the calendar ID in the cached calendar list
+            calendar = calendar_index.lookup(
+                service, calendar_name, user=credentials_file_path,
             )
 
-            if not calendar_id:
+            if not calendar:
                 print(f"Error: Calendar '{calendar_name}' not found.")
                 return
+            calendar_id = calendar['id']
 
             # Delete the event
             service.events().delete(
                 calendarId=calendar_id,
                 eventId=event_id,
             ).execute()
+            mark_mirror_stale(calendar_id, credentials_file_path)
             return (
                 f"Event '{event_id}' deleted successfully from "
                 f"'{calendar_name}'."
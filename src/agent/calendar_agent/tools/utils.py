@@ -1,12 +1,125 @@
 from __future__ import annotations
 
-from pathlib import Path
+import os
+import threading
+import time
 from typing import Any
 from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
 
-from googleapiclient.discovery import build
-from shared.utils import read_personal_info
-from src.agent.shared.get_credentials import get_credentials
+from ...shared.get_credentials import get_credentials
+from ...shared.google_services import get_service
+from ...shared.utils import get_token_access_path
+
+# Seconds a fetched calendar list is served without asking the API again
+CALENDAR_INDEX_TTL = float(os.getenv('CALENDAR_INDEX_TTL', 300))
+
+
+class _IndexEntry:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.calendars: List[Dict[str, Any]] = []
+        self.by_name: Dict[str, Dict[str, Any]] = {}
+        self.etag: Optional[str] = None
+        self.fetched_at: Optional[float] = None
+
+
+class CalendarIndex:
+    """
+    Per-user cache of the calendar list with case-insensitive name lookup.
+
+    The list is refreshed once it is older than `ttl` seconds. Refreshes
+    send the last seen ETag in `If-None-Match`, so when nothing changed the
+    API answers with an empty 304 and the cached list is kept.
+    """
+
+    def __init__(self, ttl: float = CALENDAR_INDEX_TTL) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _IndexEntry] = {}
+
+    def _entry(self, user: Union[str, os.PathLike, None]) -> _IndexEntry:
+        with self._lock:
+            return self._entries.setdefault(str(user), _IndexEntry())
+
+    def _is_fresh(self, entry: _IndexEntry) -> bool:
+        return (
+            entry.fetched_at is not None
+            and time.monotonic() - entry.fetched_at < self.ttl
+        )
+
+    def _refresh(self, service: Any, entry: _IndexEntry) -> None:
+        from googleapiclient.errors import HttpError
+
+        request = service.calendarList().list()
+        if entry.etag and entry.fetched_at is not None:
+            request.headers['If-None-Match'] = entry.etag
+        try:
+            response = request.execute()
+        except HttpError as e:
+            if e.resp.status != 304:
+                raise
+            # Not modified, keep the cached calendars
+            entry.fetched_at = time.monotonic()
+            return
+
+        etag = response.get('etag')
+        calendars = response.get('items', [])
+        while response.get('nextPageToken'):
+            response = service.calendarList().list(
+                pageToken=response['nextPageToken'],
+            ).execute()
+            calendars.extend(response.get('items', []))
+
+        entry.calendars = calendars
+        entry.by_name = {
+            calendar['summary'].casefold(): calendar
+            for calendar in reversed(calendars)
+            if 'summary' in calendar
+        }
+        entry.etag = etag
+        entry.fetched_at = time.monotonic()
+
+    def calendars(
+        self, service: Any, user: Union[str, os.PathLike, None] = None,
+        force: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Returns the user's `calendarList` entries."""
+        entry = self._entry(user)
+        with entry.lock:
+            if force or not self._is_fresh(entry):
+                self._refresh(service, entry)
+            return list(entry.calendars)
+
+    def lookup(
+        self, service: Any, calendar_name: str,
+        user: Union[str, os.PathLike, None] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Finds a calendar by name, ignoring case.
+
+        An unknown name triggers one refresh before giving up, so calendars
+        created since the last refresh are still found.
+        """
+        entry = self._entry(user)
+        key = calendar_name.casefold()
+        with entry.lock:
+            if not self._is_fresh(entry) or key not in entry.by_name:
+                self._refresh(service, entry)
+            return entry.by_name.get(key)
+
+    def invalidate(self, user: Union[str, os.PathLike, None] = None) -> None:
+        """Forgets the calendar list of `user`, or of every user if None."""
+        with self._lock:
+            if user is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(user), None)
+
+
+calendar_index = CalendarIndex()
 
 
 def get_calendar_names() -> list[str]:
@@ -17,25 +130,22 @@ def get_calendar_names() -> list[str]:
         Optional[List[str]]: A list of calendar names if credentials are valid,
         otherwise empty list.
     """
-    personal_info = read_personal_info()
-    credentials_file_path = personal_info.get('token_access_path', None)
+    credentials_file_path = get_token_access_path()
     if credentials_file_path is None:
         return []
-    credentials_file_path = Path(
-        __file__,
-    ).parents[2] / Path(credentials_file_path)
     creds = get_credentials(
         token_access_path=credentials_file_path,
     )
     if creds:
-        service = build('calendar', 'v3', credentials=creds)
-        calendar_list: Dict[str, Any] = service.calendarList().list().execute()
+        service = get_service(
+            'calendar', 'v3', creds, user=credentials_file_path,
+        )
+        calendars = calendar_index.calendars(
+            service, user=credentials_file_path,
+        )
 
         # Extract calendar names
-        calendar_names = [
-            calendar['summary']
-            for calendar in calendar_list.get('items', [])
-        ]
+        calendar_names = [calendar['summary'] for calendar in calendars]
 
         return calendar_names
     return []
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from langchain_openai import AzureOpenAIEmbeddings
-from langgraph.checkpoint.memory import InMemorySaver
+import threading
+from typing import Optional
+
 from langgraph.graph import END
 from langgraph.graph import START
 from langgraph.graph import StateGraph
-from langgraph.store.memory import InMemoryStore
+from langgraph.graph.state import CompiledStateGraph
 
+from ..shared.checkpointer import get_checkpointer
+from ..shared.graph_utils import create_pending_tools_node
 from ..shared.graph_utils import create_tool_node_with_fallback
 from .nodes import call_chatbot
 from .nodes import human_review_node
@@ -15,52 +18,56 @@ from .nodes import SAFE_TOOLS
 from .nodes import SENSITIVE_TOOLS
 from .state import GmailAssistantState
 
-graph_builder = StateGraph(GmailAssistantState)
-graph_builder.add_node('chatbot', call_chatbot)
-graph_builder.add_node(
-    'safe_tools', create_tool_node_with_fallback(SAFE_TOOLS),
-)
-graph_builder.add_node(
-    'sensitive_tools', create_tool_node_with_fallback(
-        SENSITIVE_TOOLS,
-    ),
-)
-graph_builder.add_node(
-    'human_review_node', human_review_node,
-)
 
-# add edges
-graph_builder.add_edge(START,  'chatbot')
-graph_builder.add_conditional_edges(
-    'chatbot', route_tools, {
-        'safe': 'safe_tools',
-        'human_review': 'human_review_node',
-        END: END,
-    },
-)
+def build_graph() -> CompiledStateGraph:
+    """Builds and compiles the Gmail agent graph."""
+    graph_builder = StateGraph(GmailAssistantState)
+    graph_builder.add_node('chatbot', call_chatbot)
+    graph_builder.add_node(
+        'safe_tools', create_tool_node_with_fallback(SAFE_TOOLS),
+    )
+    # Runs the approved sensitive calls together with the safe calls of the
+    # same message
+    graph_builder.add_node(
+        'sensitive_tools', create_pending_tools_node(
+            SAFE_TOOLS + SENSITIVE_TOOLS,
+        ),
+    )
+    graph_builder.add_node(
+        'human_review_node', human_review_node,
+    )
+
+    # add edges
+    graph_builder.add_edge(START,  'chatbot')
+    graph_builder.add_conditional_edges(
+        'chatbot', route_tools, {
+            'safe': 'safe_tools',
+            'human_review': 'human_review_node',
+            END: END,
+        },
+    )
+
+    graph_builder.add_edge('safe_tools', 'chatbot')
+    graph_builder.add_edge('sensitive_tools', 'chatbot')
 
-graph_builder.add_edge('safe_tools', 'chatbot')
-graph_builder.add_edge('sensitive_tools', 'chatbot')
+    # The store pulls in NumPy and the embeddings client; load it with
+    # the graph rather than on import
+    from ..shared.vector_store import get_memory_store
 
+    return graph_builder.compile(
+        checkpointer=get_checkpointer(),
+        store=get_memory_store(),
+    )
 
-checkpointer = InMemorySaver()
 
-embeddings = AzureOpenAIEmbeddings(
-    model='text-embedding-3-large',
-    dimensions=1536,
-)
+_graph: Optional[CompiledStateGraph] = None
+_graph_lock = threading.Lock()
 
-store = InMemoryStore(
-    index={
-        'embed': embeddings,
-    },
-)
-graph = graph_builder.compile(
-    checkpointer=checkpointer,
-    store=store,
-)
 
-# save image of graph
-graph.get_graph().draw_mermaid_png(
-    output_file_path='images/gmail_graph.png',
-)
+def get_graph() -> CompiledStateGraph:
+    """Returns the Gmail agent graph, compiling it on first use."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = build_graph()
+        return _graph
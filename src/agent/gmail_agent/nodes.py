@@ -1,22 +1,36 @@
 from __future__ import annotations
 
+import functools
+import logging
+import os
 import uuid
+from collections import Counter
+from typing import Dict
+from typing import Iterable
+from typing import List
 from typing import Literal
+from typing import Tuple
 
 from dotenv import load_dotenv
+from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END
 from langgraph.prebuilt import tools_condition
 from langgraph.store.base import BaseStore
+from langgraph.store.base import SearchItem
 from langgraph.types import Command
-from langgraph.types import interrupt
-from llm import model
+from llm import get_model
 
 from ..prompt import GMAIL_AGENT_SYSTEM_PROMPT
+from ..shared.context import get_context_window
+from ..shared.graph_utils import review_tool_calls
+from ..shared.tracing import register_stats
 from .state import GmailAssistantState
 from .tools import fetch_inbox_messages
 from .tools import get_email_details
+from .tools import search_emails
 from .tools import send_email
 
 _ = load_dotenv()
@@ -24,7 +38,15 @@ _ = load_dotenv()
 SENSITIVE_TOOLS = [send_email]
 SENSITIVE_TOOL_NAMES = {t.name for t in SENSITIVE_TOOLS}
 
-SAFE_TOOLS = [fetch_inbox_messages, get_email_details]
+SAFE_TOOLS = [fetch_inbox_messages, get_email_details, search_emails]
+
+# Number of memories retrieved for each call
+MEMORY_SEARCH_LIMIT = int(os.getenv('MEMORY_SEARCH_LIMIT', 4))
+# Tokens of memories injected into a single call
+MEMORY_TOKEN_BUDGET = int(os.getenv('MEMORY_TOKEN_BUDGET', 400))
+
+# Calls, injected memories and injected tokens, for memory_injection_stats()
+memory_injection: Counter = Counter()
 
 assistant_prompt = ChatPromptTemplate.from_messages(
     [
@@ -32,42 +54,111 @@ assistant_prompt = ChatPromptTemplate.from_messages(
             'system',
             GMAIL_AGENT_SYSTEM_PROMPT,
         ),
+        ('placeholder', '{memories}'),
         ('placeholder', '{messages}'),
     ],
 )
 
-assistant_runnable = assistant_prompt | model.bind_tools(
-    SAFE_TOOLS + SENSITIVE_TOOLS,
-)
+
+@functools.lru_cache(maxsize=None)
+def get_assistant_runnable() -> Runnable:
+    """Returns the prompt piped into the tool-calling model."""
+    return assistant_prompt | get_model().bind_tools(
+        SAFE_TOOLS + SENSITIVE_TOOLS,
+    )
 
 
-def call_chatbot(
+def memory_segment(
+    items: Iterable[SearchItem], budget: int = MEMORY_TOKEN_BUDGET,
+) -> Tuple[List[SystemMessage], int]:
+    """
+    Builds the system segment listing the user's memories for one call.
+
+    Memories are deduplicated by ID and by text and added best match first
+    while they fit in `budget` tokens. The segment is only sent with the
+    call; it is never written to the conversation state.
+
+    Args:
+        items (Iterable[SearchItem]): The retrieved memories, best first.
+        budget (int): The maximum number of tokens of the segment.
+
+    Returns:
+        Tuple[List[SystemMessage], int]: The segment, empty when there is
+        nothing to inject, and its number of tokens.
+    """
+    count_tokens = get_context_window().tokens.text
+    header = '## Memories of user'
+    used = count_tokens(header)
+    seen_ids = set()
+    seen_texts = set()
+    lines = []
+    for item in items:
+        text = ' '.join(str(item.value.get('data', '')).split())
+        if not text or item.key in seen_ids or text in seen_texts:
+            continue
+        seen_ids.add(item.key)
+        seen_texts.add(text)
+        line = f'- {text}'
+        tokens = count_tokens(line)
+        if used + tokens > budget:
+            continue
+        lines.append(line)
+        used += tokens
+    if not lines:
+        return [], 0
+    content = '\n'.join([header] + lines)
+    return [SystemMessage(content=content)], used
+
+
+def memory_injection_stats() -> Dict[str, float]:
+    """Returns the memory injection counters and the tokens per call."""
+    calls = memory_injection['calls']
+    return {
+        **memory_injection,
+        'avg_tokens': memory_injection['tokens'] / calls if calls else 0.0,
+    }
+
+
+register_stats('memory_injection', memory_injection_stats)
+
+
+async def call_chatbot(
     state: GmailAssistantState,
     config: RunnableConfig,
     store: BaseStore,
 ):
     user_id = config['configurable']['user_id']
-    items = store.search(
-        (user_id, 'memories'), query=state['messages'][-1].content, limit=2,
+    items = await store.asearch(
+        (user_id, 'memories'), query=state['messages'][-1].content,
+        limit=MEMORY_SEARCH_LIMIT,
     )
-    memories = '\n'.join(item.value['data'] for item in items)
-    memories = f'## Memories of user\n{memories}' if memories else ''
-    if memories:
-        new_first_message_with_memo = state['messages'][0].content + memories
-        state['messages'][0].content = new_first_message_with_memo
+    memories, memory_tokens = memory_segment(items)
+    injected = len(memories[0].content.splitlines()) - 1 if memories else 0
+    memory_injection['calls'] += 1
+    memory_injection['memories'] += injected
+    memory_injection['tokens'] += memory_tokens
+    logging.info(f'Injected {injected} memories ({memory_tokens} tokens)')
 
     # Store new memories if the user asks the model to remember
     last_message = state['messages'][-1]
     if 'remember' in last_message.content.lower():
         memory = last_message
-        store.put(
+        # The same request is stored once, under an ID derived from it
+        await store.aput(
             (user_id, 'memories'), str(
-                uuid.uuid4(),
+                uuid.uuid5(uuid.NAMESPACE_OID, memory.content),
             ), {'data': memory.content},
         )
 
+    system_prompt = GMAIL_AGENT_SYSTEM_PROMPT + ''.join(
+        segment.content for segment in memories
+    )
+    history = await get_context_window().fit(
+        state['messages'], system_prompt, 'gmail_agent',
+    )
+    state = {**state, 'messages': history, 'memories': memories}
     while True:
-        result = assistant_runnable.invoke(state)
+        result = await get_assistant_runnable().ainvoke(state)
         # If the LLM happens to return an empty response,
         # we will re-prompt it
         # for an actual response.
@@ -90,11 +181,12 @@ def route_tools(state: GmailAssistantState):
     if next_node == END:
         return END
     ai_message = state['messages'][-1]
-    # This assumes single tool calls.
-    # To handle parallel tool calling, you'd want to
-    # use an ANY condition
-    first_tool_call = ai_message.tool_calls[0]
-    if first_tool_call['name'] in SENSITIVE_TOOL_NAMES:
+    # All calls of the message run together, after a review if any of
+    # them is sensitive
+    if any(
+        tool_call['name'] in SENSITIVE_TOOL_NAMES
+        for tool_call in ai_message.tool_calls
+    ):
         return 'human_review'
     return 'safe'
 
@@ -106,34 +198,45 @@ def human_review_node(state: GmailAssistantState) -> Command[
     ]
 ]:
     last_message = state['messages'][-1]
-    tool_call = last_message.tool_calls[-1]
+    tool_calls = [
+        tool_call for tool_call in last_message.tool_calls
+        if tool_call['name'] in SENSITIVE_TOOL_NAMES
+    ]
 
-    human_review = interrupt(
-        {
-            'question': 'Is this correct?',
-            # Surface tool calls for review
-            'tool_call': tool_call,
-        },
-    )
+    human_review = review_tool_calls(tool_calls)
 
     review_action = human_review['action']
     review_data = human_review.get('data')
 
-    # if approved, call the tool
+    # if approved, call the tools; 'approved' may narrow it to some calls
+    approved = set()
     if review_action == 'continue':
-        return Command(goto='sensitive_tools')
-
-    # provide feedback to LLM
-    elif review_action == 'feedback':
-        # NOTE: we're adding feedback message as a ToolMessage
-        # to preserve the correct order in the message history
-        # (AI messages with tool calls need
-        #  to be followed by tool call messages)
-        tool_message = {
+        approved = set(
+            human_review.get(
+                'approved', [tool_call['id'] for tool_call in tool_calls],
+            ),
+        )
+
+    # provide feedback to LLM for the calls that were not approved
+    # NOTE: we're adding feedback messages as ToolMessages
+    # to preserve the correct order in the message history
+    # (AI messages with tool calls need
+    #  to be followed by tool call messages)
+    tool_messages = [
+        {
             'role': 'tool',
             # This is our natural language feedback
-            'content': review_data,
+            'content': review_data or 'The user did not approve this call.',
             'name': tool_call['name'],
             'tool_call_id': tool_call['id'],
         }
-        return Command(goto='chatbot', update={'messages': [tool_message]})
+        for tool_call in tool_calls
+        if tool_call['id'] not in approved
+    ]
+
+    # The approved calls run concurrently with the message's safe calls
+    if len(tool_messages) < len(last_message.tool_calls):
+        return Command(
+            goto='sensitive_tools', update={'messages': tool_messages},
+        )
+    return Command(goto='chatbot', update={'messages': tool_messages})
@@ -2,6 +2,10 @@ from __future__ import annotations
 
 from .non_sensitive_tools import fetch_inbox_messages
 from .non_sensitive_tools import get_email_details
+from .non_sensitive_tools import search_emails
 from .sensitive_tools import send_email
 
-__all__ = ['get_email_details', 'fetch_inbox_messages', 'send_email']
+__all__ = [
+    'get_email_details', 'fetch_inbox_messages', 'search_emails',
+    'send_email',
+]
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from ...shared.tracing import register_stats
+
+# Total size of the cached email details, in bytes of UTF-8 text
+EMAIL_DETAILS_CACHE_MAX_BYTES = int(
+    os.getenv('EMAIL_DETAILS_CACHE_MAX_BYTES', 32 * 1024 * 1024),
+)
+# File the cache is saved to on exit and loaded from on start; empty disables
+EMAIL_DETAILS_CACHE_PATH = os.getenv('EMAIL_DETAILS_CACHE_PATH', '')
+
+EmailDetails = Dict[str, str]
+CacheKey = Tuple[str, str, str]
+
+
+def _size(details: EmailDetails) -> int:
+    return sum(len(value.encode('utf-8')) for value in details.values())
+
+
+class EmailDetailsCache:
+    """
+    Process-wide LRU cache of parsed email details.
+
+    Entries are keyed by `(user, user_id, message_id)`. Gmail message
+    contents are immutable, so entries never go stale and are only evicted,
+    least recently used first, to keep the total size under `max_bytes`.
+    With a `path`, the cache is loaded from it on creation and written back
+    by `save()`, so a restarted process starts warm.
+    """
+
+    def __init__(
+        self, max_bytes: int = EMAIL_DETAILS_CACHE_MAX_BYTES,
+        path: Optional[str] = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[CacheKey, EmailDetails] = OrderedDict()
+        if path:
+            self._load(path)
+
+    def get(self, key: CacheKey) -> Optional[EmailDetails]:
+        with self._lock:
+            details = self._entries.get(key)
+            if details is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(details)
+
+    def put(self, key: CacheKey, details: EmailDetails) -> None:
+        size = _size(details)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= _size(previous)
+            self._entries[key] = dict(details)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= _size(evicted)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the hit, miss and eviction counters and the cache size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self.size,
+            }
+
+    def save(self) -> None:
+        """Writes the cache to `path`, least recently used entry first."""
+        if not self.path:
+            return
+        with self._lock:
+            entries = [
+                [list(key), details] for key, details in self._entries.items()
+            ]
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(entries, file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _load(self, path: str) -> None:
+        try:
+            with open(path, encoding='utf-8') as file:
+                entries = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f'Ignoring unreadable email cache {path}: {e}')
+            return
+        for key, details in entries:
+            self.put(tuple(key), details)
+
+
+email_details_cache = EmailDetailsCache(path=EMAIL_DETAILS_CACHE_PATH)
+register_stats('email_details_cache', email_details_cache.stats)
+if EMAIL_DETAILS_CACHE_PATH:
+    atexit.register(email_details_cache.save)
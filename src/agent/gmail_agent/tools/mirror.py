@@ -0,0 +1,420 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Union
+
+from ...shared.local_db import connect_sqlite
+from .utils import batch_get_messages
+
+# Set to an empty string to query the Gmail API directly instead
+GMAIL_MIRROR_PATH = os.getenv('GMAIL_MIRROR_PATH', 'gmail_mirror.db')
+# The mailbox is not synced again within this many seconds
+GMAIL_MIRROR_MAX_AGE = float(os.getenv('GMAIL_MIRROR_MAX_AGE', 30))
+# Messages fetched per page by the initial sync and by each backfill step
+GMAIL_MIRROR_PAGE_SIZE = int(os.getenv('GMAIL_MIRROR_PAGE_SIZE', 100))
+# History pages processed per sync; the rest is picked up by the next sync
+GMAIL_MIRROR_MAX_HISTORY_PAGES = int(
+    os.getenv('GMAIL_MIRROR_MAX_HISTORY_PAGES', 5),
+)
+
+# Backfill pages a single inbox query may trigger
+GMAIL_MIRROR_MAX_BACKFILL_PAGES = int(
+    os.getenv('GMAIL_MIRROR_MAX_BACKFILL_PAGES', 5),
+)
+
+METADATA_HEADERS = ['Subject', 'From', 'Date']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    user TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    thread_id TEXT,
+    internal_date INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    date TEXT NOT NULL,
+    snippet TEXT NOT NULL DEFAULT '',
+    body TEXT,
+    PRIMARY KEY (user, message_id)
+);
+CREATE INDEX IF NOT EXISTS messages_date ON messages (user, internal_date);
+CREATE TABLE IF NOT EXISTS message_labels (
+    user TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    label TEXT NOT NULL,
+    PRIMARY KEY (user, label, message_id)
+);
+CREATE INDEX IF NOT EXISTS message_labels_message
+    ON message_labels (user, message_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    user TEXT PRIMARY KEY,
+    history_id TEXT,
+    backfill_token TEXT,
+    backfill_done INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+User = Union[str, os.PathLike, None]
+
+
+def get_header(
+    headers: Sequence[Dict[str, str]], name: str, default: str,
+) -> str:
+    """Returns the value of the first header called `name`."""
+    return next((h['value'] for h in headers if h['name'] == name), default)
+
+
+class GmailMirror:
+    """
+    Local SQLite copy of the users' mailboxes.
+
+    Headers and labels of the newest messages are stored on the first sync,
+    together with the mailbox `historyId`. Later syncs replay
+    `users.history.list` from that ID, a bounded number of pages at a time,
+    saving progress after each page so an interrupted sync resumes where it
+    stopped. Older mail is backfilled lazily, one page at a time, when a
+    query needs it. Cleaned bodies are added the first time a message is
+    opened; Gmail messages never change, so they are kept forever.
+    """
+
+    def __init__(
+        self, path: str = GMAIL_MIRROR_PATH,
+        max_age: float = GMAIL_MIRROR_MAX_AGE,
+        page_size: int = GMAIL_MIRROR_PAGE_SIZE,
+        max_history_pages: int = GMAIL_MIRROR_MAX_HISTORY_PAGES,
+    ) -> None:
+        self.path = path
+        self.max_age = max_age
+        self.page_size = page_size
+        self.max_history_pages = max_history_pages
+        self._lock = threading.Lock()
+        # Serializes syncs so two tool calls do not replay the same history
+        self._sync_lock = threading.Lock()
+        self._db = connect_sqlite(path)
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    # Sync
+
+    def sync(self, service: Any, user: User = None) -> None:
+        """Brings the mirror of `user`'s mailbox up to date."""
+        from googleapiclient.errors import HttpError
+
+        user_key = str(user)
+        with self._sync_lock:
+            state = self._state(user_key)
+            if state and time.time() - state['synced_at'] < self.max_age:
+                return
+            if not state or not state['history_id']:
+                self._initial_sync(service, user_key)
+                return
+            try:
+                self._history_sync(service, user_key, state['history_id'])
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                # The history ID is too old, start over
+                logging.info('Gmail history expired, running a full sync')
+                self._clear(user_key)
+                self._initial_sync(service, user_key)
+
+    def has_synced(self, user: User = None) -> bool:
+        """Whether the initial sync of `user`'s mailbox has completed."""
+        state = self._state(str(user))
+        return bool(state and state['history_id'])
+
+    def _initial_sync(self, service: Any, user: str) -> None:
+        # Read the history ID first so nothing that arrives while listing
+        # is missed by the next incremental sync.
+        profile = service.users().getProfile(userId='me').execute()
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO sync_state '
+                '(user, history_id, backfill_token, backfill_done, synced_at) '
+                'VALUES (?, NULL, NULL, 0, 0)',
+                (user,),
+            )
+        self._backfill_page(service, user)
+        self._save_state(
+            user, history_id=profile['historyId'], synced_at=time.time(),
+        )
+
+    def _history_sync(
+        self, service: Any, user: str, history_id: str,
+    ) -> None:
+        params: Dict[str, Any] = {
+            'userId': 'me',
+            'startHistoryId': history_id,
+            'historyTypes': [
+                'messageAdded', 'messageDeleted',
+                'labelAdded', 'labelRemoved',
+            ],
+        }
+        for _ in range(self.max_history_pages):
+            response = service.users().history().list(**params).execute()
+            records = response.get('history', [])
+            self._apply_history(service, user, records)
+
+            if not response.get('nextPageToken'):
+                self._save_state(
+                    user, history_id=response['historyId'],
+                    synced_at=time.time(),
+                )
+                return
+            if records:
+                # Resume after the last applied record next time
+                self._save_state(user, history_id=records[-1]['id'])
+            params['pageToken'] = response['nextPageToken']
+
+    def _apply_history(
+        self, service: Any, user: str, records: List[Dict[str, Any]],
+    ) -> None:
+        added: Dict[str, None] = {}
+        deleted = set()
+        labels: Dict[str, List[str]] = {}
+        for record in records:
+            for change in record.get('messagesAdded', []):
+                added[change['message']['id']] = None
+                deleted.discard(change['message']['id'])
+            for change in record.get('messagesDeleted', []):
+                deleted.add(change['message']['id'])
+                added.pop(change['message']['id'], None)
+            for key in ('labelsAdded', 'labelsRemoved'):
+                for change in record.get(key, []):
+                    message = change['message']
+                    labels[message['id']] = message.get('labelIds', [])
+
+        with self._lock:
+            # Label changes on messages older than the mirror bring them in
+            for message_id in labels:
+                if message_id not in added and not self._db.execute(
+                    'SELECT 1 FROM messages WHERE user = ? AND message_id = ?',
+                    (user, message_id),
+                ).fetchone():
+                    added[message_id] = None
+
+        if added:
+            self._store_metadata(service, user, list(added))
+        with self._lock, self._db:
+            for message_id in deleted:
+                self._delete_message(user, message_id)
+            for message_id, label_ids in labels.items():
+                if message_id in added or message_id in deleted:
+                    continue
+                self._replace_labels(user, message_id, label_ids)
+
+    def backfill(self, service: Any, user: User = None) -> bool:
+        """
+        Mirrors the next page of older messages.
+
+        Returns:
+            bool: False once the whole mailbox has been mirrored.
+        """
+        user_key = str(user)
+        with self._sync_lock:
+            state = self._state(user_key)
+            if state and state['backfill_done']:
+                return False
+            return self._backfill_page(service, user_key)
+
+    def _backfill_page(self, service: Any, user: str) -> bool:
+        state = self._state(user)
+        params: Dict[str, Any] = {
+            'userId': 'me', 'maxResults': self.page_size,
+        }
+        if state and state['backfill_token']:
+            params['pageToken'] = state['backfill_token']
+        response = service.users().messages().list(**params).execute()
+        message_ids = [m['id'] for m in response.get('messages', [])]
+        self._store_metadata(service, user, message_ids)
+
+        next_token = response.get('nextPageToken')
+        self._save_state(
+            user, backfill_token=next_token, backfill_done=int(not next_token),
+        )
+        return bool(next_token)
+
+    def _store_metadata(
+        self, service: Any, user: str, message_ids: List[str],
+    ) -> None:
+        from googleapiclient.errors import HttpError
+
+        results = batch_get_messages(
+            service, message_ids, format='metadata',
+            metadataHeaders=METADATA_HEADERS,
+        )
+        with self._lock, self._db:
+            for message_id, message in zip(message_ids, results):
+                if (
+                    isinstance(message, HttpError)
+                    and message.resp.status == 404
+                ):
+                    # Deleted before we got to it
+                    self._delete_message(user, message_id)
+                elif isinstance(message, Exception):
+                    logging.warning(
+                        f'Failed to mirror message {message_id}: {message}',
+                    )
+                else:
+                    self._upsert_message(user, message)
+
+    # Reads and writes used by the tools
+
+    def inbox(
+        self, limit: int, since_ms: Optional[int] = None, user: User = None,
+    ) -> List[Dict[str, Any]]:
+        """Returns the newest inbox messages, newest first."""
+        query = (
+            'SELECT m.* FROM messages m JOIN message_labels l '
+            'ON l.user = m.user AND l.message_id = m.message_id '
+            "WHERE m.user = ? AND l.label = 'INBOX' "
+        )
+        params: List[Any] = [str(user)]
+        if since_ms is not None:
+            query += 'AND m.internal_date >= ? '
+            params.append(since_ms)
+        query += 'ORDER BY m.internal_date DESC LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def is_complete(
+        self, found: int, limit: int, since_ms: Optional[int] = None,
+        user: User = None,
+    ) -> bool:
+        """Whether an inbox query can be answered without older mail."""
+        if found >= limit:
+            return True
+        state = self._state(str(user))
+        if not state or state['backfill_done']:
+            return True
+        if since_ms is None:
+            return False
+        with self._lock:
+            row = self._db.execute(
+                'SELECT MIN(internal_date) AS oldest FROM messages '
+                'WHERE user = ?',
+                (str(user),),
+            ).fetchone()
+        return row['oldest'] is not None and row['oldest'] < since_ms
+
+    def message(
+        self, message_id: str, user: User = None,
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT * FROM messages WHERE user = ? AND message_id = ?',
+                (str(user), message_id),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def store_message(
+        self, message: Dict[str, Any], body: Optional[str] = None,
+        user: User = None,
+    ) -> None:
+        """Stores a message fetched by a tool, with its cleaned body."""
+        with self._lock, self._db:
+            self._upsert_message(str(user), message, body)
+
+    # Helpers, called with the lock held unless stated otherwise
+
+    def _upsert_message(
+        self, user: str, message: Dict[str, Any], body: Optional[str] = None,
+    ) -> None:
+        headers = message.get('payload', {}).get('headers', [])
+        self._db.execute(
+            'INSERT INTO messages (user, message_id, thread_id, '
+            'internal_date, subject, sender, date, snippet, body) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (user, message_id) DO UPDATE SET '
+            'thread_id = excluded.thread_id, '
+            'internal_date = excluded.internal_date, '
+            'subject = excluded.subject, sender = excluded.sender, '
+            'date = excluded.date, snippet = excluded.snippet, '
+            'body = COALESCE(excluded.body, messages.body)',
+            (
+                user, message['id'], message.get('threadId'),
+                int(message.get('internalDate', 0)),
+                get_header(headers, 'Subject', 'No Subject'),
+                get_header(headers, 'From', 'Unknown Sender'),
+                get_header(headers, 'Date', 'Unknown Date'),
+                message.get('snippet', ''), body,
+            ),
+        )
+        if 'labelIds' in message:
+            self._replace_labels(user, message['id'], message['labelIds'])
+
+    def _replace_labels(
+        self, user: str, message_id: str, label_ids: List[str],
+    ) -> None:
+        self._db.execute(
+            'DELETE FROM message_labels WHERE user = ? AND message_id = ?',
+            (user, message_id),
+        )
+        self._db.executemany(
+            'INSERT INTO message_labels VALUES (?, ?, ?)',
+            [(user, message_id, label) for label in label_ids],
+        )
+
+    def _delete_message(self, user: str, message_id: str) -> None:
+        for table in ('messages', 'message_labels'):
+            self._db.execute(
+                f'DELETE FROM {table} WHERE user = ? AND message_id = ?',
+                (user, message_id),
+            )
+
+    def _state(self, user: str) -> Optional[Dict[str, Any]]:
+        # Takes the lock itself
+        with self._lock:
+            row = self._db.execute(
+                'SELECT * FROM sync_state WHERE user = ?', (user,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def _save_state(self, user: str, **values: Any) -> None:
+        # Takes the lock itself
+        assignments = ', '.join(f'{column} = ?' for column in values)
+        with self._lock, self._db:
+            self._db.execute(
+                f'UPDATE sync_state SET {assignments} WHERE user = ?',
+                (*values.values(), user),
+            )
+
+    def _clear(self, user: str) -> None:
+        # Takes the lock itself
+        with self._lock, self._db:
+            for table in ('messages', 'message_labels', 'sync_state'):
+                self._db.execute(
+                    f'DELETE FROM {table} WHERE user = ?', (user,),
+                )
+
+
+_mirror: Optional[GmailMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_gmail_mirror() -> Optional[GmailMirror]:
+    """
+    Returns the process-wide Gmail mirror, opening it on first use.
+
+    Returns:
+        Optional[GmailMirror]: The mirror, or None if it is disabled by
+        setting `GMAIL_MIRROR_PATH` to an empty string.
+    """
+    global _mirror
+    if not GMAIL_MIRROR_PATH:
+        return None
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = GmailMirror(GMAIL_MIRROR_PATH)
+        return _mirror
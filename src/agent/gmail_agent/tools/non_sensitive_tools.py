@@ -1,17 +1,31 @@
 from __future__ import annotations
 
+import logging
+import threading
 from datetime import datetime
 from datetime import timedelta
+from datetime import timezone
 from pathlib import Path
+from typing import Any
 from typing import Optional
 
-from googleapiclient.discovery import build
 from langchain_core.tools import tool
 
 from ...shared.get_credentials import get_credentials
-from ...shared.utils import read_personal_info
+from ...shared.google_services import get_service
+from ...shared.utils import get_token_access_path
+from .cache import email_details_cache
+from .mirror import get_gmail_mirror
+from .mirror import get_header
+from .mirror import GMAIL_MIRROR_MAX_BACKFILL_PAGES
+from .mirror import GmailMirror
+from .utils import batch_get_messages
 from .utils import extract_clean_text
 
+# Held while the mirror and the embeddings are refreshed, so concurrent
+# searches do not sync and embed the same messages twice
+_refresh_lock = threading.Lock()
+
 
 @tool
 def fetch_inbox_messages(
@@ -33,19 +47,19 @@ def fetch_inbox_messages(
         str: A formatted string containing the message details
             (ID, sender, subject).
     """
-    personal_info = read_personal_info()
-    credentials_file_path = personal_info.get('token_access_path', None)
-    if credentials_file_path:
-        credentials_file_path = Path(
-            __file__,
-        ).parents[2] / Path(credentials_file_path)
-        creds = get_credentials(token_access_path=credentials_file_path)
-    else:
-        creds = get_credentials()
+    credentials_file_path = get_token_access_path()
+    creds = get_credentials(token_access_path=credentials_file_path)
 
     if not creds:
         return 'Failed to authenticate with Gmail API.'
-    service = build('gmail', 'v1', credentials=creds)
+    service = get_service('gmail', 'v1', creds, user=credentials_file_path)
+
+    mirror = get_gmail_mirror() if user_id == 'me' else None
+    if mirror:
+        return _inbox_from_mirror(
+            mirror, service, credentials_file_path, max_results, last_n_days,
+        )
+
     query = 'in:inbox'  # Base query to get only Inbox emails
 
     # If last_n_days is specified, calculate the date and update query
@@ -64,23 +78,21 @@ def fetch_inbox_messages(
     if not messages:
         return 'No messages found in the specified time range.'
     email_list = ['📩 **Inbox Emails**\n']
-    for msg in messages:
-        msg_id = msg['id']
-        message = service.users().messages().get(
-            userId=user_id, id=msg_id, format='metadata',
-            metadataHeaders=['Subject', 'From'],
-        ).execute()
+    message_ids = [msg['id'] for msg in messages]
+    details = batch_get_messages(
+        service, message_ids, user_id=user_id, format='metadata',
+        metadataHeaders=['Subject', 'From'],
+    )
+    for msg_id, message in zip(message_ids, details):
+        if isinstance(message, Exception):
+            email_list.append(
+                f'📧 Email ID: {msg_id}\nFailed to load message: {message}',
+            )
+            continue
         headers = message['payload']['headers']
 
-        subject = next(
-            (h['value'] for h in headers if h['name'] == 'Subject'),
-            'No Subject',
-        )
-
-        sender = next(
-            (h['value'] for h in headers if h['name'] == 'From'),
-            'Unknown Sender',
-        )
+        subject = get_header(headers, 'Subject', 'No Subject')
+        sender = get_header(headers, 'From', 'Unknown Sender')
 
         email_list.append(
             f'📧 Email ID: {msg_id}\nFrom: {sender}\nSubject: {subject}',
@@ -89,6 +101,57 @@ def fetch_inbox_messages(
     return result
 
 
+def _inbox_from_mirror(
+    mirror: GmailMirror, service: Any, user: Optional[Path],
+    max_results: int, last_n_days: Optional[int],
+) -> str:
+    mirror.sync(service, user=user)
+
+    since_ms = None
+    if last_n_days is not None:
+        # Same day granularity as Gmail's `after:` operator
+        date_since = (datetime.utcnow() - timedelta(days=last_n_days)).date()
+        since_ms = int(
+            datetime.combine(date_since, datetime.min.time())
+            .replace(tzinfo=timezone.utc)
+            .timestamp() * 1000,
+        )
+
+    messages = mirror.inbox(max_results, since_ms, user=user)
+    # Backfill older mail only when the mirror cannot answer yet
+    for _ in range(GMAIL_MIRROR_MAX_BACKFILL_PAGES):
+        if mirror.is_complete(len(messages), max_results, since_ms, user=user):
+            break
+        if not mirror.backfill(service, user=user):
+            messages = mirror.inbox(max_results, since_ms, user=user)
+            break
+        messages = mirror.inbox(max_results, since_ms, user=user)
+
+    if not messages:
+        return 'No messages found in the specified time range.'
+    email_list = ['📩 **Inbox Emails**\n']
+    for message in messages:
+        email_list.append(
+            f"📧 Email ID: {message['message_id']}\n"
+            f"From: {message['sender']}\nSubject: {message['subject']}",
+        )
+    return '\n'.join(email_list)
+
+
+def _format_email_details(
+    sender: str, subject: str, date: str, email_content: str,
+) -> str:
+    return (
+        f'📩 **Email Details**\n'
+        f"{'=' * 60}\n"
+        f'From: {sender}\n'
+        f'Subject: {subject}\n'
+        f'Date: {date}\n'
+        f'Content:\n\n'
+        f'{email_content}\n'
+    )
+
+
 @tool
 def get_email_details(message_id: str, user_id: str = 'me') -> str:
     """
@@ -103,19 +166,30 @@ def get_email_details(message_id: str, user_id: str = 'me') -> str:
         str: A formatted string containing the email details (sender, subject,
         date, and content).
     """
-    personal_info = read_personal_info()
-    credentials_file_path = personal_info.get('token_access_path', None)
-    if credentials_file_path:
-        credentials_file_path = Path(
-            __file__,
-        ).parents[2] / Path(credentials_file_path)
-        creds = get_credentials(
-            token_access_path=credentials_file_path,
-        )
-    else:
-        creds = get_credentials()
+    credentials_file_path = get_token_access_path()
+    cache_key = (str(credentials_file_path), user_id, message_id)
+    details = email_details_cache.get(cache_key)
+    if details:
+        return _format_email_details(**details)
+
+    creds = get_credentials(token_access_path=credentials_file_path)
     if creds:
-        service = build('gmail', 'v1', credentials=creds)
+        service = get_service(
+            'gmail', 'v1', creds, user=credentials_file_path,
+        )
+        mirror = get_gmail_mirror() if user_id == 'me' else None
+        if mirror:
+            cached = mirror.message(message_id, user=credentials_file_path)
+            if cached and cached['body'] is not None:
+                details = {
+                    'sender': cached['sender'],
+                    'subject': cached['subject'],
+                    'date': cached['date'],
+                    'email_content': cached['body'],
+                }
+                email_details_cache.put(cache_key, details)
+                return _format_email_details(**details)
+
         message = service.users().messages().get(
             userId=user_id, id=message_id, format='full',
         ).execute()
@@ -123,41 +197,90 @@ def get_email_details(message_id: str, user_id: str = 'me') -> str:
         headers = payload['headers']
 
         # Extract Details
-        subject = next(
-            (
-                header['value']
-                for header in headers if header['name'] == 'Subject'
-            ),
-            'No Subject',
-        )
-        sender = next(
-            (
-                header['value']
-                for header in headers if header['name'] == 'From'
-            ),
-            'Unknown Sender',
-        )
-        date = next(
-            (
-                header['value']
-                for header in headers if header['name'] == 'Date'
-            ),
-            'Unknown Date',
-        )
-        email_content = extract_clean_text(payload)
-        # Print Email Details
-        email_details = (
-            f'📩 **Email Details**\n'
-            f"{'=' * 60}\n"
-            f'From: {sender}\n'
-            f'Subject: {subject}\n'
-            f'Date: {date}\n'
-            f'Content:\n\n'
-            f'{email_content}\n'
-        )
-        return email_details
+        details = {
+            'sender': get_header(headers, 'From', 'Unknown Sender'),
+            'subject': get_header(headers, 'Subject', 'No Subject'),
+            'date': get_header(headers, 'Date', 'Unknown Date'),
+            'email_content': extract_clean_text(payload),
+        }
+        if mirror:
+            mirror.store_message(
+                message, body=details['email_content'],
+                user=credentials_file_path,
+            )
+        email_details_cache.put(cache_key, details)
+        return _format_email_details(**details)
     return 'Failed to fetch email details due to authentication issues.'
 
 
+@tool
+def search_emails(query: str, max_results: int = 10) -> str:
+    """
+    Searches the user's emails by keywords and meaning, e.g. "invoice from
+    Acme last spring". Matches the subject, sender and email content.
+
+    Args:
+        query (str): What to look for, in natural language or keywords.
+        max_results (int, optional): The maximum number of emails to return.
+            Defaults to 10.
+
+    Returns:
+        str: A formatted string listing the best matching emails, best first
+            (ID, sender, subject, date and a preview).
+    """
+    mirror = get_gmail_mirror()
+    if not mirror:
+        return 'Email search is disabled because GMAIL_MIRROR_PATH is empty.'
+
+    credentials_file_path = get_token_access_path()
+    creds = get_credentials(token_access_path=credentials_file_path)
+    if not creds:
+        return 'Failed to authenticate with Gmail API.'
+    service = get_service('gmail', 'v1', creds, user=credentials_file_path)
+    # Imported here so the tools need neither Azure settings nor NumPy
+    # until used
+    from llm import get_embeddings
+
+    from .search import get_email_search_index
+
+    embeddings = get_embeddings()
+    index = get_email_search_index(
+        mirror.path,
+        embed_documents=embeddings.embed_documents,
+        embed_query=embeddings.embed_query,
+    )
+
+    def refresh() -> None:
+        try:
+            mirror.sync(service, user=credentials_file_path)
+            index.update_embeddings(user=credentials_file_path)
+        except Exception as e:
+            logging.warning(f'Failed to refresh the email index: {e}')
+        finally:
+            _refresh_lock.release()
+
+    if mirror.has_synced(user=credentials_file_path):
+        # Answer from the local index now, pick up new mail for next time,
+        # unless a refresh is already in flight
+        if _refresh_lock.acquire(blocking=False):
+            threading.Thread(target=refresh, daemon=True).start()
+    else:
+        _refresh_lock.acquire()
+        refresh()
+
+    hits = index.search(query, max_results, user=credentials_file_path)
+    if not hits:
+        return f'No emails found matching "{query}".'
+    email_list = [f'🔎 **Emails matching "{query}"**\n']
+    for hit in hits:
+        preview = hit['body'] if hit['body'] is not None else hit['snippet']
+        email_list.append(
+            f"📧 Email ID: {hit['message_id']}\n"
+            f"From: {hit['sender']}\nSubject: {hit['subject']}\n"
+            f"Date: {hit['date']}\nPreview: {preview[:200]}",
+        )
+    return '\n'.join(email_list)
+
+
 # get_email_details(message_id="195b3c980ad27ca2")
 # list_messages(last_n_days=2)
@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+
+from ...shared.local_db import connect_sqlite
+
+# Candidates taken from each ranker before the results are fused
+EMAIL_SEARCH_CANDIDATES = int(os.getenv('EMAIL_SEARCH_CANDIDATES', 100))
+# Messages embedded per search call; the rest are embedded by later calls
+EMAIL_SEARCH_EMBED_BATCH = int(os.getenv('EMAIL_SEARCH_EMBED_BATCH', 256))
+# Reciprocal rank fusion constant
+RRF_K = 60
+
+# Characters of the body that are embedded, to bound the embedding cost
+EMBED_BODY_CHARS = 2000
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    subject, sender, body,
+    content='',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS message_embeddings (
+    user TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    has_body INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (user, message_id)
+);
+CREATE INDEX IF NOT EXISTS message_embeddings_seq
+    ON message_embeddings (user, seq);
+CREATE TABLE IF NOT EXISTS embedding_sequence (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO embedding_sequence VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages
+BEGIN
+    INSERT INTO messages_fts (rowid, subject, sender, body) VALUES (
+        new.rowid, new.subject, new.sender, COALESCE(new.body, new.snippet)
+    );
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages
+BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, body)
+    VALUES (
+        'delete', old.rowid, old.subject, old.sender,
+        COALESCE(old.body, old.snippet)
+    );
+    DELETE FROM message_embeddings
+    WHERE user = old.user AND message_id = old.message_id;
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE ON messages
+BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, body)
+    VALUES (
+        'delete', old.rowid, old.subject, old.sender,
+        COALESCE(old.body, old.snippet)
+    );
+    INSERT INTO messages_fts (rowid, subject, sender, body) VALUES (
+        new.rowid, new.subject, new.sender, COALESCE(new.body, new.snippet)
+    );
+END;
+"""
+
+EmbedDocuments = Callable[[List[str]], List[List[float]]]
+EmbedQuery = Callable[[str], List[float]]
+User = Union[str, os.PathLike, None]
+
+
+# Words too common to say anything about relevance
+STOPWORDS = frozenset(
+    'a an and are as at be by email emails for from in is it me mail my of '
+    'on or the to with'.split(),
+)
+
+
+def to_fts_query(text: str) -> str:
+    """Turns free text into an FTS5 query matching any of its words."""
+    words = [
+        word for word in re.findall(r'\w+', text.lower())
+        if word not in STOPWORDS
+    ]
+    return ' OR '.join(f'"{word}"' for word in dict.fromkeys(words))
+
+
+def _document(row: Any) -> str:
+    body = row['body'] if row['body'] is not None else row['snippet']
+    return (
+        f"Subject: {row['subject']}\nFrom: {row['sender']}\n"
+        f'{(body or "")[:EMBED_BODY_CHARS]}'
+    )
+
+
+class _VectorMatrix:
+    def __init__(self, dimensions: int) -> None:
+        self.version = 0
+        self.message_ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.vectors = np.zeros((0, dimensions), dtype=np.float32)
+
+
+class EmailSearchIndex:
+    """
+    Hybrid keyword and semantic search over the mirrored mailbox.
+
+    Keyword relevance comes from an FTS5 table over subject, sender and
+    cleaned body (or the snippet until the body is known), scored with
+    BM25. Triggers on the mirror's `messages` table keep it current as mail
+    arrives. Semantic relevance is the cosine similarity between the query
+    embedding and precomputed message embeddings, held per user in a
+    normalized float32 NumPy matrix. Both rankings are merged with
+    reciprocal rank fusion.
+    """
+
+    def __init__(
+        self, path: str,
+        embed_documents: Optional[EmbedDocuments] = None,
+        embed_query: Optional[EmbedQuery] = None,
+        candidates: int = EMAIL_SEARCH_CANDIDATES,
+        embed_batch: int = EMAIL_SEARCH_EMBED_BATCH,
+    ) -> None:
+        self.embed_documents = embed_documents
+        self.embed_query = embed_query
+        self.candidates = candidates
+        self.embed_batch = embed_batch
+        self._lock = threading.Lock()
+        self._matrices: Dict[str, _VectorMatrix] = {}
+        self._db = connect_sqlite(path)
+        with self._lock, self._db:
+            created = not self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'",
+            ).fetchone()
+            self._db.executescript(SCHEMA)
+            if created:
+                # Index the messages mirrored before the index existed
+                self._db.execute(
+                    'INSERT INTO messages_fts (rowid, subject, sender, body) '
+                    'SELECT rowid, subject, sender, COALESCE(body, snippet) '
+                    'FROM messages',
+                )
+
+    def search(
+        self, query: str, limit: int = 10, user: User = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the messages that best match `query`, best first.
+
+        Each hit holds the mirrored message columns plus its fused `score`.
+        """
+        user_key = str(user)
+        rankings = [self._keyword_ranking(query, user_key)]
+        if self.embed_query is not None:
+            try:
+                rankings.append(self._vector_ranking(query, user_key))
+            except Exception as e:
+                logging.warning(f'Semantic email search unavailable: {e}')
+
+        scores: Dict[int, float] = {}
+        for ranking in rankings:
+            for rank, rowid in enumerate(ranking):
+                scores[rowid] = scores.get(rowid, 0.0) + 1 / (RRF_K + rank + 1)
+        best = sorted(scores, key=scores.__getitem__, reverse=True)[:limit]
+        if not best:
+            return []
+
+        placeholders = ', '.join('?' * len(best))
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT rowid, * FROM messages '
+                f'WHERE rowid IN ({placeholders})',
+                best,
+            ).fetchall()
+        by_rowid = {row['rowid']: dict(row) for row in rows}
+        hits = []
+        for rowid in best:
+            if rowid in by_rowid:
+                hits.append({**by_rowid[rowid], 'score': scores[rowid]})
+        return hits
+
+    def _keyword_ranking(self, query: str, user: str) -> List[int]:
+        fts_query = to_fts_query(query)
+        if not fts_query:
+            return []
+        with self._lock:
+            # Rank in FTS first, so only the best matches are joined.
+            # The mirror rarely holds more than one user.
+            rows = self._db.execute(
+                'SELECT m.rowid FROM ('
+                '    SELECT rowid, bm25(messages_fts, 4.0, 2.0, 1.0) AS rank'
+                '    FROM messages_fts WHERE messages_fts MATCH ?'
+                '    ORDER BY rank LIMIT ?'
+                ') f JOIN messages m ON m.rowid = f.rowid '
+                'WHERE m.user = ? ORDER BY f.rank LIMIT ?',
+                (fts_query, self.candidates * 4, user, self.candidates),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _vector_ranking(self, query: str, user: str) -> List[int]:
+        matrix = self._matrix(user)
+        if not matrix.message_ids:
+            return []
+        assert self.embed_query is not None
+        vector = np.asarray(self.embed_query(query), dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+
+        similarities = matrix.vectors @ vector
+        k = min(self.candidates, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        message_ids = [matrix.message_ids[i] for i in top]
+
+        placeholders = ', '.join('?' * len(message_ids))
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT rowid, message_id FROM messages '
+                f'WHERE user = ? AND message_id IN ({placeholders})',
+                (user, *message_ids),
+            ).fetchall()
+        rowids = {row['message_id']: row['rowid'] for row in rows}
+        return [rowids[i] for i in message_ids if i in rowids]
+
+    def update_embeddings(self, user: User = None) -> int:
+        """
+        Embeds up to `embed_batch` messages that have no embedding yet, or
+        whose body arrived after they were embedded.
+
+        Returns:
+            int: The number of messages embedded.
+        """
+        if self.embed_documents is None:
+            return 0
+        user_key = str(user)
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT m.message_id, m.subject, m.sender, m.snippet, m.body '
+                'FROM messages m LEFT JOIN message_embeddings e '
+                'ON e.user = m.user AND e.message_id = m.message_id '
+                'WHERE m.user = ? AND (e.message_id IS NULL '
+                'OR (e.has_body = 0 AND m.body IS NOT NULL)) '
+                'ORDER BY m.internal_date DESC LIMIT ?',
+                (user_key, self.embed_batch),
+            ).fetchall()
+        if not rows:
+            return 0
+
+        vectors = self.embed_documents([_document(row) for row in rows])
+        self.add_embeddings(
+            [
+                (row['message_id'], row['body'] is not None, vector)
+                for row, vector in zip(rows, vectors)
+            ],
+            user=user,
+        )
+        return len(rows)
+
+    def add_embeddings(
+        self, embeddings: List[Tuple[str, bool, List[float]]],
+        user: User = None,
+    ) -> None:
+        """Stores `(message_id, has_body, vector)` embeddings."""
+        user_key = str(user)
+        vectors = []
+        for message_id, has_body, vector in embeddings:
+            array = np.asarray(vector, dtype=np.float32)
+            array /= np.linalg.norm(array) or 1.0
+            vectors.append((message_id, int(has_body), array.tobytes()))
+        with self._lock, self._db:
+            # rowids and MAX(seq) go back down after deletes and replaces;
+            # a counter that only grows lets `_matrix` see every write
+            self._db.execute(
+                'UPDATE embedding_sequence SET value = value + ?',
+                (len(vectors),),
+            )
+            last = self._db.execute(
+                'SELECT value FROM embedding_sequence',
+            ).fetchone()[0]
+            first = last - len(vectors) + 1
+            self._db.executemany(
+                'INSERT OR REPLACE INTO message_embeddings '
+                'VALUES (?, ?, ?, ?, ?)',
+                [
+                    (user_key, *vector, first + i)
+                    for i, vector in enumerate(vectors)
+                ],
+            )
+
+    def _matrix(self, user: str) -> _VectorMatrix:
+        """Returns the user's vectors, loading only rows written since the
+        last call."""
+        with self._lock:
+            matrix = self._matrices.get(user)
+            rows = self._db.execute(
+                'SELECT seq, message_id, vector FROM message_embeddings '
+                'WHERE user = ? AND seq > ? ORDER BY seq',
+                (user, matrix.version if matrix else 0),
+            ).fetchall()
+            if matrix is None:
+                dimensions = (len(rows[0]['vector']) // 4) if rows else 0
+                matrix = _VectorMatrix(dimensions)
+                self._matrices[user] = matrix
+            if not rows:
+                return matrix
+
+            new_ids: List[str] = []
+            new_vectors = []
+            for row in rows:
+                vector = np.frombuffer(row['vector'], dtype=np.float32)
+                position = matrix.rows.get(row['message_id'])
+                if position is not None:
+                    matrix.vectors[position] = vector
+                else:
+                    matrix.rows[row['message_id']] = (
+                        len(matrix.message_ids) + len(new_ids)
+                    )
+                    new_ids.append(row['message_id'])
+                    new_vectors.append(vector)
+            if new_vectors:
+                matrix.vectors = np.vstack(
+                    [matrix.vectors.reshape(-1, len(new_vectors[0]))]
+                    + [np.stack(new_vectors)],
+                )
+                matrix.message_ids.extend(new_ids)
+            matrix.version = rows[-1]['seq']
+            return matrix
+
+
+_index: Optional[EmailSearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_email_search_index(
+    path: str,
+    embed_documents: Optional[EmbedDocuments] = None,
+    embed_query: Optional[EmbedQuery] = None,
+) -> EmailSearchIndex:
+    """
+    Returns the process-wide search index over the Gmail mirror at `path`,
+    opening it on first use.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = EmailSearchIndex(
+                path, embed_documents=embed_documents, embed_query=embed_query,
+            )
+        return _index
@@ -2,13 +2,12 @@ from __future__ import annotations
 
 import base64
 from email.mime.text import MIMEText
-from pathlib import Path
 
-from googleapiclient.discovery import build
 from langchain_core.tools import tool
 
 from ...shared.get_credentials import get_credentials
-from ...shared.utils import read_personal_info
+from ...shared.google_services import get_service
+from ...shared.utils import get_token_access_path
 
 
 @tool
@@ -28,20 +27,11 @@ def send_email(to_email: str, subject: str, message_body: str) -> str:
         str: A success message if the email is sent successfully, or an error
         message if it fails.
     """
-    personal_info = read_personal_info()
-    credentials_file_path = personal_info.get('token_access_path', None)
-    if credentials_file_path:
-        credentials_file_path = Path(
-            __file__,
-        ).parents[2] / Path(credentials_file_path)
-        creds = get_credentials(
-            token_access_path=credentials_file_path,
-        )
-    else:
-        creds = get_credentials()
+    credentials_file_path = get_token_access_path()
+    creds = get_credentials(token_access_path=credentials_file_path)
     if not creds:
         return 'Failed to retrieve credentials. Email not sent.'
-    service = build('gmail', 'v1', credentials=creds)
+    service = get_service('gmail', 'v1', creds, user=credentials_file_path)
 
     # Create email message
     message = MIMEText(message_body)
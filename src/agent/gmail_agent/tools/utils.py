@@ -1,12 +1,25 @@
 from __future__ import annotations
 
 import base64
+import os
 import re
+from html.parser import HTMLParser
 from typing import Any
 from typing import Dict
+from typing import List
 from typing import Optional
+from typing import Sequence
+from typing import Union
 
-from bs4 import BeautifulSoup
+# Gmail accepts up to 100 calls per batch but recommends at most 50
+GMAIL_BATCH_SIZE = 50
+# Decoded bytes of body text processed per message; the rest is dropped
+EMAIL_BODY_MAX_BYTES = int(os.getenv('EMAIL_BODY_MAX_BYTES', 1_000_000))
+
+# Zero-width spaces, soft hyphens and Combining Grapheme Joiner (CGJ)
+_INVISIBLE_CHARS = dict.fromkeys(map(ord, '\u200B\u200C\u00AD\u034F'))
+_URL = re.compile(r'http[s]?://\S+')
+_CHARSET = re.compile(r'charset="?([\w.:-]+)', re.IGNORECASE)
 
 
 def remove_invisible_chars(text: str) -> str:
@@ -19,59 +32,214 @@ def remove_invisible_chars(text: str) -> str:
     Returns:
         str: The cleaned text without invisible characters.
     """
-    return re.sub(r'[\u200B\u200C\u00AD\u034F]', '', text)
+    return text.translate(_INVISIBLE_CHARS)
 
 
-def decode_base64(data: Optional[str]) -> str:
+def decode_base64(
+    data: Optional[str], max_bytes: Optional[int] = None,
+    encoding: str = 'utf-8',
+) -> str:
     """Decodes a base64url encoded Gmail message content.
 
     Args:
         data (Optional[str]): The base64url encoded string.
+        max_bytes (Optional[int]): Decode at most this many bytes; only the
+            matching prefix of `data` is decoded. Defaults to no limit.
+        encoding (str): The character set of the decoded bytes.
 
     Returns:
-        str: The decoded UTF-8 string, with errors ignored.
+        str: The decoded string, with errors ignored.
     """
     if not data:
         return ''
+    if max_bytes is not None and len(data) > (max_bytes + 2) // 3 * 4:
+        # Every 4 base64 characters encode 3 bytes
+        data = data[:(max_bytes + 2) // 3 * 4]
+    data += '=' * (-len(data) % 4)
     decoded_bytes = base64.urlsafe_b64decode(data)
-    return decoded_bytes.decode('utf-8', errors='ignore')
+    try:
+        return decoded_bytes.decode(encoding, errors='ignore')
+    except LookupError:
+        return decoded_bytes.decode('utf-8', errors='ignore')
+
 
+class HTMLTextExtractor(HTMLParser):
+    """Converts HTML to text in a single streaming pass.
+
+    Text is collected as the parser emits it, with a space at every tag as
+    `BeautifulSoup.get_text(separator=' ')` does, but no document tree is
+    built. The content of `script`, `style`, `template` and `head` is
+    skipped. HTML allows leaving out `</head>`, so the head also ends at the
+    first tag that cannot be part of it, such as `<body>`.
+    """
 
-def extract_clean_text(payload: Dict[str, Any]) -> str:
+    SKIPPED_TAGS = frozenset({'script', 'style', 'template'})
+    # Tags allowed in `head`; any other start tag begins the body
+    HEAD_TAGS = frozenset({
+        'base', 'link', 'meta', 'noscript', 'script', 'style', 'template',
+        'title',
+    })
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.chunks: List[str] = []
+        self._skip_depth = 0
+        self._in_head = False
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        if tag == 'head':
+            self._in_head = True
+        elif self._in_head and tag not in self.HEAD_TAGS:
+            self._in_head = False
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+        self.chunks.append(' ')
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == 'head':
+            self._in_head = False
+        if tag in self.SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        self.chunks.append(' ')
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip_depth and not self._in_head:
+            self.chunks.append(data)
+
+    def text(self) -> str:
+        return ''.join(self.chunks)
+
+
+def html_to_text(html_content: str) -> str:
+    """Returns the text of an HTML document or fragment."""
+    extractor = HTMLTextExtractor()
+    extractor.feed(html_content)
+    extractor.close()
+    return extractor.text()
+
+
+def _charset(part: Dict[str, Any]) -> str:
+    for header in part.get('headers', []):
+        if header['name'].lower() == 'content-type':
+            match = _CHARSET.search(header['value'])
+            if match:
+                return match.group(1)
+    return 'utf-8'
+
+
+def _text_parts(part: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Returns the parts that make up the readable body of `part`.
+
+    Multipart trees are walked recursively. Of the alternatives in a
+    `multipart/alternative`, the one made of `text/plain` parts is preferred
+    and HTML is only used when there is no plain text. Attachments are
+    skipped.
+    """
+    mime_type = part.get('mimeType', '')
+    if 'parts' in part or mime_type.startswith('multipart/'):
+        children = [
+            parts for parts in map(_text_parts, part.get('parts', []))
+            if parts
+        ]
+        if mime_type != 'multipart/alternative':
+            return [text_part for parts in children for text_part in parts]
+        for parts in children:
+            if all(p['mimeType'] == 'text/plain' for p in parts):
+                return parts
+        # Alternatives are ordered from plainest to richest
+        return children[-1] if children else []
+    if mime_type in ('text/plain', 'text/html') and not part.get('filename'):
+        return [part]
+    return []
+
+
+def extract_clean_text(
+    payload: Dict[str, Any], max_bytes: int = EMAIL_BODY_MAX_BYTES,
+) -> str:
     """Extracts and cleans text content from an email payload.
 
-    - Decodes base64-encoded text.
-    - Extracts plain text from `text/plain` or `text/html` parts.
+    - Walks nested multipart bodies, preferring `text/plain` over
+      `text/html` alternatives.
+    - Decodes base64-encoded text, at most `max_bytes` in total.
+    - Converts HTML to plain text.
     - Removes invisible characters.
     - Strips URLs.
     - Normalizes whitespace.
 
     Args:
         payload (Dict[str, Any]): The email payload containing body content.
+        max_bytes (int): Maximum number of decoded body bytes to process.
+            Defaults to `EMAIL_BODY_MAX_BYTES`.
 
     Returns:
         str: The cleaned email body text.
     """
-    body = ''
-
-    if 'parts' in payload:
-        for part in payload['parts']:
-            if part['mimeType'] == 'text/plain':
-                body = decode_base64(part['body'].get('data', ''))
-            elif part['mimeType'] == 'text/html':
-                html_content = decode_base64(part['body'].get('data', ''))
-                soup = BeautifulSoup(html_content, 'html.parser')
-                body = soup.get_text(separator=' ')
-    else:
-        if payload['mimeType'] == 'text/plain':
-            body = decode_base64(payload['body'].get('data', ''))
-        elif payload['mimeType'] == 'text/html':
-            html_content = decode_base64(payload['body'].get('data', ''))
-            soup = BeautifulSoup(html_content, 'html.parser')
-            body = soup.get_text(separator=' ')
-
-    body = remove_invisible_chars(body)
-    body = re.sub(r'http[s]?://\S+', '', body)  # Remove URLs
+    texts = []
+    remaining = max_bytes
+    for part in _text_parts(payload):
+        if remaining <= 0:
+            break
+        data = part.get('body', {}).get('data', '')
+        text = decode_base64(
+            data, max_bytes=remaining, encoding=_charset(part),
+        )
+        remaining -= len(data) * 3 // 4
+        if part['mimeType'] == 'text/html':
+            text = html_to_text(text)
+        texts.append(text)
+
+    body = remove_invisible_chars(' '.join(texts))
+    body = _URL.sub('', body)  # Remove URLs
     body = ' '.join(body.split())  # Remove extra whitespace
 
     return body
+
+
+def batch_get_messages(
+    service: Any, message_ids: Sequence[str], user_id: str = 'me',
+    **get_kwargs: Any,
+) -> List[Union[Dict[str, Any], Exception]]:
+    """Fetches several messages with Gmail batch HTTP requests.
+
+    Up to `GMAIL_BATCH_SIZE` `users.messages.get` calls are sent in a single
+    round trip instead of one request per message.
+
+    Args:
+        service (Any): An authorized Gmail API service object.
+        message_ids (Sequence[str]): IDs of the messages to fetch.
+        user_id (str, optional): The user's email ID. Defaults to "me".
+        **get_kwargs (Any): Extra arguments for `users.messages.get`,
+            e.g. `format='metadata'`.
+
+    Returns:
+        List[Union[Dict[str, Any], Exception]]: One entry per message ID, in
+        the same order. A message that could not be fetched is represented
+        by the exception raised for it, so one failure does not affect the
+        other messages.
+    """
+    results: List[Union[Dict[str, Any], Exception]] = [
+        RuntimeError('No response received') for _ in message_ids
+    ]
+
+    def callback(request_id: str, response: Any, exception: Any) -> None:
+        results[int(request_id)] = (
+            exception if exception is not None else response
+        )
+
+    for start in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+        end = min(start + GMAIL_BATCH_SIZE, len(message_ids))
+        batch = service.new_batch_http_request(callback=callback)
+        for index in range(start, end):
+            batch.add(
+                service.users().messages().get(
+                    userId=user_id, id=message_ids[index], **get_kwargs,
+                ),
+                request_id=str(index),
+            )
+        try:
+            batch.execute()
+        except Exception as e:
+            for index in range(start, end):
+                results[index] = e
+
+    return results
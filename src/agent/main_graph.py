@@ -1,41 +1,62 @@
 from __future__ import annotations
 
-from langchain_openai import AzureOpenAIEmbeddings
-from langgraph.checkpoint.memory import MemorySaver
+import threading
+from typing import Any
+from typing import Optional
+
 from langgraph.graph import START
 from langgraph.graph import StateGraph
-from langgraph.store.memory import InMemoryStore
+from langgraph.graph.state import CompiledStateGraph
 
 from .main_graph_nodes import calendar_agent_node
 from .main_graph_nodes import classifier_node
 from .main_graph_nodes import gmail_agent_node
 from .main_graph_nodes import normal_chatbot
+from .main_graph_nodes import router_node
+from .main_graph_nodes import SINGLE_CALL_ROUTING
 from .main_graph_nodes import supervisor_node
+from .shared.checkpointer import get_checkpointer
 from .state import AssistantState
 
 
-memory = MemorySaver()
-embeddings = AzureOpenAIEmbeddings(
-    model='text-embedding-3-large',
-    dimensions=1536,
-)
-store = InMemoryStore(
-    index={
-        'embed': embeddings,
-    },
-)
-
-builder = StateGraph(AssistantState)
-builder.add_edge(START, 'classifier')
-
-builder.add_node('classifier', classifier_node)
-builder.add_node('supervisor', supervisor_node)
-builder.add_node('normal_chatbot', normal_chatbot)
-builder.add_node('calendar_agent', calendar_agent_node)
-builder.add_node('gmail_agent', gmail_agent_node)
-graph = builder.compile(checkpointer=memory, store=store)
-
-# save image of graph
-graph.get_graph().draw_mermaid_png(
-    output_file_path='images/supervisors.png',
-)
+def build_graph() -> CompiledStateGraph:
+    """Builds and compiles the assistant graph."""
+    # The store pulls in NumPy and the embeddings client; load it with
+    # the graph rather than on import
+    from .shared.vector_store import get_memory_store
+
+    builder = StateGraph(AssistantState)
+    if SINGLE_CALL_ROUTING:
+        builder.add_edge(START, 'router')
+        builder.add_node('router', router_node)
+    else:
+        builder.add_edge(START, 'classifier')
+        builder.add_node('classifier', classifier_node)
+    builder.add_node('supervisor', supervisor_node)
+    builder.add_node('normal_chatbot', normal_chatbot)
+    builder.add_node('calendar_agent', calendar_agent_node)
+    builder.add_node('gmail_agent', gmail_agent_node)
+    return builder.compile(
+        checkpointer=get_checkpointer(), store=get_memory_store(),
+    )
+
+
+_graph: Optional[CompiledStateGraph] = None
+_graph_lock = threading.Lock()
+
+
+def get_graph() -> CompiledStateGraph:
+    """Returns the assistant graph, compiling it on first use."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = build_graph()
+        return _graph
+
+
+def __getattr__(name: str) -> Any:
+    # `from agent.main_graph import graph` keeps working, but compiles the
+    # graph only when it is first accessed
+    if name == 'graph':
+        return get_graph()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
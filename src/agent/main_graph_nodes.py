@@ -1,23 +1,44 @@
 from __future__ import annotations
 
+import logging
+import os
 from enum import Enum
 from typing import Literal
+from typing import Optional
 
 from langchain_core.messages import HumanMessage
+from langchain_core.messages import trim_messages
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END
 from langgraph.types import Command
-from llm import model
+from langgraph.types import Send
+from llm import get_model
+from llm import structured_llm
 from pydantic import BaseModel
 from pydantic import Field
 from typing_extensions import TypedDict
 
-from .calendar_agent.agent import graph as calendar_agent
-from .gmail_agent.agent import graph as gmail_agent
+from .calendar_agent.agent import get_graph as get_calendar_agent
+from .gmail_agent.agent import get_graph as get_gmail_agent
+from .pre_classifier import pre_classifier
 from .prompt import CLASSIFY_SYSTEM_PROMPT
+from .prompt import ROUTER_SYSTEM_PROMPT
 from .prompt import SUPERVISOR_SYSTEM_PROMPT
+from .shared.context import get_context_window
 from .state import AssistantState
 
+NORMAL_CHATBOT_SYSTEM_PROMPT = (
+    'You are a helpful AI Assistant. '
+    'Try to answer user question as best as possible.'
+)
+
+# Route with a single LLM call instead of the classifier and supervisor
+SINGLE_CALL_ROUTING = os.getenv(
+    'SINGLE_CALL_ROUTING', 'false',
+).lower() in ('1', 'true', 'yes')
+# Number of recent messages the router sees
+ROUTER_HISTORY_MESSAGES = int(os.getenv('ROUTER_HISTORY_MESSAGES', 6))
+
 
 class ConversationType(str, Enum):
     normal = 'normal'    # Does not require Gmail or Calendar
@@ -32,25 +53,59 @@ class ClassificationOutput(BaseModel):
     )
 
 
+class RouteOutput(BaseModel):
+    """Classifies the user query and picks the worker that acts first."""
+    classification: ConversationType = Field(
+        ...,
+        description=(
+            "Either 'normal' (no tool access needed) or 'advanced' "
+            '(Gmail or Calendar access needed)'
+        ),
+    )
+    next: Literal['normal_chatbot', 'calendar_agent', 'gmail_agent'] = Field(
+        ...,
+        description=(
+            "The worker to act first; 'normal_chatbot' for normal queries"
+        ),
+    )
+
+
 class Router(TypedDict):
-    """Worker to route to next. If no workers needed, route to FINISH."""
-    next: Literal['calendar_agent', 'gmail_agent', 'FINISH']
+    """
+    Worker to route to next, or 'both' to run the calendar and Gmail
+    workers at the same time. If no workers needed, route to FINISH.
+    """
+    next: Literal['calendar_agent', 'gmail_agent', 'both', 'FINISH']
+
 
+# Workers the supervisor dispatches concurrently when it answers 'both'
+PARALLEL_WORKERS = ('calendar_agent', 'gmail_agent')
 
-def classifier_node(state: AssistantState):
+
+async def llm_classify(message) -> Optional[str]:
+    """Classifies a user message with the LLM, or returns None."""
     messages = [
         {
             'role': 'system',
             'content': CLASSIFY_SYSTEM_PROMPT,
         },
-    ] + [state['messages'][-1]]
-    response = model.with_structured_output(
-        ClassificationOutput,
-    ).invoke(messages)
-    classifier_output = None
+    ] + [message]
+    response = await structured_llm(
+        ClassificationOutput, 'classifier',
+    ).ainvoke(messages)
     if isinstance(response, ClassificationOutput):
-        classifier_output = response.classification.value
-        print('Classification output', classifier_output)
+        return response.classification.value
+    return None
+
+
+async def classifier_node(state: AssistantState):
+    message = state['messages'][-1]
+    # Obvious messages are classified locally, without an LLM round trip
+    classifier_output = pre_classifier.classify(str(message.content))
+    if not classifier_output:
+        classifier_output = await llm_classify(message)
+        logging.debug(f'Classification: {classifier_output}')
+    logging.debug(f'Pre-classifier: {pre_classifier.stats()}')
 
     if not classifier_output or classifier_output == ConversationType.normal.value:
         return Command(goto='normal_chatbot')
@@ -58,15 +113,59 @@ def classifier_node(state: AssistantState):
         return Command(goto='supervisor')
 
 
-def normal_chatbot(state: AssistantState):
+async def router_node(
+    state: AssistantState,
+) -> Command[
+    Literal['normal_chatbot', 'calendar_agent', 'gmail_agent', 'supervisor']
+]:
+    message = state['messages'][-1]
+    # The router LLM also picks the worker, so only 'normal' skips it
+    classifier_output = pre_classifier.classify(
+        str(message.content), labels=(ConversationType.normal.value,),
+    )
+    if classifier_output == ConversationType.normal.value:
+        logging.debug('Pre-classified as normal, skipping the router')
+        return Command(goto='normal_chatbot')
+
+    history = trim_messages(
+        state['messages'],
+        strategy='last',
+        token_counter=len,
+        max_tokens=ROUTER_HISTORY_MESSAGES,
+        start_on='human',
+    )
+    messages = [
+        {
+            'role': 'system',
+            'content': ROUTER_SYSTEM_PROMPT,
+        },
+    ] + history
+    response = await structured_llm(RouteOutput, 'router').ainvoke(messages)
+    logging.debug(f'Route: {response}')
+
+    goto = 'normal_chatbot'
+    if isinstance(response, RouteOutput):
+        if response.classification == ConversationType.advanced:
+            # An advanced query without a worker is left to the supervisor
+            goto = (
+                response.next if response.next != 'normal_chatbot'
+                else 'supervisor'
+            )
+    return Command(goto=goto, update={'next': goto})
+
+
+async def normal_chatbot(state: AssistantState):
+    history = await get_context_window().fit(
+        state['messages'], NORMAL_CHATBOT_SYSTEM_PROMPT, 'normal_chatbot',
+    )
     messages = [
         {
             'role': 'system',
-            'content': 'You are a helpful AI Assistant. Try to answer user question as best as possible.',
+            'content': NORMAL_CHATBOT_SYSTEM_PROMPT,
         },
-    ] + state['messages']
+    ] + history
     final_message = ''
-    for response in model.stream(messages):
+    async for response in get_model().astream(messages):
         final_message += response.content
 
     # update state
@@ -83,27 +182,39 @@ def normal_chatbot(state: AssistantState):
     )
 
 
-def supervisor_node(
+async def supervisor_node(
     state: AssistantState,
 ) -> Command[Literal['calendar_agent', 'gmail_agent', '__end__']]:
+    history = await get_context_window().fit(
+        state['messages'], SUPERVISOR_SYSTEM_PROMPT, 'supervisor',
+    )
     messages = [
         {
             'role': 'system',
             'content': SUPERVISOR_SYSTEM_PROMPT,
         },
-    ] + state['messages']
-    response = model.with_structured_output(Router).invoke(messages)
+    ] + history
+    response = await structured_llm(Router, 'supervisor').ainvoke(messages)
     goto = response['next']
     if goto == 'FINISH':
         goto = END
 
-    print('Next node :', response)
+    logging.debug(f'Next node: {response}')
 
+    if goto == 'both':
+        # Independent subtasks run in one step; both workers return to the
+        # supervisor, and their replies are merged by the messages reducer
+        # before it runs again
+        return Command(
+            goto=[Send(worker, state) for worker in PARALLEL_WORKERS],
+            update={'next': goto},
+        )
     return Command(goto=goto, update={'next': goto})
 
 
-def calendar_agent_node(
+async def calendar_agent_node(
     state: AssistantState,
+    config: RunnableConfig,
 ) -> Command[Literal['supervisor']]:
     if 'calendar_assistant_msgs' in state:
         state['calendar_assistant_msgs'].append(state['messages'][-1])
@@ -113,7 +224,7 @@ def calendar_agent_node(
     inputs = {
         'messages': calendar_msgs,
     }
-    for events in calendar_agent.stream(inputs):
+    async for events in get_calendar_agent().astream(inputs, config):
         e = events
     latest_msg = e['messages'][-1].content
     return Command(
@@ -130,7 +241,7 @@ def calendar_agent_node(
     )
 
 
-def gmail_agent_node(
+async def gmail_agent_node(
     state: AssistantState,
     config: RunnableConfig,
 ) -> Command[Literal['supervisor']]:
@@ -142,7 +253,7 @@ def gmail_agent_node(
     inputs = {
         'messages': gmail_msgs,
     }
-    for events in gmail_agent.stream(inputs, config):
+    async for events in get_gmail_agent().astream(inputs, config):
         e = events
 
     latest_msg = e['messages'][-1].content
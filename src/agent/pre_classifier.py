@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Collection
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# Minimum confidence for the local decision to replace the LLM call
+PRE_CLASSIFIER_THRESHOLD = float(os.getenv('PRE_CLASSIFIER_THRESHOLD', 0.9))
+
+_TIME = (
+    r'today|tonight|tomorrow|yesterday|this (?:morning|afternoon|evening|week)'
+    r'|next (?:week|month|monday|tuesday|wednesday|thursday|friday|saturday'
+    r'|sunday)|at \d{1,2}(?::\d{2})?\s*(?:am|pm)?'
+)
+
+# (name, pattern, weight): positive weights point to 'advanced' (needs
+# Gmail or Calendar), negative ones to 'normal'. The weights are log-odds.
+FEATURES: List[Tuple[str, str, float]] = [
+    (
+        'my_data',
+        r'\bmy (?:inbox|e?mails?|messages|calendar|schedule|meetings?'
+        r'|events?|agenda|appointments?)\b',
+        4.5,
+    ),
+    (
+        'email_action',
+        r'\b(?:send|reply|respond|forward|draft|compose)\b.*'
+        r'\b(?:e?mail|message)s?\b',
+        3.5,
+    ),
+    ('email_to', r'\be?mail (?:to|from)\b', 3.0),
+    (
+        'recent_items',
+        r'\b(?:any|new|latest|recent|unread|last) (?:\d+ )?'
+        r'(?:e?mails?|messages|meetings|events|appointments)\b',
+        3.0,
+    ),
+    ('mailbox', r'\b(?:inbox|unread|gmail)\b', 3.0),
+    (
+        'event_action',
+        r'\b(?:schedule|book|create|add|set up|cancel|delete|reschedule'
+        r'|move)\b.*\b(?:meeting|event|appointment|call|reminder)s?\b',
+        3.5,
+    ),
+    (
+        'availability',
+        r'\b(?:am i (?:free|busy)|availability|free slots?)\b',
+        3.0,
+    ),
+    (
+        'topic',
+        r'\b(?:e?mails?|calendar|meetings?|events?|appointments?)\b',
+        1.5,
+    ),
+    ('time', rf'\b(?:{_TIME})\b', 1.0),
+    (
+        'question',
+        r"\b(?:what(?:'s| is| are)|who is|why|explain|define|tell me about"
+        r'|how (?:do|does|to|can|should))\b',
+        -2.5,
+    ),
+    (
+        'advice',
+        r'\b(?:tips?|advice|best (?:way|practices?)|professional'
+        r'|etiquette|example)\b',
+        -2.5,
+    ),
+    (
+        'general_task',
+        r'\b(?:poem|story|essay|joke|translate|summarize this|code|python'
+        r'|function|recipe)\b',
+        -3.0,
+    ),
+    (
+        'small_talk',
+        r'^\W*(?:hi|hello|hey|thanks|thank you|good (?:morning|evening))\b',
+        -3.0,
+    ),
+]
+BIAS = -1.0
+
+
+class PreClassifier:
+    """
+    Local stand-in for the LLM conversation classifier.
+
+    Scores a message with a small logistic model over keyword and regex
+    features. Confident decisions are returned directly; ambiguous messages
+    are left to the LLM. Counters record how often the LLM was skipped.
+    """
+
+    def __init__(
+        self, threshold: float = PRE_CLASSIFIER_THRESHOLD,
+        features: List[Tuple[str, str, float]] = FEATURES,
+        bias: float = BIAS,
+    ) -> None:
+        self.threshold = threshold
+        self.bias = bias
+        self.features = [
+            (name, re.compile(pattern, re.IGNORECASE), weight)
+            for name, pattern, weight in features
+        ]
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Returns the most likely label, 'normal' or 'advanced', and the
+        model's confidence in it.
+        """
+        score = self.bias + sum(
+            weight for _, pattern, weight in self.features
+            if pattern.search(text)
+        )
+        advanced = 1 / (1 + math.exp(-score))
+        if advanced >= 0.5:
+            return 'advanced', advanced
+        return 'normal', 1 - advanced
+
+    def classify(
+        self, text: str, labels: Optional[Collection[str]] = None,
+    ) -> Optional[str]:
+        """
+        Returns the label when the model is confident enough, or None when
+        the LLM should decide.
+
+        Args:
+            text (str): The user message.
+            labels (Collection[str], optional): The labels that replace the
+                LLM call; other decisions are left to the LLM and counted as
+                LLM calls. Defaults to all labels.
+        """
+        label, confidence = self.predict(text)
+        decided = confidence >= self.threshold and (
+            labels is None or label in labels
+        )
+        with self._lock:
+            self.counts[label if decided else 'llm'] += 1
+        return label if decided else None
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the decision counters and the share of skipped LLM calls."""
+        with self._lock:
+            total = sum(self.counts.values())
+            skipped = total - self.counts['llm']
+            return {
+                'normal': self.counts['normal'],
+                'advanced': self.counts['advanced'],
+                'llm': self.counts['llm'],
+                'skip_ratio': skipped / total if total else 0.0,
+            }
+
+
+pre_classifier = PreClassifier()
@@ -7,3 +7,5 @@ CALENDAR_AGENT_SYSTEM_PROMPT = read_markdown('calendar_agent.md')
 GMAIL_AGENT_SYSTEM_PROMPT = read_markdown('gmail_agent.md')
 SUPERVISOR_SYSTEM_PROMPT = read_markdown('supervisor.md')
 CLASSIFY_SYSTEM_PROMPT = read_markdown('prompt_classify.md')
+ROUTER_SYSTEM_PROMPT = read_markdown('router.md')
+SUMMARIZE_SYSTEM_PROMPT = read_markdown('summarize.md')
@@ -0,0 +1,96 @@
+"""Renders the diagrams of the assistant graphs.
+
+The graphs are not drawn when imported; run this from `src` to refresh
+the images in the repository's `images` directory:
+
+    python -m agent.render_graphs
+    python -m agent.render_graphs --format mermaid --graph calendar
+
+PNG rendering goes through the mermaid.ink service by default; `--format
+mermaid` writes the Mermaid source instead and works offline.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+from pathlib import Path
+from typing import Callable
+from typing import Dict
+from typing import Tuple
+
+from langchain_core.runnables.graph import MermaidDrawMethod
+from langgraph.graph.state import CompiledStateGraph
+
+from .calendar_agent.agent import get_graph as get_calendar_agent
+from .gmail_agent.agent import get_graph as get_gmail_agent
+from .main_graph import get_graph
+
+IMAGES_DIR = str(Path(__file__).parents[2] / 'images')
+
+# Graph name: (factory, file name without extension)
+GRAPHS: Dict[str, Tuple[Callable[[], CompiledStateGraph], str]] = {
+    'main': (get_graph, 'supervisors'),
+    'calendar': (get_calendar_agent, 'calendar_graph'),
+    'gmail': (get_gmail_agent, 'gmail_graph'),
+}
+
+
+def render(
+    name: str, output_dir: str = IMAGES_DIR, fmt: str = 'png',
+    draw_method: MermaidDrawMethod = MermaidDrawMethod.API,
+) -> str:
+    """
+    Renders one graph to a file.
+
+    Args:
+        name (str): The graph, one of `GRAPHS`.
+        output_dir (str): The directory the file is written to.
+        fmt (str): 'png' for an image, 'mermaid' for the Mermaid source.
+        draw_method (MermaidDrawMethod): How PNG images are drawn.
+
+    Returns:
+        str: The path of the written file.
+    """
+    factory, file_name = GRAPHS[name]
+    drawable = factory().get_graph()
+    os.makedirs(output_dir, exist_ok=True)
+    if fmt == 'mermaid':
+        path = os.path.join(output_dir, f'{file_name}.mmd')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(drawable.draw_mermaid())
+    else:
+        path = os.path.join(output_dir, f'{file_name}.png')
+        drawable.draw_mermaid_png(
+            output_file_path=path, draw_method=draw_method,
+        )
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        '--graph', choices=['all', *GRAPHS], default='all',
+    )
+    parser.add_argument('--output-dir', default=IMAGES_DIR)
+    parser.add_argument('--format', choices=['png', 'mermaid'], default='png')
+    parser.add_argument(
+        '--draw-method',
+        choices=[method.value for method in MermaidDrawMethod],
+        default=MermaidDrawMethod.API.value,
+        help='how PNG images are drawn',
+    )
+    args = parser.parse_args()
+
+    names = list(GRAPHS) if args.graph == 'all' else [args.graph]
+    for name in names:
+        path = render(
+            name, args.output_dir, args.format,
+            MermaidDrawMethod(args.draw_method),
+        )
+        print(f'{name}: {path}')
+
+
+if __name__ == '__main__':
+    main()
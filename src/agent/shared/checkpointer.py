@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.base import ChannelVersions
+from langgraph.checkpoint.base import Checkpoint
+from langgraph.checkpoint.base import CheckpointMetadata
+from langgraph.checkpoint.base import CheckpointTuple
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from .concurrency import run_blocking
+from .local_db import connect_sqlite
+
+# 'memory', 'sqlite:///<path>' or a 'postgresql://' URL
+CHECKPOINTER_URL = os.getenv('CHECKPOINTER_URL', 'sqlite:///checkpoints.db')
+# Checkpoints kept per thread and namespace; older ones are compacted away
+CHECKPOINT_KEEP_LATEST = int(os.getenv('CHECKPOINT_KEEP_LATEST', 20))
+# Seconds between compactions of the database
+CHECKPOINT_COMPACT_INTERVAL = float(
+    os.getenv('CHECKPOINT_COMPACT_INTERVAL', 600),
+)
+
+# Both take the number of checkpoints or namespaces to keep
+PRUNE_CHECKPOINTS = [
+    # Keep the latest checkpoints of every thread and namespace
+    """
+    DELETE FROM checkpoints WHERE (thread_id, checkpoint_ns, checkpoint_id)
+    IN (
+        SELECT thread_id, checkpoint_ns, checkpoint_id FROM (
+            SELECT thread_id, checkpoint_ns, checkpoint_id, ROW_NUMBER() OVER (
+                PARTITION BY thread_id, checkpoint_ns
+                ORDER BY checkpoint_id DESC
+            ) AS position FROM checkpoints
+        ) ranked WHERE position > ?
+    )
+    """,
+    # and of the latest subgraph namespaces of every thread
+    """
+    DELETE FROM checkpoints WHERE checkpoint_ns <> ''
+    AND (thread_id, checkpoint_ns) IN (
+        SELECT thread_id, checkpoint_ns FROM (
+            SELECT thread_id, checkpoint_ns, ROW_NUMBER() OVER (
+                PARTITION BY thread_id ORDER BY MAX(checkpoint_id) DESC
+            ) AS position FROM checkpoints WHERE checkpoint_ns <> ''
+            GROUP BY thread_id, checkpoint_ns
+        ) ranked WHERE position > ?
+    )
+    """,
+]
+# Then everything only the removed checkpoints referenced
+SQLITE_PRUNE_ORPHANS = [
+    """
+    DELETE FROM writes WHERE NOT EXISTS (
+        SELECT 1 FROM checkpoints c
+        WHERE c.thread_id = writes.thread_id
+        AND c.checkpoint_ns = writes.checkpoint_ns
+        AND c.checkpoint_id = writes.checkpoint_id
+    )
+    """,
+]
+POSTGRES_PRUNE_ORPHANS = [
+    """
+    DELETE FROM checkpoint_writes w WHERE NOT EXISTS (
+        SELECT 1 FROM checkpoints c
+        WHERE c.thread_id = w.thread_id
+        AND c.checkpoint_ns = w.checkpoint_ns
+        AND c.checkpoint_id = w.checkpoint_id
+    )
+    """,
+    # Channel values are stored once per version and shared by checkpoints
+    """
+    DELETE FROM checkpoint_blobs b WHERE NOT EXISTS (
+        SELECT 1 FROM checkpoints c
+        WHERE c.thread_id = b.thread_id
+        AND c.checkpoint_ns = b.checkpoint_ns
+        AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version
+    )
+    """,
+]
+
+
+class CompactingSaver(BaseCheckpointSaver):
+    """
+    Adds the async API and periodic compaction to a blocking saver.
+
+    The blocking savers serialize access to their connection with a lock,
+    so the async methods run them on the blocking I/O pool instead of the
+    event loop. A failed write raises in the graph step that made it.
+    """
+
+    def compact(self, keep: int) -> None:
+        """
+        Deletes all but the latest `keep` checkpoints of every thread and
+        namespace, and all but the latest `keep` subgraph namespaces of
+        every thread, with what only they referenced.
+        """
+        raise NotImplementedError
+
+    def start_compaction(self, keep: int, interval: float) -> None:
+        """Compacts the database every `interval` seconds until `close`."""
+        self._closed = threading.Event()
+
+        def compact_loop() -> None:
+            while not self._closed.wait(interval):
+                try:
+                    self.compact(keep)
+                except Exception as e:
+                    # Nothing is lost; the next run deletes the same rows
+                    logging.warning(f'Checkpoint compaction failed: {e}')
+
+        threading.Thread(
+            target=compact_loop, name='checkpoint-compaction', daemon=True,
+        ).start()
+
+    def close(self) -> None:
+        """Stops the compaction and closes the database."""
+        if hasattr(self, '_closed'):
+            self._closed.set()
+
+    async def aget_tuple(
+        self, config: RunnableConfig,
+    ) -> Optional[CheckpointTuple]:
+        return await run_blocking(self.get_tuple, config)
+
+    async def alist(
+        self, config: Optional[RunnableConfig], *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await run_blocking(
+            lambda: list(
+                self.list(config, filter=filter, before=before, limit=limit),
+            ),
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self, config: RunnableConfig, checkpoint: Checkpoint,
+        metadata: CheckpointMetadata, new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await run_blocking(
+            self.put, config, checkpoint, metadata, new_versions,
+        )
+
+    async def aput_writes(
+        self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]],
+        task_id: str, task_path: str = '',
+    ) -> None:
+        await run_blocking(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await run_blocking(self.delete_thread, thread_id)
+
+
+class SQLiteCheckpointer(CompactingSaver, SqliteSaver):
+    """`SqliteSaver` on a local file, with compaction."""
+
+    def __init__(self, path: str) -> None:
+        connection = connect_sqlite(path)
+        connection.row_factory = None
+        # Only takes effect on a new database
+        connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        super().__init__(connection)
+        self.setup()
+
+    def compact(self, keep: int) -> None:
+        with self.cursor() as cursor:
+            for sql in PRUNE_CHECKPOINTS:
+                cursor.execute(sql, (keep,))
+            for sql in SQLITE_PRUNE_ORPHANS:
+                cursor.execute(sql)
+        with self.cursor(transaction=False) as cursor:
+            # Give the freed pages back without a full VACUUM
+            cursor.execute('PRAGMA incremental_vacuum').fetchall()
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self) -> None:
+        super().close()
+        with self.lock:
+            self.conn.close()
+
+
+def _postgres_checkpointer(url: str, pool_size: int = 4) -> CompactingSaver:
+    # Imported here so SQLite-only setups do not need the driver
+    from langgraph.checkpoint.postgres import PostgresSaver
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool
+
+    class PostgresCheckpointer(CompactingSaver, PostgresSaver):
+        """`PostgresSaver` on a connection pool, with compaction."""
+
+        def __init__(self, pool: ConnectionPool) -> None:
+            super().__init__(pool)
+            self.setup()
+
+        def compact(self, keep: int) -> None:
+            # The lock keeps this process from writing a blob whose
+            # checkpoint is not stored yet while orphans are deleted
+            with self.lock, self.conn.connection() as connection:
+                with connection.transaction():
+                    for sql in PRUNE_CHECKPOINTS:
+                        connection.execute(sql.replace('?', '%s'), (keep,))
+                    for sql in POSTGRES_PRUNE_ORPHANS:
+                        connection.execute(sql)
+
+        def close(self) -> None:
+            super().close()
+            self.conn.close()
+
+    pool = ConnectionPool(
+        url, min_size=1, max_size=pool_size, open=True,
+        kwargs={
+            'autocommit': True, 'prepare_threshold': 0,
+            'row_factory': dict_row,
+        },
+    )
+    return PostgresCheckpointer(pool)
+
+
+_checkpointer: Optional[BaseCheckpointSaver] = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer(url: str = CHECKPOINTER_URL) -> BaseCheckpointSaver:
+    """
+    Returns the process-wide checkpointer shared by the main graph and the
+    agent subgraphs, creating it on first use.
+
+    Args:
+        url (str): 'memory' for a plain `InMemorySaver`,
+            'sqlite:///<path>' for a local SQLite file, or a
+            'postgresql://' URL for Postgres. Defaults to the
+            `CHECKPOINTER_URL` environment variable.
+    """
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            if url == 'memory':
+                _checkpointer = InMemorySaver()
+            else:
+                saver: CompactingSaver
+                if url.startswith('sqlite:///'):
+                    saver = SQLiteCheckpointer(url[len('sqlite:///'):])
+                elif url.startswith(('postgres://', 'postgresql://')):
+                    saver = _postgres_checkpointer(url)
+                else:
+                    raise ValueError(f'Unsupported CHECKPOINTER_URL: {url}')
+                saver.start_compaction(
+                    CHECKPOINT_KEEP_LATEST, CHECKPOINT_COMPACT_INTERVAL,
+                )
+                atexit.register(saver.close)
+                _checkpointer = saver
+        return _checkpointer
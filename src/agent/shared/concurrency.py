@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Tuple
+from typing import TypeVar
+from typing import Union
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# Threads shared by all sessions for blocking calls made from async code
+BLOCKING_IO_WORKERS = int(os.getenv('BLOCKING_IO_WORKERS', 16))
+
+_blocking_executor = ThreadPoolExecutor(
+    max_workers=BLOCKING_IO_WORKERS, thread_name_prefix='blocking-io',
+)
+
+# Threads shared by all `run_concurrently` calls. Calls made from the
+# blocking I/O pool fan out onto it, so it is a separate pool; its threads
+# live on and keep their per-thread HTTP connections alive
+FAN_OUT_WORKERS = int(os.getenv('FAN_OUT_WORKERS', 32))
+
+_fan_out_executor = ThreadPoolExecutor(
+    max_workers=FAN_OUT_WORKERS, thread_name_prefix='fan-out',
+)
+
+
+async def run_blocking(fn: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """
+    Runs a blocking call, such as a Google API request, on the bounded
+    blocking I/O thread pool so it does not stall the event loop.
+
+    The caller's context variables (e.g. the LangChain run config) are
+    visible to `fn`.
+    """
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(
+        _blocking_executor, call,
+    )
+
+
+def run_concurrently(
+    fn: Callable[[T], R], items: Sequence[T],
+    max_workers: int, timeout: float,
+) -> List[Union[R, Exception]]:
+    """
+    Calls `fn` on every item on the shared fan-out thread pool.
+
+    Args:
+        fn (Callable[[T], R]): The blocking function to run.
+        items (Sequence[T]): The arguments, one call per item.
+        max_workers (int): Maximum number of calls running at once.
+        timeout (float): Seconds allowed for a single call, counted from
+            when it is submitted.
+
+    Returns:
+        List[Union[R, Exception]]: One entry per item, in the same order.
+        A call that raised is represented by its exception and a call that
+        did not finish in time by a `TimeoutError`.
+    """
+    results: List[Union[R, Exception]] = [
+        TimeoutError(f'Timed out after {timeout}s') for _ in items
+    ]
+    queued = iter(enumerate(items))
+    # Future: (index of its item, deadline)
+    running: Dict[Future, Tuple[int, float]] = {}
+
+    def submit_next() -> None:
+        entry = next(queued, None)
+        if entry is None:
+            return
+        index, item = entry
+        # Each call gets its own copy of the caller's context variables
+        future = _fan_out_executor.submit(
+            contextvars.copy_context().run, fn, item,
+        )
+        running[future] = (index, time.monotonic() + timeout)
+
+    for _ in range(max(1, max_workers)):
+        submit_next()
+    while running:
+        next_deadline = min(deadline for _, deadline in running.values())
+        done, _ = wait(
+            running, timeout=max(next_deadline - time.monotonic(), 0),
+            return_when=FIRST_COMPLETED,
+        )
+        now = time.monotonic()
+        for future in list(running):
+            index, deadline = running[future]
+            if future in done:
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = e
+            elif deadline <= now:
+                # A call that already started cannot be stopped; it keeps
+                # its thread but no longer counts against `max_workers`
+                future.cancel()
+            else:
+                continue
+            del running[future]
+            submit_next()
+    return results
@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from collections import OrderedDict
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.messages import BaseMessage
+from langchain_core.messages import HumanMessage
+from langchain_core.messages import SystemMessage
+from langchain_core.messages import ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.constants import TAG_NOSTREAM
+
+from .tracing import register_stats
+
+# Tokens allowed for the system prompt and history sent on each LLM call
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 12000))
+# Share of the budget left to the recent history after older turns are folded
+CONTEXT_FOLD_TARGET = float(os.getenv('CONTEXT_FOLD_TARGET', 0.5))
+# Number of summaries kept in memory, one per folded history prefix
+CONTEXT_SUMMARY_CACHE_SIZE = int(
+    os.getenv('CONTEXT_SUMMARY_CACHE_SIZE', 1000),
+)
+# Longest tool result copied into the summarizer's input, in characters
+CONTEXT_SUMMARY_TOOL_CHARS = int(os.getenv('CONTEXT_SUMMARY_TOOL_CHARS', 2000))
+
+# Fixed cost of a message on top of its content (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Number of messages whose token counts are remembered
+TOKEN_COUNT_CACHE_SIZE = 20000
+
+SUMMARY_HEADER = 'Summary of the earlier conversation:\n'
+
+
+def _tiktoken_counter() -> Optional[Callable[[str], int]]:
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding('o200k_base')
+    except Exception as e:
+        # The encoding is downloaded on first use; offline hosts estimate
+        logging.info(f'Estimating token counts without tiktoken: {e}')
+        return None
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+class TokenCounter:
+    """
+    Counts the tokens of chat messages, remembering counts per message ID.
+
+    Uses tiktoken's `o200k_base` encoding when it is available and falls
+    back to LangChain's character-based estimate otherwise.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_COUNT_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._encode: Optional[Callable[[str], int]] = None
+        self._resolved = False
+        self._lock = threading.Lock()
+        self._counts: OrderedDict[str, int] = OrderedDict()
+
+    def text(self, text: str) -> int:
+        if not self._resolved:
+            self._encode = _tiktoken_counter()
+            self._resolved = True
+        if self._encode is None:
+            return count_tokens_approximately(
+                [HumanMessage(content=text)], extra_tokens_per_message=0,
+            )
+        return self._encode(text)
+
+    def message(self, message: BaseMessage) -> int:
+        key = message.id
+        if key:
+            with self._lock:
+                count = self._counts.get(key)
+                if count is not None:
+                    self._counts.move_to_end(key)
+                    return count
+        text = message.text() if isinstance(
+            message.content, list,
+        ) else str(message.content)
+        if isinstance(message, AIMessage) and message.tool_calls:
+            text += json.dumps(
+                [[call['name'], call['args']] for call in message.tool_calls],
+                ensure_ascii=False,
+            )
+        count = self.text(text) + MESSAGE_OVERHEAD_TOKENS
+        if key:
+            with self._lock:
+                self._counts[key] = count
+                if len(self._counts) > self.max_entries:
+                    self._counts.popitem(last=False)
+        return count
+
+
+def turn_boundaries(messages: Sequence[BaseMessage]) -> List[int]:
+    """
+    Returns the indices where the history may be cut.
+
+    An AI message that calls tools is never separated from the tool
+    messages answering it, so a window never starts with an orphaned tool
+    result or ends with an unanswered tool call.
+    """
+    return [
+        i for i, message in enumerate(messages)
+        if not isinstance(message, ToolMessage)
+    ]
+
+
+def _render(message: BaseMessage) -> str:
+    role = message.name or message.type
+    content = message.text() if isinstance(
+        message.content, list,
+    ) else str(message.content)
+    if isinstance(message, ToolMessage):
+        content = content[:CONTEXT_SUMMARY_TOOL_CHARS]
+    if isinstance(message, AIMessage) and message.tool_calls:
+        calls = ', '.join(
+            f"{call['name']}({json.dumps(call['args'], ensure_ascii=False)})"
+            for call in message.tool_calls
+        )
+        content = f'{content}\n[called {calls}]'.strip()
+    return f'{role}: {content}'
+
+
+class ContextWindow:
+    """
+    Keeps the prompts of the chat nodes within a token budget.
+
+    `fit()` returns the part of a history to send to the LLM: the most
+    recent turns that fit the budget next to the node's system prompt,
+    preceded by a summary of everything older. When the recent part
+    outgrows the budget, its oldest turns are folded into the summary with
+    one LLM call, leaving `fold_target` of the budget to the recent turns
+    so the following calls reuse the summary unchanged.
+
+    Summaries are keyed by the ID of the last message they cover, so a
+    history that only grew at the end finds its summary again and the
+    summary is extended rather than rebuilt. They are kept in memory; after
+    a restart the first over-budget call summarizes afresh.
+    """
+
+    def __init__(
+        self, summarizer: BaseChatModel, summarize_prompt: str,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        fold_target: float = CONTEXT_FOLD_TARGET,
+        max_summaries: int = CONTEXT_SUMMARY_CACHE_SIZE,
+    ) -> None:
+        # The summary call must not show up in the UI's token stream
+        self.summarizer = summarizer.with_config(tags=[TAG_NOSTREAM])
+        self.summarize_prompt = summarize_prompt
+        self.budget = budget
+        self.fold_target = fold_target
+        self.max_summaries = max_summaries
+        self.tokens = TokenCounter()
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._summaries: OrderedDict[str, str] = OrderedDict()
+
+    async def fit(
+        self, messages: Sequence[BaseMessage], system_prompt: str = '',
+        name: str = '',
+    ) -> List[BaseMessage]:
+        """
+        Returns the messages to send after the system prompt.
+
+        Args:
+            messages (Sequence[BaseMessage]): The full history.
+            system_prompt (str): The node's system prompt, which is sent in
+                full and counts against the budget.
+            name (str): The calling node, for the statistics.
+
+        Returns:
+            List[BaseMessage]: A summary system message, when older turns
+            were folded, followed by the recent messages.
+        """
+        messages = list(messages)
+        system_tokens = self.tokens.text(system_prompt)
+        sizes = [self.tokens.message(message) for message in messages]
+        available = self.budget - system_tokens
+
+        start, summary = self._find_summary(messages)
+        summary_tokens = self.tokens.text(summary) if summary else 0
+        if summary_tokens + sum(sizes[start:]) > available:
+            cut = self._fold_point(
+                messages, sizes, start,
+                int(available * self.fold_target) - summary_tokens,
+            )
+            if cut > start:
+                folded = await self._summarize(summary, messages[start:cut])
+                if folded is not None:
+                    start, summary = cut, folded
+                    summary_tokens = self.tokens.text(summary)
+                    self._remember(messages[cut - 1], summary)
+                else:
+                    # Without a summary, drop the turns that do not fit
+                    start = self._fold_point(
+                        messages, sizes, start, available - summary_tokens,
+                    )
+
+        window = messages[start:]
+        if summary:
+            window.insert(0, SystemMessage(content=SUMMARY_HEADER + summary))
+        full = system_tokens + sum(sizes)
+        sent = system_tokens + summary_tokens + sum(sizes[start:])
+        self._record(name, full, sent)
+        return window
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the call, summary and token counters, overall and per node.
+        """
+        with self._lock:
+            counts = dict(self.counts)
+        calls = counts.get('calls', 0)
+        return {
+            **counts,
+            'saved_ratio': (
+                counts.get('tokens_saved', 0) / counts['tokens_full']
+                if counts.get('tokens_full') else 0.0
+            ),
+            'avg_tokens_saved': (
+                counts.get('tokens_saved', 0) / calls if calls else 0.0
+            ),
+        }
+
+    def _find_summary(self, messages: List[BaseMessage]) -> Tuple[int, str]:
+        """Finds the latest summary covering a prefix of the history."""
+        with self._lock:
+            for i in range(len(messages) - 1, -1, -1):
+                key = messages[i].id
+                if key and key in self._summaries:
+                    self._summaries.move_to_end(key)
+                    return i + 1, self._summaries[key]
+        return 0, ''
+
+    def _fold_point(
+        self, messages: List[BaseMessage], sizes: List[int], start: int,
+        keep: int,
+    ) -> int:
+        """
+        Returns the first turn boundary after `start` from which the rest of
+        the history fits in `keep` tokens. The latest turn is always kept.
+        """
+        boundaries = [i for i in turn_boundaries(messages) if i >= start]
+        if not boundaries:
+            return start
+        total = sum(sizes[start:])
+        cut = start
+        for boundary in boundaries:
+            total -= sum(sizes[cut:boundary])
+            cut = boundary
+            if total <= keep:
+                break
+        return cut
+
+    async def _summarize(
+        self, summary: str, messages: List[BaseMessage],
+    ) -> Optional[str]:
+        transcript = '\n\n'.join(_render(message) for message in messages)
+        prompt = [
+            SystemMessage(content=self.summarize_prompt),
+            HumanMessage(
+                content=(
+                    f'Current summary:\n{summary or "(empty)"}\n\n'
+                    f'New messages:\n{transcript}'
+                ),
+            ),
+        ]
+        try:
+            response = await self.summarizer.ainvoke(prompt)
+        except Exception as e:
+            logging.warning(f'Could not summarize the conversation: {e}')
+            return None
+        with self._lock:
+            self.counts['summaries'] += 1
+        return str(response.content).strip()
+
+    def _remember(self, last: BaseMessage, summary: str) -> None:
+        if not last.id:
+            return
+        with self._lock:
+            self._summaries[last.id] = summary
+            self._summaries.move_to_end(last.id)
+            while len(self._summaries) > self.max_summaries:
+                self._summaries.popitem(last=False)
+
+    def _record(self, name: str, full: int, sent: int) -> None:
+        saved = full - sent
+        with self._lock:
+            for prefix in ('', f'{name}.' if name else None):
+                if prefix is None:
+                    continue
+                self.counts[f'{prefix}calls'] += 1
+                self.counts[f'{prefix}tokens_full'] += full
+                self.counts[f'{prefix}tokens_sent'] += sent
+                self.counts[f'{prefix}tokens_saved'] += saved
+        logging.info(
+            f'Context {name or "call"}: sent {sent} of {full} tokens '
+            f'({saved} saved)',
+        )
+
+
+_context_window: Optional[ContextWindow] = None
+_context_window_lock = threading.Lock()
+
+
+def get_context_window() -> ContextWindow:
+    """
+    Returns the process-wide context window manager, creating it on first
+    use. The configured chat model writes the summaries.
+    """
+    global _context_window
+    with _context_window_lock:
+        if _context_window is None:
+            from llm import get_model
+
+            from ..prompt import SUMMARIZE_SYSTEM_PROMPT
+
+            _context_window = ContextWindow(
+                get_model(), SUMMARIZE_SYSTEM_PROMPT,
+            )
+            register_stats('context_window', _context_window.stats)
+        return _context_window
@@ -1,17 +1,24 @@
 from __future__ import annotations
 
+import datetime
 import logging
 import os
+import tempfile
+import threading
 import time
+from typing import Dict
+from typing import Optional
+from typing import TYPE_CHECKING
+from typing import Union
 
 from dotenv import load_dotenv
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 
+from .tracing import traced
 from .utils import save_personal_info
 
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
 load_dotenv()
 logging.basicConfig(
     level=logging.INFO,
@@ -20,15 +27,175 @@ logging.basicConfig(
 
 
 TIME_OUT_GET_CREDENTIALS = int(os.getenv('TIME_OUT_GET_CREDENTIALS', 60))
+# Refresh tokens this many seconds before they expire
+CREDENTIALS_REFRESH_MARGIN = int(
+    os.getenv('CREDENTIALS_REFRESH_MARGIN', 300),
+)
+
+SCOPES = [
+    'openid',
+    'https://www.googleapis.com/auth/calendar',  # Full access to Calendar
+    # Read, send, and manage Gmail messages
+    'https://www.googleapis.com/auth/gmail.modify',
+    'https://www.googleapis.com/auth/gmail.send',  # Send emails via Gmail
+    'https://www.googleapis.com/auth/userinfo.email',
+    'https://www.googleapis.com/auth/userinfo.profile',
+]
+
+
+class _CachedCredentials:
+    def __init__(self, path: str, credentials: Credentials) -> None:
+        self.path = path
+        self.credentials = credentials
+        # Serializes refreshes so concurrent callers share a single one
+        self.lock = threading.Lock()
+        self.persisted = credentials.to_json()
+        self.timer: Optional[threading.Timer] = None
 
 
-def get_credentials(token_access_path: str | None = None):
+class CredentialManager:
+    """Keeps Google credentials in memory, one entry per token file.
+
+    Tokens are loaded from disk once, refreshed in the background shortly
+    before they expire, and written back only when they actually change.
+    Callers that find an expired token wait for a single shared refresh
+    instead of each starting their own.
+    """
+
+    def __init__(
+        self, scopes: list[str],
+        refresh_margin: int = CREDENTIALS_REFRESH_MARGIN,
+    ) -> None:
+        self.scopes = scopes
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _CachedCredentials] = {}
+
+    def get(
+        self, token_access_path: Union[str, os.PathLike],
+    ) -> Optional[Credentials]:
+        """Returns valid credentials for the token file, or None."""
+        entry = self._entry(token_access_path)
+        if entry is None:
+            return None
+        if not entry.credentials.valid:
+            if not entry.credentials.refresh_token:
+                return None
+            self._refresh(entry)
+        return entry.credentials if entry.credentials.valid else None
+
+    def put(
+        self, token_access_path: Union[str, os.PathLike],
+        credentials: Credentials,
+    ) -> None:
+        """Stores freshly obtained credentials and saves them to disk."""
+        path = os.path.abspath(token_access_path)
+        entry = _CachedCredentials(path, credentials)
+        with self._lock:
+            previous = self._entries.get(path)
+            self._entries[path] = entry
+        if previous and previous.timer:
+            previous.timer.cancel()
+        self._write(entry)
+        self._schedule(entry)
+
+    def _entry(
+        self, token_access_path: Union[str, os.PathLike],
+    ) -> Optional[_CachedCredentials]:
+        path = os.path.abspath(token_access_path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None and os.path.exists(path):
+                logging.info('Loading credentials')
+                from google.oauth2.credentials import Credentials
+
+                entry = _CachedCredentials(
+                    path,
+                    Credentials.from_authorized_user_file(path, self.scopes),
+                )
+                self._entries[path] = entry
+                self._schedule(entry)
+        return entry
+
+    def _expires_soon(self, credentials: Credentials) -> bool:
+        if not credentials.valid:
+            return True
+        if credentials.expiry is None:
+            return False
+        return (
+            datetime.datetime.utcnow()
+            >= credentials.expiry - self.refresh_margin
+        )
+
+    def _refresh(self, entry: _CachedCredentials, proactive: bool = False):
+        with entry.lock:
+            # Another caller may have refreshed while we were waiting
+            if proactive:
+                if not self._expires_soon(entry.credentials):
+                    return
+            elif entry.credentials.valid:
+                return
+            from google.auth.transport.requests import Request
+
+            entry.credentials.refresh(Request())
+            self._persist(entry)
+        self._schedule(entry)
+
+    def _background_refresh(self, entry: _CachedCredentials) -> None:
+        try:
+            self._refresh(entry, proactive=True)
+        except Exception as e:
+            # The next caller will retry synchronously
+            logging.warning(f'Background token refresh failed: {e}')
+
+    def _schedule(self, entry: _CachedCredentials) -> None:
+        if entry.timer:
+            entry.timer.cancel()
+            entry.timer = None
+        expiry = entry.credentials.expiry
+        if expiry is None or not entry.credentials.refresh_token:
+            return
+        delay = (
+            expiry - self.refresh_margin - datetime.datetime.utcnow()
+        ).total_seconds()
+        entry.timer = threading.Timer(
+            max(delay, 0), self._background_refresh, args=(entry,),
+        )
+        entry.timer.daemon = True
+        entry.timer.start()
+
+    def _persist(self, entry: _CachedCredentials) -> None:
+        if entry.credentials.to_json() != entry.persisted:
+            self._write(entry)
+
+    def _write(self, entry: _CachedCredentials) -> None:
+        payload = entry.credentials.to_json()
+        # A temporary file per write, so concurrent writers never share one
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(entry.path), prefix='.token', suffix='.tmp',
+        )
+        try:
+            with os.fdopen(fd, 'w') as token:
+                token.write(payload)
+            os.replace(tmp_path, entry.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        entry.persisted = payload
+
+
+credential_manager = CredentialManager(SCOPES)
+
+
+@traced('credentials')
+def get_credentials(token_access_path: str | os.PathLike | None = None):
     """
     Manages Google API authentication for Calendar and Gmail.
 
     This function handles authentication by checking for existing credentials,
     refreshing expired tokens, or prompting the user to log in if necessary.
     It supports multiple Google services, including Google Calendar and Gmail.
+    Known credentials are served from memory by `credential_manager`.
 
     Args:
         token_access_path (str | None, optional):
@@ -41,75 +208,61 @@ def get_credentials(token_access_path: str | None = None):
         A valid `google.auth.credentials.Credentials` object if
         authentication is successful, otherwise None.
     """
-    SCOPES = [
-        'openid',
-        'https://www.googleapis.com/auth/calendar',  # Full access to Calendar
-        # Read, send, and manage Gmail messages
-        'https://www.googleapis.com/auth/gmail.modify',
-        'https://www.googleapis.com/auth/gmail.send',  # Send emails via Gmail
-        'https://www.googleapis.com/auth/userinfo.email',
-        'https://www.googleapis.com/auth/userinfo.profile',
-    ]
-    creds = None
-
-    # Check if token.json exists to load stored credentials
-    if token_access_path and os.path.exists(token_access_path):
-        logging.info('Loading credentials')
-        creds = Credentials.from_authorized_user_file(
-            token_access_path, SCOPES,
-        )
+    if token_access_path:
+        creds = credential_manager.get(token_access_path)
+        if creds:
+            return creds
 
     # If no valid credentials are available, prompt user to log in
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            try:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', SCOPES,
-                )
+    try:
+        from google_auth_oauthlib.flow import InstalledAppFlow
 
-                # Start authentication process
-                start_time = time.time()
-                creds = flow.run_local_server(
-                    port=0, timeout_seconds=TIME_OUT_GET_CREDENTIALS,
-                )
+        flow = InstalledAppFlow.from_client_secrets_file(
+            'credentials.json', SCOPES,
+        )
+
+        # Start authentication process
+        start_time = time.time()
+        creds = flow.run_local_server(
+            port=0, timeout_seconds=TIME_OUT_GET_CREDENTIALS,
+        )
+
+        if time.time() - start_time > TIME_OUT_GET_CREDENTIALS:
+            logging.warning(
+                (
+                    'Authentication timeout: '
+                    'User did not complete login in time.'
+                ),
+            )
+            return creds
+
+    except Exception as e:
+        logging.exception(f'Authentication failed: {e}')
+        return None
+
+    if creds and creds.valid:
+        try:
+            if not token_access_path:
+                # Retrieve the authenticated email to create a unique
+                # token file
+                from googleapiclient.discovery import build
 
-                if time.time() - start_time > TIME_OUT_GET_CREDENTIALS:
-                    logging.warning(
-                        (
-                            'Authentication timeout: '
-                            'User did not complete login in time.'
-                        ),
-                    )
-                    return creds
-
-            except Exception as e:
-                logging.exception(f'Authentication failed: {e}')
-                return creds
-
-        # Retrieve the authenticated email to create a unique token file
-        if creds and creds.valid:
-            try:
                 service = build('oauth2', 'v2', credentials=creds)
                 user_info = service.userinfo().get().execute()
                 user_email = user_info.get('email', 'unknown_user')
                 safe_email = user_email.replace(
                     '@', '_',
                 ).replace('.', '_')  # Safe filename
-                token_access_path = (
-                    token_access_path or f'token_{safe_email}.json'
-                )
+                token_access_path = f'token_{safe_email}.json'
 
-                # Save the new credentials for future use
-                with open(token_access_path, 'w') as token:
-                    token.write(creds.to_json())
+            # Save the new credentials for future use
+            credential_manager.put(token_access_path, creds)
 
-                logging.info(f'Credentials saved to {token_access_path}')
+            logging.info(f'Credentials saved to {token_access_path}')
 
-                save_personal_info('token_access_path', token_access_path)
+            save_personal_info('token_access_path', token_access_path)
 
-            except Exception as e:
-                logging.error(f'Failed to retrieve user email: {e}')
+        except Exception as e:
+            logging.error(f'Failed to retrieve user email: {e}')
 
     return creds
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
+
+from .tracing import span
+from .tracing import tracer
+
+GOOGLE_API_TIMEOUT = int(os.getenv('GOOGLE_API_TIMEOUT', 60))
+
+DEFAULT_USER = 'default'
+
+UserKey = Optional[Union[str, os.PathLike]]
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+    from google_auth_httplib2 import AuthorizedHttp
+
+
+class _ThreadLocalHttp:
+    """An `AuthorizedHttp` look-alike that keeps one keep-alive connection
+    pool per thread.
+
+    `httplib2.Http` is not thread-safe, so a service object shared between
+    threads must not share a single transport. Each thread lazily gets its
+    own authorized transport, which is then reused for every request that
+    thread makes.
+    """
+
+    def __init__(self, credentials: Credentials, api_name: str = '') -> None:
+        self.credentials = credentials
+        self.api_name = api_name
+        self._local = threading.local()
+
+    def _http(self) -> AuthorizedHttp:
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+
+            http = AuthorizedHttp(
+                self.credentials,
+                http=httplib2.Http(timeout=GOOGLE_API_TIMEOUT),
+            )
+            self._local.http = http
+        return http
+
+    def request(self, uri: str, *args: Any, **kwargs: Any) -> Any:
+        if not tracer.enabled:
+            return self._http().request(uri, *args, **kwargs)
+        method = kwargs.get('method') or (args[0] if args else 'GET')
+        body = kwargs.get('body') or (args[1] if len(args) > 1 else None)
+        with span(
+            'google_api', f'{self.api_name} {method}',
+            path=uri.split('?')[0], request_bytes=len(body or ''),
+        ) as request_span:
+            response, content = self._http().request(uri, *args, **kwargs)
+            request_span.set(
+                status=response.status, response_bytes=len(content or b''),
+            )
+            return response, content
+
+    def close(self) -> None:
+        http = getattr(self._local, 'http', None)
+        if http is not None:
+            http.close()
+            self._local.http = None
+
+
+def _user_key(user: UserKey) -> str:
+    return str(user) if user else DEFAULT_USER
+
+
+def _credentials_fingerprint(credentials: Credentials) -> Tuple[Any, ...]:
+    """Identifies a credential grant, ignoring routine access-token refreshes.
+
+    The access token changes every hour and is refreshed transparently by the
+    transport, so it is only used when there is no refresh token at all.
+    """
+    return (
+        getattr(credentials, 'client_id', None),
+        getattr(credentials, 'refresh_token', None)
+        or getattr(credentials, 'token', None),
+        tuple(sorted(getattr(credentials, 'scopes', None) or [])),
+    )
+
+
+class ServiceRegistry:
+    """Process-wide pool of Google API service clients.
+
+    Services are keyed by `(user, api_name, api_version)` and are built once.
+    An entry is rebuilt when the credentials passed for the same key belong
+    to a different grant (e.g. the user re-authenticated).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._services: Dict[
+            Tuple[str, str, str], Tuple[Tuple[Any, ...], Any],
+        ] = {}
+
+    def get(
+        self, api_name: str, api_version: str,
+        credentials: Credentials, user: UserKey = None,
+    ) -> Any:
+        key = (_user_key(user), api_name, api_version)
+        fingerprint = _credentials_fingerprint(credentials)
+
+        with self._lock:
+            entry = self._services.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                return entry[1]
+
+            if entry is not None:
+                logging.info(f'Credentials rotated, rebuilding {key}')
+            from googleapiclient.discovery import build
+
+            service = build(
+                api_name, api_version,
+                http=_ThreadLocalHttp(credentials, api_name),
+                cache_discovery=False,
+            )
+            self._services[key] = (fingerprint, service)
+            return service
+
+    def invalidate(self, user: UserKey = None) -> None:
+        """Drops pooled services for `user`, or every service if None."""
+        with self._lock:
+            keys = [
+                key for key in self._services
+                if user is None or key[0] == _user_key(user)
+            ]
+            for key in keys:
+                del self._services[key]
+
+
+_registry = ServiceRegistry()
+
+
+def get_service(
+    api_name: str, api_version: str,
+    credentials: Credentials, user: UserKey = None,
+) -> Any:
+    """
+    Returns a pooled Google API service client.
+
+    The discovery document is parsed once per `(user, api, version)` and the
+    underlying HTTP connections are kept alive between tool calls.
+
+    Args:
+        api_name (str): The API name, e.g. 'gmail' or 'calendar'.
+        api_version (str): The API version, e.g. 'v1' or 'v3'.
+        credentials (Credentials): Valid Google credentials for the user.
+        user (str | PathLike | None): Key identifying the user the client
+            belongs to, usually the token file path. Defaults to a single
+            shared user.
+
+    Returns:
+        Resource: A `googleapiclient` service object.
+    """
+    return _registry.get(api_name, api_version, credentials, user=user)
+
+
+def invalidate_services(user: UserKey = None) -> None:
+    """
+    Drops pooled service clients so they are rebuilt on next use.
+
+    Args:
+        user (str | PathLike | None): Only drop the clients of this user.
+            If None, every pooled client is dropped.
+    """
+    _registry.invalidate(user)
@@ -1,8 +1,24 @@
 from __future__ import annotations
 
+from typing import Any
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from langchain_core.messages import AIMessage
+from langchain_core.messages import AnyMessage
+from langchain_core.messages import ToolCall
 from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import BaseTool
+from langchain_core.tools import StructuredTool
 from langgraph.prebuilt import ToolNode
+from langgraph.types import interrupt
+
+from .concurrency import run_blocking
 
 
 def handle_tool_error(state) -> dict:
@@ -19,23 +35,85 @@ def handle_tool_error(state) -> dict:
     }
 
 
+def with_blocking_pool(tool: BaseTool) -> BaseTool:
+    """
+    Gives a synchronous tool an async implementation that runs it on the
+    bounded blocking I/O thread pool.
+    """
+    if not isinstance(tool, StructuredTool) or tool.coroutine is not None:
+        return tool
+    func = tool.func
+
+    async def coroutine(**kwargs: Any) -> Any:
+        return await run_blocking(func, **kwargs)
+
+    return tool.model_copy(update={'coroutine': coroutine})
+
+
 def create_tool_node_with_fallback(tools: list) -> dict:
+    tools = [with_blocking_pool(tool) for tool in tools]
     return ToolNode(tools).with_fallbacks(
         [RunnableLambda(handle_tool_error)], exception_key='error',
     )
 
 
-def _print_event(event: dict, _printed: set, max_length=1500):
-    current_state = event.get('dialog_state')
-    if current_state:
-        print('Currently in: ', current_state[-1])
-    message = event.get('messages')
-    if message:
-        if isinstance(message, list):
-            message = message[-1]
-        if message.id not in _printed:
-            msg_repr = message.pretty_repr(html=True)
-            if len(msg_repr) > max_length:
-                msg_repr = msg_repr[:max_length] + ' ... (truncated)'
-            print(msg_repr)
-            _printed.add(message.id)
+def pending_tool_calls(
+    messages: Sequence[AnyMessage],
+) -> Tuple[Optional[AIMessage], List[ToolCall]]:
+    """
+    Returns the latest AI message and those of its tool calls that are not
+    answered by a tool message yet.
+    """
+    answered = set()
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage):
+            answered.add(message.tool_call_id)
+        elif isinstance(message, AIMessage):
+            return message, [
+                tool_call for tool_call in message.tool_calls
+                if tool_call['id'] not in answered
+            ]
+        else:
+            break
+    return None, []
+
+
+def create_pending_tools_node(tools: list) -> Callable[..., Any]:
+    """
+    Creates a node running, concurrently, the tool calls of the latest AI
+    message that were not answered yet, e.g. the safe and approved calls
+    left after a human review answered the rejected ones.
+    """
+    tool_node = create_tool_node_with_fallback(tools)
+
+    async def run_pending_tools(state: dict, config: RunnableConfig) -> dict:
+        message, tool_calls = pending_tool_calls(state['messages'])
+        if not tool_calls:
+            return {'messages': []}
+        pending = message.model_copy(update={'tool_calls': tool_calls})
+        return await tool_node.ainvoke({'messages': [pending]}, config)
+
+    return run_pending_tools
+
+
+def review_tool_calls(tool_calls: List[ToolCall]) -> dict:
+    """
+    Interrupts for a human review of the given tool calls and returns it.
+
+    When the supervisor runs both agents at once, a single resume value
+    reaches both of their pending reviews. A review naming the tool calls
+    it answers (`tool_call_ids`) is therefore only accepted by the review
+    showing them; the other one interrupts again to be asked in turn.
+    """
+    ids = {tool_call['id'] for tool_call in tool_calls}
+    while True:
+        human_review = interrupt(
+            {
+                'question': 'Is this correct?',
+                # Surface all sensitive tool calls for a single review
+                'tool_calls': tool_calls,
+            },
+        )
+        reviewed = human_review.get('tool_call_ids')
+        if reviewed is None or ids.intersection(reviewed):
+            return human_review
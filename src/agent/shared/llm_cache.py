@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+from langchain_core.messages import AIMessage
+from langchain_core.messages import convert_to_messages
+from langchain_core.runnables import Runnable
+from langchain_core.runnables import RunnableConfig
+from pydantic import BaseModel
+
+from .concurrency import run_blocking
+from .local_db import connect_sqlite
+from .tracing import register_stats
+
+# SQLite file holding the cached LLM responses
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'llm_cache.db')
+# Seconds a cached response stays valid
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', 24 * 60 * 60))
+# Number of responses kept; the least recently used are evicted first
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 10000))
+
+# Number of writes between two eviction passes
+EVICT_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    node TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+def _normalize(messages: Any) -> list:
+    """
+    Reduces the prompt to what the model sees, so message IDs and
+    whitespace differences do not defeat the cache.
+    """
+    if isinstance(messages, (str, dict)):
+        messages = [messages]
+    normalized = []
+    for message in convert_to_messages(messages):
+        content = message.text() if isinstance(
+            message.content, list,
+        ) else str(message.content)
+        entry = [message.type, message.name or '', ' '.join(content.split())]
+        if isinstance(message, AIMessage) and message.tool_calls:
+            entry.append(
+                [[call['name'], call['args']] for call in message.tool_calls],
+            )
+        normalized.append(entry)
+    return normalized
+
+
+def cache_key(deployment: str, schema: str, messages: Any) -> str:
+    """Returns the hash identifying a structured call and its prompt."""
+    payload = json.dumps(
+        [deployment, schema, _normalize(messages)],
+        ensure_ascii=False, sort_keys=True, separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent exact-match cache of LLM responses.
+
+    Entries expire `ttl` seconds after they were written; beyond
+    `max_entries` the least recently read ones are evicted. Hits and misses
+    are counted per node.
+    """
+
+    def __init__(
+        self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.counts: Counter = Counter()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = connect_sqlite(path)
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+            self._evict()
+
+    def get(self, key: str, node: str = '') -> Optional[str]:
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                'SELECT value FROM responses WHERE key = ? AND created >= ?',
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    'UPDATE responses SET accessed = ? WHERE key = ?',
+                    (now, key),
+                )
+            outcome = 'hits' if row is not None else 'misses'
+            self.counts[outcome] += 1
+            if node:
+                self.counts[f'{node}.{outcome}'] += 1
+        return row['value'] if row is not None else None
+
+    def put(self, key: str, value: str, node: str = '') -> None:
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (key, node, value, now, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM responses')
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the hit and miss counters, overall and per node, with the
+        hit ratios and the number of stored responses.
+        """
+        with self._lock:
+            counts = dict(self.counts)
+            entries = self._db.execute(
+                'SELECT COUNT(*) FROM responses',
+            ).fetchone()[0]
+        stats: Dict[str, Any] = {**counts, 'entries': entries}
+        nodes = {key.rsplit('.', 1)[0] for key in counts if '.' in key}
+        for prefix in [''] + sorted(f'{node}.' for node in nodes):
+            hits = counts.get(f'{prefix}hits', 0)
+            lookups = hits + counts.get(f'{prefix}misses', 0)
+            stats[f'{prefix}hit_ratio'] = hits / lookups if lookups else 0.0
+        return stats
+
+    def _evict(self) -> None:
+        self._db.execute(
+            'DELETE FROM responses WHERE created < ?',
+            (time.time() - self.ttl,),
+        )
+        self._db.execute(
+            'DELETE FROM responses WHERE key IN (SELECT key FROM responses '
+            'ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,),
+        )
+
+
+class CachedStructuredOutput(Runnable):
+    """
+    Answers a structured-output LLM call from the response cache.
+
+    Only meant for calls whose result is a pure function of the prompt:
+    the wrapped runnable must not stream to the user or have side effects.
+    Outputs are pydantic models or plain JSON values (e.g. TypedDicts).
+    """
+
+    def __init__(
+        self, runnable: Runnable, schema: Any, node: str, deployment: str,
+        cache: LLMResponseCache,
+    ) -> None:
+        self.runnable = runnable
+        self.schema = schema
+        self.node = node
+        self.deployment = deployment
+        self.cache = cache
+
+    def _key(self, input: Any) -> str:
+        return cache_key(self.deployment, self.schema.__name__, input)
+
+    def _decode(self, value: str) -> Any:
+        data = json.loads(value)
+        if isinstance(self.schema, type) and issubclass(
+            self.schema, BaseModel,
+        ):
+            return self.schema.model_validate(data)
+        return data
+
+    @staticmethod
+    def _encode(output: Any) -> Optional[str]:
+        if isinstance(output, BaseModel):
+            output = output.model_dump(mode='json')
+        try:
+            return json.dumps(output, ensure_ascii=False)
+        except TypeError:
+            return None
+
+    def invoke(
+        self, input: Any, config: Optional[RunnableConfig] = None,
+        **kwargs: Any,
+    ) -> Any:
+        key = self._key(input)
+        value = self.cache.get(key, self.node)
+        if value is not None:
+            return self._decode(value)
+        output = self.runnable.invoke(input, config, **kwargs)
+        self._store(key, output)
+        return output
+
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None,
+        **kwargs: Any,
+    ) -> Any:
+        key = self._key(input)
+        value = await run_blocking(self.cache.get, key, self.node)
+        if value is not None:
+            return self._decode(value)
+        output = await self.runnable.ainvoke(input, config, **kwargs)
+        await run_blocking(self._store, key, output)
+        return output
+
+    def _store(self, key: str, output: Any) -> None:
+        # Failed or empty parses are not worth remembering
+        value = self._encode(output) if output is not None else None
+        if value is None:
+            return
+        try:
+            self.cache.put(key, value, self.node)
+        except Exception as e:
+            logging.warning(f'Could not cache the {self.node} response: {e}')
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Returns the process-wide LLM response cache, opening it on first use."""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache()
+            register_stats('llm_cache', _llm_cache.stats)
+        return _llm_cache
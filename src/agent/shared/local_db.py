@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Opens a SQLite database for the local caches and mirrors.
+
+    The connection may be shared between threads, so callers must serialize
+    access to it themselves. WAL journaling lets readers in other processes
+    keep reading while a sync is writing.
+
+    Args:
+        path (str): The database file. Parent directories are created.
+
+    Returns:
+        sqlite3.Connection: The open connection, with rows as `sqlite3.Row`.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
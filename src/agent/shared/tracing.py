@@ -0,0 +1,517 @@
+from __future__ import annotations
+
+import atexit
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# Span exporters, comma separated: 'jsonl' and/or 'prometheus'. Empty
+# disables tracing
+TRACING = os.getenv('TRACING', '')
+# File the 'jsonl' exporter appends finished spans to
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+# Port of the 'prometheus' exporter's /metrics endpoint
+TRACE_PROMETHEUS_PORT = int(os.getenv('TRACE_PROMETHEUS_PORT', 9464))
+
+# Upper bounds, in seconds, of the Prometheus latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Span:
+    """A timed operation with attributes such as token counts and sizes."""
+
+    __slots__ = (
+        'trace_id', 'span_id', 'parent_id', 'kind', 'name', 'start',
+        'duration', 'attributes',
+    )
+
+    def __init__(
+        self, kind: str, name: str, parent: Optional[Span] = None,
+        **attributes: Any,
+    ) -> None:
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.kind = kind
+        self.name = name
+        self.start = time.time()
+        self.duration = 0.0
+        self.attributes = attributes
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self) -> None:
+        self.duration = time.time() - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'kind': self.kind,
+            'name': self.name,
+            'start': self.start,
+            'duration': self.duration,
+            **self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off."""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __enter__(self) -> _NoopSpan:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar(
+    'current_span', default=None,
+)
+
+# Component name: function returning its counters
+_stats_sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_stats(name: str, stats: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Registers the counters of a component, such as a cache's hits and
+    misses. The Prometheus exporter reports their numeric values.
+    """
+    _stats_sources[name] = stats
+
+
+class JsonlExporter:
+    """Appends finished spans to a JSONL file from a background thread."""
+
+    def __init__(self, path: str = TRACE_FILE) -> None:
+        self.path = path
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._write_loop, name='trace-writer', daemon=True,
+        )
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span.to_dict())
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _write_loop(self) -> None:
+        with open(self.path, 'a', encoding='utf-8') as file:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    return
+                file.write(json.dumps(record, default=str) + '\n')
+                if self._queue.empty():
+                    file.flush()
+
+
+class PrometheusExporter:
+    """
+    Aggregates spans into Prometheus metrics served at `/metrics`.
+
+    Spans are labelled by kind and name only; the per-span details are left
+    to the JSONL exporter.
+    """
+
+    def __init__(self, port: Optional[int] = TRACE_PROMETHEUS_PORT) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], List[int]] = defaultdict(
+            lambda: [0] * len(BUCKETS),
+        )
+        self._counts: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._sums: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._errors: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._tokens: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._bytes: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self._server: Optional[ThreadingHTTPServer] = None
+        if port:
+            self._serve(port)
+
+    def export(self, span: Span) -> None:
+        key = (span.kind, span.name)
+        attributes = span.attributes
+        with self._lock:
+            self._counts[key] += 1
+            self._sums[key] += span.duration
+            buckets = self._buckets[key]
+            for i, bound in enumerate(BUCKETS):
+                if span.duration <= bound:
+                    buckets[i] += 1
+            if 'error' in attributes:
+                self._errors[key] += 1
+            for kind in ('prompt', 'completion'):
+                tokens = attributes.get(f'{kind}_tokens')
+                if tokens:
+                    self._tokens[(span.name, kind)] += tokens
+            for direction in ('request', 'response'):
+                size = attributes.get(f'{direction}_bytes')
+                if size:
+                    self._bytes[(span.kind, span.name, direction)] += size
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = [
+            '# TYPE assistant_span_duration_seconds histogram',
+        ]
+        with self._lock:
+            for (kind, name), count in sorted(self._counts.items()):
+                labels = f'kind="{kind}",name="{_escape(name)}"'
+                for bound, value in zip(BUCKETS, self._buckets[(kind, name)]):
+                    lines.append(
+                        'assistant_span_duration_seconds_bucket'
+                        f'{{{labels},le="{bound}"}} {value}',
+                    )
+                lines += [
+                    'assistant_span_duration_seconds_bucket'
+                    f'{{{labels},le="+Inf"}} {count}',
+                    'assistant_span_duration_seconds_sum'
+                    f'{{{labels}}} {self._sums[(kind, name)]:.6f}',
+                    'assistant_span_duration_seconds_count'
+                    f'{{{labels}}} {count}',
+                ]
+            lines.append('# TYPE assistant_span_errors_total counter')
+            for (kind, name), count in sorted(self._errors.items()):
+                lines.append(
+                    'assistant_span_errors_total'
+                    f'{{kind="{kind}",name="{_escape(name)}"}} {count}',
+                )
+            lines.append('# TYPE assistant_llm_tokens_total counter')
+            for (name, kind), count in sorted(self._tokens.items()):
+                lines.append(
+                    'assistant_llm_tokens_total'
+                    f'{{name="{_escape(name)}",type="{kind}"}} {count}',
+                )
+            lines.append('# TYPE assistant_payload_bytes_total counter')
+            for (kind, name, direction), size in sorted(self._bytes.items()):
+                lines.append(
+                    'assistant_payload_bytes_total'
+                    f'{{kind="{kind}",name="{_escape(name)}",'
+                    f'direction="{direction}"}} {size}',
+                )
+        lines.append('# TYPE assistant_component_stat gauge')
+        for component, stats in sorted(_stats_sources.items()):
+            try:
+                values = stats()
+            except Exception as e:
+                logging.debug(f'Could not read the {component} stats: {e}')
+                continue
+            for stat, value in sorted(values.items()):
+                if isinstance(value, (int, float)):
+                    lines.append(
+                        'assistant_component_stat'
+                        f'{{component="{_escape(component)}",'
+                        f'stat="{_escape(stat)}"}} {value}',
+                    )
+        return '\n'.join(lines) + '\n'
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _serve(self, port: int) -> None:
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header(
+                    'Content-Type', 'text/plain; version=0.0.4',
+                )
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(('', port), MetricsHandler)
+        except OSError as e:
+            logging.warning(f'Could not serve metrics on port {port}: {e}')
+            return
+        threading.Thread(
+            target=self._server.serve_forever, name='trace-metrics',
+            daemon=True,
+        ).start()
+        logging.info(f'Serving trace metrics on :{port}/metrics')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class Tracer:
+    """Records spans and hands finished ones to the exporters."""
+
+    def __init__(self, exporters: List[Any]) -> None:
+        self.exporters = exporters
+        self.enabled = bool(exporters)
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        Times the enclosed block as a child of the current span.
+
+        An exception escaping the block is recorded as the span's `error`.
+        """
+        span = Span(kind, name, _current_span.get(), **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=repr(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end(span)
+
+    def end(self, span: Span) -> None:
+        span.finish()
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logging.debug(f'Dropping span {span.name}: {e}')
+
+    def close(self) -> None:
+        for exporter in self.exporters:
+            exporter.close()
+
+
+def _exporters(setting: str) -> List[Any]:
+    exporters: List[Any] = []
+    names = {name.strip() for name in setting.split(',') if name.strip()}
+    if 'jsonl' in names:
+        exporters.append(JsonlExporter())
+    if 'prometheus' in names:
+        exporters.append(PrometheusExporter())
+    for name in names - {'jsonl', 'prometheus'}:
+        logging.warning(f'Unknown trace exporter: {name}')
+    return exporters
+
+
+tracer = Tracer(_exporters(TRACING))
+if tracer.enabled:
+    atexit.register(tracer.close)
+
+
+def span(kind: str, name: str, **attributes: Any) -> Any:
+    """
+    Returns a context manager timing a block as a span, or a shared no-op
+    one when tracing is off.
+    """
+    if not tracer.enabled:
+        return NOOP_SPAN
+    return tracer.span(kind, name, **attributes)
+
+
+def traced(kind: str, name: Optional[str] = None) -> Callable[[F], F]:
+    """
+    Decorates a function, sync or async, to record each call as a span.
+    Functions are left untouched when tracing is off.
+    """
+    def decorate(fn: F) -> F:
+        if not tracer.enabled:
+            return fn
+        span_name = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with tracer.span(kind, span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with tracer.span(kind, span_name):
+                return fn(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+
+def _size(value: Any) -> int:
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    content = getattr(value, 'content', value)
+    return len(str(content).encode('utf-8'))
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Turns LangChain run events into spans: one per graph node, LLM call
+    and tool call, nested as the runs are.
+
+    LLM spans carry the prompt and completion sizes and, when the model
+    reports them, token counts; tool spans carry input and output sizes.
+    """
+
+    run_inline = True
+
+    def __init__(self, tracer: Tracer = tracer) -> None:
+        self.tracer = tracer
+        self._spans: Dict[UUID, Span] = {}
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+
+    def _parent_span(self, parent_run_id: Optional[UUID]) -> Optional[Span]:
+        # Runs without a span (prompts, parsers, ...) pass their parent on
+        while parent_run_id is not None:
+            span = self._spans.get(parent_run_id)
+            if span is not None:
+                return span
+            parent_run_id = self._parents.get(parent_run_id)
+        return None
+
+    def _start(
+        self, run_id: UUID, parent_run_id: Optional[UUID], kind: str,
+        name: str, **attributes: Any,
+    ) -> None:
+        self._parents[run_id] = parent_run_id
+        self._spans[run_id] = Span(
+            kind, name, self._parent_span(parent_run_id), **attributes,
+        )
+
+    def _end(self, run_id: UUID, **attributes: Any) -> None:
+        self._parents.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.set(**attributes)
+            self.tracer.end(span)
+
+    def on_chain_start(
+        self, serialized: Optional[Dict[str, Any]], inputs: Any, *,
+        run_id: UUID, parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None, **kwargs: Any,
+    ) -> None:
+        name = kwargs.get('name')
+        if (
+            metadata and name and not name.startswith('__')
+            and name == metadata.get('langgraph_node')
+        ):
+            self._start(run_id, parent_run_id, 'node', name)
+        else:
+            self._parents[run_id] = parent_run_id
+
+    def on_chain_end(
+        self, outputs: Any, *, run_id: UUID, **kwargs: Any,
+    ) -> None:
+        self._end(run_id)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any,
+    ) -> None:
+        # Interrupts and Command jumps surface as exceptions
+        self._end(run_id, error=type(error).__name__)
+
+    def on_chat_model_start(
+        self, serialized: Optional[Dict[str, Any]], messages: List[List[Any]],
+        *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None, **kwargs: Any,
+    ) -> None:
+        node = (metadata or {}).get('langgraph_node', 'llm')
+        self._start(
+            run_id, parent_run_id, 'llm', node,
+            messages=sum(len(batch) for batch in messages),
+            request_bytes=sum(
+                _size(message) for batch in messages for message in batch
+            ),
+        )
+
+    def on_llm_end(
+        self, response: Any, *, run_id: UUID, **kwargs: Any,
+    ) -> None:
+        attributes: Dict[str, Any] = {}
+        generations = [g for batch in response.generations for g in batch]
+        attributes['response_bytes'] = sum(
+            _size(getattr(g, 'message', None) or g.text) for g in generations
+        )
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        for generation in generations:
+            metadata = getattr(
+                getattr(generation, 'message', None), 'usage_metadata', None,
+            )
+            if metadata:
+                usage = {
+                    'prompt_tokens': metadata.get('input_tokens'),
+                    'completion_tokens': metadata.get('output_tokens'),
+                }
+        if usage.get('prompt_tokens') is not None:
+            attributes['prompt_tokens'] = usage['prompt_tokens']
+            attributes['completion_tokens'] = usage.get('completion_tokens')
+        self._end(run_id, **attributes)
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any,
+    ) -> None:
+        self._end(run_id, error=repr(error))
+
+    def on_tool_start(
+        self, serialized: Optional[Dict[str, Any]], input_str: str, *,
+        run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any,
+    ) -> None:
+        name = kwargs.get('name') or (serialized or {}).get('name', 'tool')
+        self._start(
+            run_id, parent_run_id, 'tool', name,
+            request_bytes=_size(input_str),
+        )
+        # Tools run in their own task, so the Google API spans made by the
+        # tool nest under it without leaking into other runs
+        _current_span.set(self._spans[run_id])
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, response_bytes=_size(output))
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any,
+    ) -> None:
+        self._end(run_id, error=repr(error))
+
+
+def tracing_callbacks() -> List[BaseCallbackHandler]:
+    """
+    Returns the callbacks to add to a graph run's config: a span recorder
+    when tracing is on, nothing otherwise.
+    """
+    if not tracer.enabled:
+        return []
+    return [TracingCallbackHandler()]
@@ -3,9 +3,13 @@ from __future__ import annotations
 import json
 import logging
 import os
+import tempfile
+import threading
 from pathlib import Path
 from typing import Any
 from typing import Dict
+from typing import Optional
+from typing import Tuple
 
 from dotenv import load_dotenv
 # Load environment variables
@@ -20,6 +24,79 @@ logging.basicConfig(
 )
 
 
+class PersonalInfoStore:
+    """
+    In-memory view of the personal information JSON file.
+
+    The file is parsed once and re-parsed only when its mtime, inode or size
+    changes. Writes go to a temporary file that is atomically renamed into
+    place, so readers never see half-written JSON.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._data: Dict[str, Any] = {}
+        self._signature: Optional[Tuple[int, int, int]] = None
+
+    def _stat_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+    def _load(self) -> Dict[str, Any]:
+        # Must be called with the lock held
+        signature = self._stat_signature()
+        if signature is None:
+            self._data, self._signature = {}, None
+        elif signature != self._signature:
+            try:
+                with open(self.file_path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                data = {}
+            self._data = data if isinstance(data, dict) else {}
+            self._signature = signature
+        return self._data
+
+    def read(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._load())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._load().get(key, default)
+
+    def set(self, key: str, value: Any) -> bool:
+        """Stores `value` under `key`. Returns False if nothing changed."""
+        with self._lock:
+            data = self._load()
+            if data.get(key) == value:
+                return False
+            data = {**data, key: value}
+
+            directory = os.path.dirname(os.path.abspath(self.file_path))
+            fd, tmp_path = tempfile.mkstemp(
+                dir=directory, prefix='.personal_info', suffix='.tmp',
+            )
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                    json.dump(data, file, indent=4)
+                os.replace(tmp_path, self.file_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+            self._data = data
+            self._signature = self._stat_signature()
+            return True
+
+
+personal_info_store = PersonalInfoStore(PERSONAL_INFO_FILE_PATH)
+
+
 def read_personal_info() -> Dict[str, Any]:
     """
     Reads and returns the personal information stored in the JSON file.
@@ -27,11 +104,20 @@ def read_personal_info() -> Dict[str, Any]:
     Returns:
         dict: A dictionary containing the stored personal information.
     """
-    try:
-        with open(PERSONAL_INFO_FILE_PATH, encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    return personal_info_store.read()
+
+
+def get_token_access_path() -> Optional[Path]:
+    """
+    Resolves the stored token file name to its path next to the agent package.
+
+    Returns:
+        Optional[Path]: The token file path, or None if no token is stored.
+    """
+    token_access_path = personal_info_store.get('token_access_path')
+    if not token_access_path:
+        return None
+    return Path(__file__).parents[1] / Path(token_access_path)
 
 
 def save_personal_info(key: str, value: Any) -> None:
@@ -43,12 +129,6 @@ def save_personal_info(key: str, value: Any) -> None:
         key (str): The key for the information to be stored.
         value (Any): The value associated with the key.
     """
-    try:
-        with open(PERSONAL_INFO_FILE_PATH, encoding='utf-8') as file:
-            data = json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = {}
-
     if isinstance(value, Path):
         value = str(value)  # Convert WindowsPath to string
 
@@ -60,19 +140,12 @@ def save_personal_info(key: str, value: Any) -> None:
     else:
         processed_value = value
 
-    if data.get(key) == processed_value:
+    if not personal_info_store.set(key, processed_value):
         print(f'No update needed for key: {key}')
         return  # No update needed
 
-    # Update the dictionary with the new key-value pair
-    data[key] = processed_value
-
     logging.info(f'Updated key: {key}, value: {processed_value}')
 
-    # Save the updated data back to the file
-    with open(PERSONAL_INFO_FILE_PATH, 'w', encoding='utf-8') as file:
-        json.dump(data, file, indent=4)
-
 
 def read_markdown(file_path: str) -> str:
     """
@@ -0,0 +1,614 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langgraph.store.base import BaseStore
+from langgraph.store.base import GetOp
+from langgraph.store.base import IndexConfig
+from langgraph.store.base import Item
+from langgraph.store.base import ListNamespacesOp
+from langgraph.store.base import MatchCondition
+from langgraph.store.base import Op
+from langgraph.store.base import PutOp
+from langgraph.store.base import Result
+from langgraph.store.base import SearchItem
+from langgraph.store.base import SearchOp
+from langgraph.store.base.embed import ensure_embeddings
+from langgraph.store.base.embed import get_text_at_path
+from langgraph.store.base.embed import tokenize_path
+from langgraph.store.memory import InMemoryStore
+
+from .local_db import connect_sqlite
+from .tracing import register_stats
+
+# Directory of the long-term memory store; empty keeps memories in memory
+MEMORY_STORE_PATH = os.getenv('MEMORY_STORE_PATH', 'memory_store')
+# Number of text embeddings kept in memory by the embedding cache
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', 10000))
+
+# Rows allocated when the vector file is created; it doubles when full
+INITIAL_CAPACITY = 1024
+
+Namespace = Tuple[str, ...]
+ItemKey = Tuple[Namespace, str]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS vectors (
+    row INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vectors_item ON vectors (namespace, key);
+CREATE TABLE IF NOT EXISTS embeddings (
+    hash TEXT PRIMARY KEY,
+    vector BLOB NOT NULL
+);
+"""
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _normalize(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+class EmbeddingCache:
+    """
+    Cache of normalized text embeddings keyed on a hash of the text.
+
+    Recently used vectors are kept in memory and every vector is written to
+    the store's SQLite sidecar, so repeated queries, and a memory saved from
+    the message that was just searched with, skip the remote embedding call.
+    """
+
+    def __init__(
+        self, db: Any, lock: threading.RLock,
+        max_entries: int = EMBEDDING_CACHE_SIZE,
+    ) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._db = db
+        self._lock = lock
+        self._vectors: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for text in texts:
+                digest = text_hash(text)
+                vector = self._vectors.get(digest)
+                if vector is None and self._db is not None:
+                    row = self._db.execute(
+                        'SELECT vector FROM embeddings WHERE hash = ?',
+                        (digest,),
+                    ).fetchone()
+                    if row is not None:
+                        vector = np.frombuffer(row[0], dtype=np.float32)
+                if vector is None:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                self._remember(digest, vector)
+                found[text] = vector
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            rows = []
+            for text, vector in vectors.items():
+                digest = text_hash(text)
+                self._remember(digest, vector)
+                rows.append((digest, vector.astype(np.float32).tobytes()))
+            if self._db is not None and rows:
+                with self._db:
+                    self._db.executemany(
+                        'INSERT OR REPLACE INTO embeddings VALUES (?, ?)',
+                        rows,
+                    )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remember(self, digest: str, vector: np.ndarray) -> None:
+        self._vectors[digest] = vector
+        self._vectors.move_to_end(digest)
+        while len(self._vectors) > self.max_entries:
+            self._vectors.popitem(last=False)
+
+
+class NumpyVectorStore(BaseStore):
+    """
+    Persistent long-term memory store with a NumPy vector index.
+
+    Embeddings are normalized and kept in a memory-mapped float32 matrix
+    (`vectors.f32`), one row per indexed field of an item. Items, the row
+    assignment and cached embeddings live in a SQLite sidecar
+    (`store.db`). Search is a dot product over the rows of the matching
+    namespaces followed by a partial sort, so it stays in the milliseconds
+    for hundreds of thousands of memories. Rows of deleted or updated items
+    are reused.
+
+    Without `index`, items are stored and listed but not embedded.
+    """
+
+    def __init__(
+        self, path: str, *, index: Optional[IndexConfig] = None,
+    ) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = connect_sqlite(os.path.join(path, 'store.db'))
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+        self.index_config = index
+        self.embeddings: Optional[Embeddings] = None
+        self.dims = 0
+        self._fields: List[Tuple[str, Any]] = []
+        if index:
+            self.embeddings = ensure_embeddings(index.get('embed'))
+            self.dims = int(index['dims'])
+            self._fields = [
+                (path, tokenize_path(path) if path != '$' else path)
+                for path in (index.get('fields') or ['$'])
+            ]
+        self.embedding_cache = EmbeddingCache(self._db, self._lock)
+
+        self._items: Dict[Namespace, Dict[str, Item]] = {}
+        self._rows: Dict[ItemKey, List[Tuple[int, str]]] = {}
+        self._ns_ids: Dict[Namespace, int] = {}
+        self._free: List[int] = []
+        self._size = 0
+        self._row_items: List[Optional[ItemKey]] = []
+        self._row_ns = np.empty(0, dtype=np.int32)
+        self._matrix: Optional[np.memmap] = None
+        self._load()
+
+    # BaseStore
+
+    def batch(self, ops: Iterable[Op]) -> List[Result]:
+        ops = list(ops)
+        vectors = self._embed(self._texts_to_embed(ops))
+        return self._apply(ops, vectors)
+
+    async def abatch(self, ops: Iterable[Op]) -> List[Result]:
+        ops = list(ops)
+        vectors = await self._aembed(self._texts_to_embed(ops))
+        return self._apply(ops, vectors)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the item and vector counts and the embedding cache use."""
+        with self._lock:
+            return {
+                'items': sum(len(items) for items in self._items.values()),
+                'namespaces': len(self._items),
+                'vectors': self._size - len(self._free),
+                'capacity': len(self._row_items),
+                'embedding_cache': self.embedding_cache.stats(),
+            }
+
+    # Embedding
+
+    def _texts_to_embed(self, ops: List[Op]) -> List[str]:
+        if self.embeddings is None:
+            return []
+        texts = []
+        for op in ops:
+            if isinstance(op, SearchOp) and op.query:
+                texts.append(op.query)
+            elif isinstance(op, PutOp):
+                texts.extend(text for _, text in self._put_texts(op))
+        return list(dict.fromkeys(texts))
+
+    def _put_texts(self, op: PutOp) -> List[Tuple[str, str]]:
+        """Returns the (path, text) pairs of an item to index."""
+        if self.embeddings is None or op.value is None or op.index is False:
+            return []
+        if op.index is None:
+            fields = self._fields
+        else:
+            fields = [(path, tokenize_path(path)) for path in op.index]
+        texts = []
+        for path, field in fields:
+            values = get_text_at_path(op.value, field)
+            if len(values) == 1:
+                texts.append((path, values[0]))
+            else:
+                texts.extend(
+                    (f'{path}.{i}', text) for i, text in enumerate(values)
+                )
+        return texts
+
+    def _embed(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        vectors = self.embedding_cache.get_many(texts)
+        missing = [text for text in texts if text not in vectors]
+        if missing and self.embeddings is not None:
+            embedded = self.embeddings.embed_documents(missing)
+            new = dict(zip(missing, _normalize(embedded)))
+            self.embedding_cache.put_many(new)
+            vectors.update(new)
+        return vectors
+
+    async def _aembed(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        vectors = self.embedding_cache.get_many(texts)
+        missing = [text for text in texts if text not in vectors]
+        if missing and self.embeddings is not None:
+            embedded = await self.embeddings.aembed_documents(missing)
+            new = dict(zip(missing, _normalize(embedded)))
+            self.embedding_cache.put_many(new)
+            vectors.update(new)
+        return vectors
+
+    # Operations
+
+    def _apply(
+        self, ops: List[Op], vectors: Dict[str, np.ndarray],
+    ) -> List[Result]:
+        results: List[Result] = []
+        puts: Dict[ItemKey, PutOp] = {}
+        with self._lock:
+            for op in ops:
+                if isinstance(op, GetOp):
+                    items = self._items.get(op.namespace, {})
+                    results.append(items.get(op.key))
+                elif isinstance(op, SearchOp):
+                    query = vectors.get(op.query) if op.query else None
+                    results.append(self._search(op, query))
+                elif isinstance(op, ListNamespacesOp):
+                    results.append(self._list_namespaces(op))
+                elif isinstance(op, PutOp):
+                    puts[(op.namespace, op.key)] = op
+                    results.append(None)
+                else:
+                    raise ValueError(f'Unknown operation type: {type(op)}')
+            if puts:
+                self._put(list(puts.values()), vectors)
+        return results
+
+    def _search(
+        self, op: SearchOp, query: Optional[np.ndarray],
+    ) -> List[SearchItem]:
+        prefix = op.namespace_prefix
+        namespaces = [
+            namespace for namespace in self._items
+            if namespace[:len(prefix)] == prefix
+        ]
+        candidates = [
+            item for namespace in namespaces
+            for item in self._items[namespace].values()
+            if not op.filter or all(
+                _matches_filter(item.value.get(key), value)
+                for key, value in op.filter.items()
+            )
+        ]
+        end = op.offset + op.limit
+        if query is None or self._matrix is None:
+            return [_search_item(item) for item in candidates[op.offset:end]]
+
+        if op.filter:
+            item_keys = [(item.namespace, item.key) for item in candidates]
+            rows = np.fromiter(
+                (
+                    row for item_key in item_keys
+                    for row, _ in self._rows.get(item_key, ())
+                ),
+                dtype=np.int64,
+            )
+        else:
+            ns_ids = [
+                self._ns_ids[namespace] for namespace in namespaces
+                if namespace in self._ns_ids
+            ]
+            rows = np.flatnonzero(np.isin(self._row_ns[:self._size], ns_ids))
+
+        ranked: List[Tuple[Optional[float], Item]] = []
+        if len(rows):
+            scores = self._matrix[rows] @ query
+            # An item has a row per indexed field; fetch enough rows to
+            # fill the page after keeping each item's best score
+            fanout = max(1, len(self._fields))
+            k = min(len(rows), end * fanout)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            seen = set()
+            for i in top:
+                item_key = self._row_items[rows[i]]
+                if item_key in seen:
+                    continue
+                seen.add(item_key)
+                namespace, key = item_key
+                ranked.append((float(scores[i]), self._items[namespace][key]))
+                if len(ranked) >= end:
+                    break
+        if len(ranked) < end:
+            # Items without vectors come last, unscored
+            ranked.extend(
+                (None, item) for item in candidates
+                if (item.namespace, item.key) not in self._rows
+            )
+        return [
+            _search_item(item, score) for score, item in ranked[op.offset:end]
+        ]
+
+    def _list_namespaces(self, op: ListNamespacesOp) -> List[Namespace]:
+        namespaces = list(self._items)
+        if op.match_conditions:
+            namespaces = [
+                namespace for namespace in namespaces
+                if all(
+                    _matches_namespace(condition, namespace)
+                    for condition in op.match_conditions
+                )
+            ]
+        if op.max_depth is not None:
+            namespaces = sorted({ns[:op.max_depth] for ns in namespaces})
+        else:
+            namespaces = sorted(namespaces)
+        return namespaces[op.offset:op.offset + op.limit]
+
+    def _put(self, ops: List[PutOp], vectors: Dict[str, np.ndarray]) -> None:
+        now = datetime.now(timezone.utc)
+        with self._db:
+            for op in ops:
+                item_key = (op.namespace, op.key)
+                namespace = json.dumps(list(op.namespace))
+                self._release_rows(item_key)
+                self._db.execute(
+                    'DELETE FROM vectors WHERE namespace = ? AND key = ?',
+                    (namespace, op.key),
+                )
+                if op.value is None:
+                    items = self._items.get(op.namespace, {})
+                    items.pop(op.key, None)
+                    if not items:
+                        self._items.pop(op.namespace, None)
+                    self._db.execute(
+                        'DELETE FROM items WHERE namespace = ? AND key = ?',
+                        (namespace, op.key),
+                    )
+                    continue
+
+                previous = self._items.get(op.namespace, {}).get(op.key)
+                item = Item(
+                    value=op.value, key=op.key, namespace=op.namespace,
+                    created_at=previous.created_at if previous else now,
+                    updated_at=now,
+                )
+                self._items.setdefault(op.namespace, {})[op.key] = item
+                self._db.execute(
+                    'INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)',
+                    (
+                        namespace, op.key, json.dumps(op.value),
+                        item.created_at.isoformat(),
+                        item.updated_at.isoformat(),
+                    ),
+                )
+                for path, text in self._put_texts(op):
+                    row = self._assign_row(item_key, path, vectors[text])
+                    self._db.execute(
+                        'INSERT INTO vectors VALUES (?, ?, ?, ?)',
+                        (row, namespace, op.key, path),
+                    )
+        if self._matrix is not None:
+            self._matrix.flush()
+
+    # Rows
+
+    def _assign_row(
+        self, item_key: ItemKey, path: str, vector: np.ndarray,
+    ) -> int:
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._size >= len(self._row_items):
+                self._grow(max(INITIAL_CAPACITY, 2 * len(self._row_items)))
+            row = self._size
+            self._size += 1
+        self._matrix[row] = vector
+        self._set_row(row, item_key, path)
+        return row
+
+    def _set_row(self, row: int, item_key: ItemKey, path: str) -> None:
+        namespace = item_key[0]
+        if namespace not in self._ns_ids:
+            self._ns_ids[namespace] = len(self._ns_ids)
+        self._row_ns[row] = self._ns_ids[namespace]
+        self._row_items[row] = item_key
+        self._rows.setdefault(item_key, []).append((row, path))
+
+    def _release_rows(self, item_key: ItemKey) -> None:
+        for row, _ in self._rows.pop(item_key, ()):
+            self._row_ns[row] = -1
+            self._row_items[row] = None
+            self._free.append(row)
+
+    def _grow(self, capacity: int) -> None:
+        """Extends the vector file and the row tables to `capacity` rows."""
+        file_path = os.path.join(self.path, 'vectors.f32')
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(file_path, 'ab') as file:
+            file.truncate(capacity * self.dims * 4)
+        self._matrix = np.memmap(
+            file_path, dtype=np.float32, mode='r+',
+            shape=(capacity, self.dims),
+        )
+        row_ns = np.full(capacity, -1, dtype=np.int32)
+        row_ns[:len(self._row_ns)] = self._row_ns
+        self._row_ns = row_ns
+        self._row_items.extend([None] * (capacity - len(self._row_items)))
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO settings VALUES (?, ?)',
+                ('capacity', str(capacity)),
+            )
+
+    def _load(self) -> None:
+        settings = dict(self._db.execute('SELECT name, value FROM settings'))
+        dims = int(settings.get('dims', self.dims))
+        if self.dims and dims != self.dims:
+            raise ValueError(
+                f'{self.path} holds {dims}-dimensional vectors, '
+                f'not {self.dims}',
+            )
+        if self.dims:
+            with self._db:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO settings VALUES (?, ?)',
+                    ('dims', str(self.dims)),
+                )
+        for namespace, key, value, created_at, updated_at in self._db.execute(
+            'SELECT namespace, key, value, created_at, updated_at FROM items',
+        ):
+            namespace = tuple(json.loads(namespace))
+            self._items.setdefault(namespace, {})[key] = Item(
+                value=json.loads(value), key=key, namespace=namespace,
+                created_at=datetime.fromisoformat(created_at),
+                updated_at=datetime.fromisoformat(updated_at),
+            )
+        capacity = int(settings.get('capacity', 0))
+        if not self.dims or not capacity:
+            return
+        self._grow(capacity)
+        for row, namespace, key, path in self._db.execute(
+            'SELECT row, namespace, key, path FROM vectors ORDER BY row',
+        ):
+            self._set_row(row, (tuple(json.loads(namespace)), key), path)
+            self._size = row + 1
+        self._free = [
+            row for row in range(self._size - 1, -1, -1)
+            if self._row_items[row] is None
+        ]
+
+
+# Filters and namespace conditions match as in `InMemoryStore`
+def _apply_operator(value: Any, operator: str, operand: Any) -> bool:
+    if operator == '$eq':
+        return value == operand
+    if operator == '$ne':
+        return value != operand
+    if operator == '$gt':
+        return float(value) > float(operand)
+    if operator == '$gte':
+        return float(value) >= float(operand)
+    if operator == '$lt':
+        return float(value) < float(operand)
+    if operator == '$lte':
+        return float(value) <= float(operand)
+    raise ValueError(f'Unsupported operator: {operator}')
+
+
+def _matches_filter(value: Any, expected: Any) -> bool:
+    """Compares an item value to a search filter value, like JSONB."""
+    if isinstance(expected, dict):
+        if any(key.startswith('$') for key in expected):
+            return all(
+                _apply_operator(value, operator, operand)
+                for operator, operand in expected.items()
+            )
+        return isinstance(value, dict) and all(
+            _matches_filter(value.get(key), item)
+            for key, item in expected.items()
+        )
+    if isinstance(expected, (list, tuple)):
+        return (
+            isinstance(value, (list, tuple))
+            and len(value) == len(expected)
+            and all(map(_matches_filter, value, expected))
+        )
+    return value == expected
+
+
+def _matches_namespace(
+    condition: MatchCondition, namespace: Namespace,
+) -> bool:
+    """Whether a namespace matches a prefix or suffix condition."""
+    path = condition.path
+    if len(namespace) < len(path):
+        return False
+    if condition.match_type == 'prefix':
+        pairs = zip(namespace, path)
+    elif condition.match_type == 'suffix':
+        pairs = zip(reversed(namespace), reversed(path))
+    else:
+        raise ValueError(f'Unsupported match type: {condition.match_type}')
+    # '*' matches any element
+    return all(part == '*' or element == part for element, part in pairs)
+
+
+def _search_item(item: Item, score: Optional[float] = None) -> SearchItem:
+    return SearchItem(
+        namespace=item.namespace, key=item.key, value=item.value,
+        created_at=item.created_at, updated_at=item.updated_at, score=score,
+    )
+
+
+_memory_store: Optional[BaseStore] = None
+_memory_store_lock = threading.Lock()
+
+
+def get_memory_store(path: str = MEMORY_STORE_PATH) -> BaseStore:
+    """
+    Returns the process-wide long-term memory store shared by the main
+    graph and the Gmail agent, opening it on first use.
+    """
+    global _memory_store
+    with _memory_store_lock:
+        if _memory_store is None:
+            from llm import get_embeddings
+
+            embeddings = get_embeddings()
+            index: IndexConfig = {
+                'embed': embeddings, 'dims': embeddings.dimensions or 1536,
+            }
+            if path:
+                store = NumpyVectorStore(path, index=index)
+                register_stats('memory_store', store.stats)
+                register_stats(
+                    'embedding_cache', store.embedding_cache.stats,
+                )
+                _memory_store = store
+            else:
+                _memory_store = InMemoryStore(index=index)
+        return _memory_store
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
 import chainlit as cl
-from agent.main_graph import graph as ai_assistant
+from agent.main_graph import get_graph
+from agent.shared.concurrency import run_blocking
 from agent.shared.get_credentials import get_credentials
+from agent.shared.tracing import tracing_callbacks
 from agent.shared.utils import read_personal_info
 from dateutil import parser
 from langchain.schema.runnable.config import RunnableConfig
@@ -10,6 +12,18 @@ from langchain_core.messages import HumanMessage
 from langgraph.types import Command
 
 
+# Nodes, in the main graph and in the agents, whose LLM tokens are shown
+STREAMED_NODES = {'chatbot', 'normal_chatbot'}
+
+# Progress shown to the user while a tool runs
+TOOL_PROGRESS = {
+    'fetch_inbox_messages': 'Checking your inbox',
+    'get_email_details': 'Reading the email',
+    'search_emails': 'Searching your emails',
+    'get_next_n_calendar_events': 'Looking at your calendar',
+}
+
+
 @cl.password_auth_callback
 def auth_callback(username: str, password: str):
     # Fetch the user matching username from your database
@@ -53,7 +67,7 @@ async def get_credentials_from_user():
                     'How can I help you today?'
                 ),
             ).send()
-            get_credentials()
+            await run_blocking(get_credentials)
         else:
             await cl.Message(content='❌ You cancelled your request.').send()
 
@@ -112,10 +126,10 @@ def creat_send_email_confirmation(tool_call_arg):
     )
 
 
-def handle_msg_confirmation(data):
-    """Handle tool call confirmation messages."""
-    tool_call_arg = data.value['tool_call']['args']
-    tool_name = data.value['tool_call']['name']
+def create_tool_confirmation(tool_call):
+    """Create the confirmation message of one sensitive tool call."""
+    tool_call_arg = tool_call['args']
+    tool_name = tool_call['name']
 
     if tool_name == 'delete_calendar_event':
         return create_delete_confirmation(tool_call_arg['calendar_name'])
@@ -125,23 +139,145 @@ def handle_msg_confirmation(data):
         return creat_send_email_confirmation(tool_call_arg)
 
 
+def handle_msg_confirmation(data):
+    """Handle tool call confirmation messages."""
+    tool_calls = data.value.get('tool_calls') or [data.value['tool_call']]
+    confirmations = [
+        create_tool_confirmation(tool_call) for tool_call in tool_calls
+    ]
+    if len(confirmations) == 1:
+        return confirmations[0]
+    # A single answer reviews all calls of the message at once
+    return '\n\n---\n\n'.join(
+        [
+            f'🔎 **{len(confirmations)} actions need your confirmation.** '
+            '**Approve** applies to all of them.',
+        ] + [confirmation or '' for confirmation in confirmations],
+    )
+
+
+def format_tool_progress(update):
+    """Create progress lines for the safe tool calls in a node update."""
+    lines = []
+    for node_update in update.values():
+        if not isinstance(node_update, dict):
+            continue
+        messages = node_update.get('messages', [])
+        if not isinstance(messages, list):
+            messages = [messages]
+        for message in messages:
+            for tool_call in getattr(message, 'tool_calls', None) or []:
+                label = TOOL_PROGRESS.get(tool_call['name'])
+                if label:
+                    lines.append(f'_🔧 {label}…_\n\n')
+    return lines
+
+
+class AnswerStream:
+    """
+    Writes the replies of the agents to a single message.
+
+    Agents dispatched together run concurrently, so their tokens arrive
+    interleaved. The first agent to produce output is streamed live; the
+    output of the others is buffered per agent and written as one block
+    once the live agent is done.
+    """
+
+    def __init__(self, final_answer):
+        self.final_answer = final_answer
+        self.live = None
+        self.buffers = {}
+        self.finished = set()
+        # Agent: id of its last streamed LLM message, None after a tool line
+        self.message_ids = {}
+
+    async def _write(self, agent, text):
+        if self.live is None:
+            self.live = agent
+        if agent == self.live:
+            await self.final_answer.stream_token(text)
+        else:
+            self.buffers.setdefault(agent, []).append(text)
+
+    async def token(self, agent, message_id, token):
+        # Separate the replies of successive LLM calls
+        if self.message_ids.get(agent) not in (None, message_id):
+            await self._write(agent, '\n\n')
+        self.message_ids[agent] = message_id
+        await self._write(agent, token)
+
+    async def line(self, agent, line):
+        if self.message_ids.get(agent) is not None:
+            await self._write(agent, '\n\n')
+            self.message_ids[agent] = None
+        await self._write(agent, line)
+
+    async def finish(self, agent):
+        """Marks an agent as done and hands the live stream to the next."""
+        if agent != self.live:
+            if agent in self.buffers:
+                self.finished.add(agent)
+            return
+        self.live = None
+        while self.buffers:
+            agent = next(iter(self.buffers))
+            chunks = self.buffers.pop(agent)
+            if self.final_answer.content:
+                await self.final_answer.stream_token('\n\n')
+            await self.final_answer.stream_token(''.join(chunks))
+            if agent not in self.finished:
+                # Still running: the rest of its reply is streamed live
+                self.live = agent
+                return
+            self.finished.discard(agent)
+
+    async def close(self):
+        """Writes the output still buffered."""
+        for agent in list(self.buffers):
+            self.finished.add(agent)
+        if self.live is None:
+            self.live = next(iter(self.buffers), None)
+        await self.finish(self.live)
+
+
+def stream_agent(namespace):
+    """Returns the main graph node a streamed event comes from."""
+    return namespace[0].split(':')[0] if namespace else ''
+
+
 async def process_stream_data(stream_data, final_answer):
     """Process stream data and update final answer."""
-    for node, stream_mode, data in stream_data:
+    answer = AnswerStream(final_answer)
+    async for node, stream_mode, data in stream_data:
         if stream_mode == 'messages':
             msg, metadata = data
             if (
                 msg.content and
                 not isinstance(msg, HumanMessage) and
-                    (
-                        metadata['langgraph_node'] ==
-                        'chatbot' or metadata['langgraph_node'] == 'normal_chatbot'
-                )
+                metadata['langgraph_node'] in STREAMED_NODES
             ):
-                await final_answer.stream_token(msg.content)
+                await answer.token(stream_agent(node), msg.id, msg.content)
+
+        elif stream_mode == 'updates' and '__interrupt__' not in data:
+            # Tool calls made by the agents, shown while the tools run
+            for line in format_tool_progress(data):
+                await answer.line(stream_agent(node), line)
+            if not node:
+                # A main graph node, such as an agent, has finished
+                for name in data:
+                    await answer.finish(name)
 
         elif stream_mode == 'updates' and '__interrupt__' in data:
-            confirm_msg = handle_msg_confirmation(data['__interrupt__'][0])
+            interrupt_value = data['__interrupt__'][0]
+            confirm_msg = handle_msg_confirmation(interrupt_value)
+            # The answer only reviews the calls shown, even when both
+            # agents wait for a review at the same time
+            cl.user_session.set(
+                'reviewed_tool_calls', [
+                    tool_call['id'] for tool_call in
+                    interrupt_value.value.get('tool_calls') or []
+                ],
+            )
             actions = [
                 cl.Action(
                     name='approve',
@@ -152,6 +288,7 @@ async def process_stream_data(stream_data, final_answer):
             ]
             await cl.Message(confirm_msg, actions=actions).send()
 
+    await answer.close()
     if final_answer.content:
         await final_answer.send()
 
@@ -164,9 +301,12 @@ async def on_message(msg: cl.Message):
         'configurable': {
             'thread_id': cl.context.session.id, 'user_id': 'hhm',
         },
+        'callbacks': tracing_callbacks(),
     }
     final_answer = cl.Message(content='')
-    snapshot = ai_assistant.get_state(config)
+    # Compiled on the first message, off the event loop
+    ai_assistant = await run_blocking(get_graph)
+    snapshot = await ai_assistant.aget_state(config)
 
     # If there's a pending operation waiting for input
     if snapshot.next:
@@ -175,8 +315,11 @@ async def on_message(msg: cl.Message):
             if msg.content.lower() == 'approve'
             else {'action': 'feedback', 'data': msg.content}
         )
+        reviewed_tool_calls = cl.user_session.get('reviewed_tool_calls')
+        if reviewed_tool_calls:
+            action['tool_call_ids'] = reviewed_tool_calls
 
-        stream_data = ai_assistant.stream(
+        stream_data = ai_assistant.astream(
             Command(resume=action),
             config=RunnableConfig(**config),
             stream_mode=['updates', 'messages'],
@@ -186,7 +329,7 @@ async def on_message(msg: cl.Message):
 
     # Initial message flow
     else:
-        stream_data = ai_assistant.stream(
+        stream_data = ai_assistant.astream(
             {'messages': [HumanMessage(content=msg.content)]},
             stream_mode=['updates', 'messages'],
             config=RunnableConfig(**config),
@@ -1,15 +1,109 @@
 from __future__ import annotations
 
+import functools
+import logging
 import os
+import threading
+from typing import Any
+from typing import Optional
+from typing import TYPE_CHECKING
 
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
+from langchain_core.runnables import Runnable
 load_dotenv()
 
-model = AzureChatOpenAI(
-    azure_deployment=os.getenv('AZURE_DEPLOYMENT_NAME', ''),
-    api_version=os.getenv('AZURE_OPENAI_API_VERSION', ''),
-    temperature=0.5,
-    max_tokens=4096,
-    # other params...
-)
+if TYPE_CHECKING:
+    from langchain_openai import AzureChatOpenAI
+    from langchain_openai import AzureOpenAIEmbeddings
+
+# Nodes whose structured LLM calls are answered from the response cache.
+# Only nodes without side effects whose output is not streamed qualify.
+LLM_CACHED_NODES = {
+    node.strip()
+    for node in os.getenv(
+        'LLM_CACHED_NODES', 'classifier,router,supervisor',
+    ).split(',')
+    if node.strip()
+}
+# Nodes that stream text or call tools; they are never cached
+UNCACHEABLE_NODES = {
+    'normal_chatbot', 'chatbot', 'calendar_agent', 'gmail_agent',
+}
+
+
+_model: Optional[AzureChatOpenAI] = None
+_embeddings: Optional[AzureOpenAIEmbeddings] = None
+_clients_lock = threading.Lock()
+
+
+def get_model() -> AzureChatOpenAI:
+    """Returns the chat model, importing `langchain_openai` on first use."""
+    global _model
+    with _clients_lock:
+        if _model is None:
+            from langchain_openai import AzureChatOpenAI
+
+            _model = AzureChatOpenAI(
+                azure_deployment=os.getenv('AZURE_DEPLOYMENT_NAME', ''),
+                api_version=os.getenv('AZURE_OPENAI_API_VERSION', ''),
+                temperature=0.5,
+                max_tokens=4096,
+                # other params...
+            )
+        return _model
+
+
+def get_embeddings() -> AzureOpenAIEmbeddings:
+    """Returns the embeddings client, creating it on first use."""
+    global _embeddings
+    with _clients_lock:
+        if _embeddings is None:
+            from langchain_openai import AzureOpenAIEmbeddings
+
+            _embeddings = AzureOpenAIEmbeddings(
+                model='text-embedding-3-large',
+                dimensions=1536,
+            )
+        return _embeddings
+
+
+def __getattr__(name: str) -> Any:
+    # `model` and `embeddings` stay importable, but are only created when
+    # first accessed
+    if name == 'model':
+        return get_model()
+    if name == 'embeddings':
+        return get_embeddings()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+@functools.lru_cache(maxsize=None)
+def structured_llm(schema: Any, node: str) -> Runnable:
+    """
+    Returns the chat model bound to a structured output schema for a graph
+    node. The runnable is built on the first call and reused afterwards.
+
+    When the node is listed in `LLM_CACHED_NODES`, identical prompts are
+    answered from the persistent response cache instead of calling Azure.
+
+    Args:
+        schema (Any): The pydantic model or TypedDict of the output.
+        node (str): The calling node, used to opt in and for the hit ratios.
+
+    Returns:
+        Runnable: The structured output runnable, cached or not.
+    """
+    model = get_model()
+    runnable = model.with_structured_output(schema)
+    if node not in LLM_CACHED_NODES:
+        return runnable
+    if node in UNCACHEABLE_NODES:
+        logging.warning(f'Not caching the LLM responses of {node}')
+        return runnable
+
+    from agent.shared.llm_cache import CachedStructuredOutput
+    from agent.shared.llm_cache import get_llm_cache
+
+    return CachedStructuredOutput(
+        runnable, schema, node, model.deployment_name or '', get_llm_cache(),
+    )
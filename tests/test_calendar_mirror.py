@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Set
+
+import httplib2
+import pytest
+from agent.calendar_agent.tools.mirror import CalendarMirror
+from googleapiclient.errors import HttpError
+
+CALENDARS = [
+    {'id': 'work', 'summary': 'Work'},
+    {'id': 'home', 'summary': 'Home'},
+]
+
+
+def event(event_id: str, hour: int = 10, **fields: Any) -> Dict[str, Any]:
+    return {
+        'id': event_id,
+        'start': {'dateTime': f'2030-01-01T{hour:02}:00:00Z'},
+        'end': {'dateTime': f'2030-01-01T{hour + 1:02}:00:00Z'},
+        'summary': event_id,
+        **fields,
+    }
+
+
+class FakeRequest:
+    def __init__(self, response: Any) -> None:
+        self.response = response
+
+    def execute(self) -> Any:
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+class FakeCalendarService:
+    """
+    Answers `events().list()` like the Calendar API: a full listing without
+    a sync token, the pending changes with one, and 410 Gone for expired
+    tokens.
+    """
+
+    def __init__(self) -> None:
+        self.listings: Dict[str, List[Dict[str, Any]]] = {}
+        self.changes: Dict[str, List[Dict[str, Any]]] = {}
+        self.expired: Set[str] = set()
+        self.failing: Set[str] = set()
+        self.requests: List[Dict[str, Any]] = []
+
+    def events(self) -> FakeCalendarService:
+        return self
+
+    def list(self, **params: Any) -> FakeRequest:
+        self.requests.append(params)
+        calendar_id = params['calendarId']
+        token = params.get('syncToken')
+        if calendar_id in self.failing:
+            return FakeRequest(
+                HttpError(httplib2.Response({'status': 500}), b'Error'),
+            )
+        if token in self.expired:
+            return FakeRequest(
+                HttpError(httplib2.Response({'status': 410}), b'Gone'),
+            )
+        if token:
+            items = self.changes.pop(calendar_id, [])
+        else:
+            items = self.listings.get(calendar_id, [])
+        return FakeRequest(
+            {'items': items, 'nextSyncToken': f'{calendar_id}-{len(items)}'},
+        )
+
+
+@pytest.fixture
+def mirror(tmp_path: Any) -> CalendarMirror:
+    return CalendarMirror(str(tmp_path / 'calendar.db'), max_age=0)
+
+
+@pytest.fixture
+def service() -> FakeCalendarService:
+    service = FakeCalendarService()
+    service.listings = {
+        'work': [event('standup', 9), event('review', 14)],
+        'home': [event('dinner', 19)],
+    }
+    return service
+
+
+def summaries(mirror: CalendarMirror) -> List[str]:
+    return [e['summary'] for e in mirror.upcoming_events(CALENDARS, 0)]
+
+
+def test_full_sync_then_incremental_sync(
+    mirror: CalendarMirror, service: FakeCalendarService,
+) -> None:
+    assert mirror.sync(service, CALENDARS) == []
+    assert all('timeMax' in request for request in service.requests)
+    assert summaries(mirror) == ['standup', 'review', 'dinner']
+
+    service.requests.clear()
+    service.changes['work'] = [
+        {'id': 'standup', 'status': 'cancelled'},
+        event('lunch', 12),
+    ]
+    assert mirror.sync(service, CALENDARS) == []
+    assert [request.get('syncToken') for request in service.requests] == [
+        'work-2', 'home-1',
+    ]
+    assert summaries(mirror) == ['lunch', 'review', 'dinner']
+
+
+def test_expired_sync_token_runs_a_full_sync(
+    mirror: CalendarMirror, service: FakeCalendarService,
+) -> None:
+    mirror.sync(service, CALENDARS[:1])
+    service.expired.add('work-2')
+    service.listings['work'] = [event('planning', 11)]
+
+    service.requests.clear()
+    assert mirror.sync(service, CALENDARS[:1]) == []
+    assert service.requests[0]['syncToken'] == 'work-2'
+    assert 'syncToken' not in service.requests[1]
+    # The events the full listing no longer has are gone
+    assert summaries(mirror) == ['planning']
+
+    # and the new token is used from then on
+    service.requests.clear()
+    mirror.sync(service, CALENDARS[:1])
+    assert service.requests[0]['syncToken'] == 'work-1'
+
+
+def test_failed_calendars_are_reported(
+    mirror: CalendarMirror, service: FakeCalendarService,
+) -> None:
+    mirror.sync(service, CALENDARS)
+    service.failing.add('home')
+
+    assert mirror.sync(service, CALENDARS) == ['Home']
+    # What was mirrored before stays readable
+    assert summaries(mirror) == ['standup', 'review', 'dinner']
+
+
+def test_removed_calendars_are_dropped(
+    mirror: CalendarMirror, service: FakeCalendarService,
+) -> None:
+    mirror.sync(service, CALENDARS)
+
+    service.requests.clear()
+    mirror.sync(service, CALENDARS[:1], calendar_list=CALENDARS[:1])
+    assert summaries(mirror) == ['standup', 'review']
+
+    # Its sync token went with it, so it is fully synced if it comes back
+    mirror.sync(service, CALENDARS, calendar_list=CALENDARS)
+    home = [r for r in service.requests if r['calendarId'] == 'home']
+    assert 'syncToken' not in home[0]
+
+
+def test_recently_synced_calendars_are_skipped_until_marked_stale(
+    tmp_path: Any, service: FakeCalendarService,
+) -> None:
+    mirror = CalendarMirror(str(tmp_path / 'calendar.db'), max_age=3600)
+    mirror.sync(service, CALENDARS)
+
+    service.requests.clear()
+    mirror.sync(service, CALENDARS)
+    assert service.requests == []
+
+    service.changes['home'] = [event('party', 20)]
+    mirror.mark_stale('home')
+    mirror.sync(service, CALENDARS)
+    assert service.requests == [
+        {
+            'calendarId': 'home', 'singleEvents': True,
+            'maxResults': 2500, 'syncToken': 'home-1',
+        },
+    ]
+    assert summaries(mirror) == ['standup', 'review', 'dinner', 'party']
+
+
+def test_events_are_kept_per_user(
+    mirror: CalendarMirror, service: FakeCalendarService,
+) -> None:
+    mirror.sync(service, CALENDARS, user='alice')
+    assert mirror.upcoming_events(CALENDARS, 0, user='bob') == []
+    assert len(mirror.upcoming_events(CALENDARS, 0, user='alice')) == 3
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from typing import Any
+from typing import Dict
+
+import pytest
+from agent.shared.checkpointer import SQLiteCheckpointer
+from langchain_core.messages import AIMessage
+from langchain_core.messages import HumanMessage
+from langgraph.graph import END
+from langgraph.graph import MessagesState
+from langgraph.graph import START
+from langgraph.graph import StateGraph
+from langgraph.types import Command
+from langgraph.types import interrupt
+
+CONFIG: Dict[str, Any] = {'configurable': {'thread_id': 'thread'}}
+
+
+def confirm(state: MessagesState) -> Dict[str, Any]:
+    answer = interrupt('Confirm?')
+    return {'messages': [AIMessage(content=f'Confirmed: {answer}')]}
+
+
+def build(saver: SQLiteCheckpointer) -> Any:
+    builder = StateGraph(MessagesState)
+    builder.add_node('confirm', confirm)
+    builder.add_edge(START, 'confirm')
+    builder.add_edge('confirm', END)
+    return builder.compile(checkpointer=saver)
+
+
+def count(path: str, table: str) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+@pytest.fixture
+def path(tmp_path: Any) -> str:
+    return str(tmp_path / 'checkpoints.db')
+
+
+def test_interrupted_thread_survives_a_restart(path: str) -> None:
+    saver = SQLiteCheckpointer(path)
+    graph = build(saver)
+    graph.invoke({'messages': [HumanMessage(content='Send it')]}, CONFIG)
+    saver.close()
+
+    saver = SQLiteCheckpointer(path)
+    graph = build(saver)
+    state = graph.get_state(CONFIG)
+    assert state.next == ('confirm',)
+    assert state.values['messages'][0].content == 'Send it'
+
+    result = graph.invoke(Command(resume='yes'), CONFIG)
+    assert result['messages'][-1].content == 'Confirmed: yes'
+    assert not graph.get_state(CONFIG).next
+    saver.close()
+
+
+def test_async_api_round_trip(path: str) -> None:
+    async def run() -> None:
+        saver = SQLiteCheckpointer(path)
+        graph = build(saver)
+        await graph.ainvoke(
+            {'messages': [HumanMessage(content='Send it')]}, CONFIG,
+        )
+        await graph.ainvoke(Command(resume='yes'), CONFIG)
+        state = await graph.aget_state(CONFIG)
+        assert [m.content for m in state.values['messages']] == [
+            'Send it', 'Confirmed: yes',
+        ]
+        history = [item async for item in saver.alist(CONFIG)]
+        assert history[0].checkpoint['id'] == (
+            state.config['configurable']['checkpoint_id']
+        )
+
+        await saver.adelete_thread('thread')
+        assert await saver.aget_tuple(CONFIG) is None
+        saver.close()
+
+    asyncio.run(run())
+
+
+def test_compaction_keeps_the_latest_checkpoints(path: str) -> None:
+    saver = SQLiteCheckpointer(path)
+    graph = build(saver)
+    other = {'configurable': {'thread_id': 'other'}}
+    graph.invoke({'messages': [HumanMessage(content='Other')]}, other)
+    for i in range(4):
+        graph.invoke({'messages': [HumanMessage(content=f'{i}')]}, CONFIG)
+        graph.invoke(Command(resume=i), CONFIG)
+    state = graph.get_state(CONFIG)
+    assert len(list(saver.list(CONFIG))) > 3
+    other_checkpoints = len(list(saver.list(other)))
+    assert other_checkpoints <= 3
+    writes = count(path, 'writes')
+
+    saver.compact(3)
+    assert len(list(saver.list(CONFIG))) == 3
+    assert len(list(saver.list(other))) == other_checkpoints
+    assert count(path, 'writes') < writes
+    assert graph.get_state(CONFIG).values == state.values
+    # The pending interrupt of the other thread is intact
+    result = graph.invoke(Command(resume='later'), other)
+    assert result['messages'][-1].content == 'Confirmed: later'
+    saver.close()
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+from typing import List
+
+import pytest
+from agent.shared.context import ContextWindow
+from agent.shared.context import SUMMARY_HEADER
+from agent.shared.context import turn_boundaries
+from langchain_core.messages import AIMessage
+from langchain_core.messages import BaseMessage
+from langchain_core.messages import HumanMessage
+from langchain_core.messages import SystemMessage
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+SYSTEM_PROMPT = 'You are a helpful assistant.'
+
+
+def history(turns: int, start: int = 0) -> List[BaseMessage]:
+    messages: List[BaseMessage] = []
+    for i in range(start, start + turns):
+        messages += [
+            HumanMessage(content=f'Question {i} ' + 'word ' * 40, id=f'h{i}'),
+            AIMessage(content=f'Answer {i} ' + 'word ' * 40, id=f'a{i}'),
+        ]
+    return messages
+
+
+def tokens(window: ContextWindow, messages: List[BaseMessage]) -> int:
+    return window.tokens.text(SYSTEM_PROMPT) + sum(
+        window.tokens.message(message) for message in messages
+    )
+
+
+def fit(window: ContextWindow, messages: List[BaseMessage]) -> Any:
+    return asyncio.run(window.fit(messages, SYSTEM_PROMPT, name='chatbot'))
+
+
+class Summarizer:
+    """Answers summary requests in turn, recording their prompts."""
+
+    def __init__(self) -> None:
+        self.prompts: List[List[BaseMessage]] = []
+        self.model = RunnableLambda(self.summarize)
+
+    def summarize(self, prompt: List[BaseMessage]) -> AIMessage:
+        self.prompts.append(prompt)
+        return AIMessage(content=f'Summary {len(self.prompts)}')
+
+
+@pytest.fixture
+def summarizer() -> Summarizer:
+    return Summarizer()
+
+
+def test_history_within_budget_is_sent_unchanged(
+    summarizer: Summarizer,
+) -> None:
+    window = ContextWindow(summarizer.model, 'Summarize', budget=100000)
+    messages = history(3)
+    assert fit(window, messages) == messages
+    assert summarizer.prompts == []
+    assert window.stats()['tokens_saved'] == 0
+
+
+def test_old_turns_are_folded_into_a_summary(
+    summarizer: Summarizer,
+) -> None:
+    messages = history(10)
+    window = ContextWindow(summarizer.model, 'Summarize', budget=1)
+    window.budget = tokens(window, messages) // 2
+
+    sent = fit(window, messages)
+    assert isinstance(sent[0], SystemMessage)
+    assert sent[0].content == SUMMARY_HEADER + 'Summary 1'
+    recent = sent[1:]
+    assert recent == messages[-len(recent):]
+    assert tokens(window, sent) <= window.budget
+
+    # A longer history finds the summary again instead of rebuilding it
+    messages += history(1, start=10)
+    assert fit(window, messages)[0].content == SUMMARY_HEADER + 'Summary 1'
+    assert len(summarizer.prompts) == 1
+
+    stats = window.stats()
+    assert stats['calls'] == stats['chatbot.calls'] == 2
+    assert stats['summaries'] == 1
+    assert 0 < stats['saved_ratio'] < 1
+
+
+def test_summary_is_extended_once_the_recent_turns_outgrow_the_budget(
+    summarizer: Summarizer,
+) -> None:
+    messages = history(10)
+    window = ContextWindow(summarizer.model, 'Summarize', budget=1)
+    window.budget = tokens(window, messages) // 2
+    fit(window, messages)
+
+    messages += history(10, start=10)
+    sent = fit(window, messages)
+    assert sent[0].content == SUMMARY_HEADER + 'Summary 2'
+    # The new turns are folded into the existing summary
+    assert 'Current summary:\nSummary 1' in summarizer.prompts[1][1].content
+    assert tokens(window, sent) <= window.budget
+
+
+def test_tool_results_stay_with_their_call() -> None:
+    messages: List[BaseMessage] = [
+        HumanMessage(content='Any mail?', id='h0'),
+        AIMessage(
+            content='', id='a0',
+            tool_calls=[{'name': 'inbox', 'args': {}, 'id': 'call'}],
+        ),
+        ToolMessage(content='word ' * 200, tool_call_id='call', id='t0'),
+        AIMessage(content='One message.', id='a1'),
+        HumanMessage(content='Thanks', id='h1'),
+    ]
+    assert turn_boundaries(messages) == [0, 1, 3, 4]
+
+    window = ContextWindow(
+        RunnableLambda(lambda prompt: AIMessage(content='Checked the inbox')),
+        'Summarize', budget=1,
+    )
+    window.budget = tokens(window, messages[3:]) + 60
+    sent = fit(window, messages)
+    assert not any(isinstance(message, ToolMessage) for message in sent)
+    assert sent[1:] == messages[3:]
+
+
+def test_turns_are_dropped_when_summarizing_fails() -> None:
+    def fail(prompt: Any) -> AIMessage:
+        raise RuntimeError('Summarizer unavailable')
+
+    messages = history(10)
+    window = ContextWindow(RunnableLambda(fail), 'Summarize', budget=1)
+    window.budget = tokens(window, messages) // 2
+
+    sent = fit(window, messages)
+    assert sent == messages[-len(sent):]
+    assert tokens(window, sent) <= window.budget
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import pytest
+from agent.gmail_agent.tools.mirror import GmailMirror
+from agent.gmail_agent.tools.search import EmailSearchIndex
+from agent.gmail_agent.tools.search import RRF_K
+from agent.gmail_agent.tools.search import to_fts_query
+
+
+def message(
+    message_id: str, subject: str, snippet: str, date: int = 0,
+) -> Dict[str, Any]:
+    return {
+        'id': message_id,
+        'internalDate': str(date),
+        'snippet': snippet,
+        'payload': {
+            'headers': [
+                {'name': 'Subject', 'value': subject},
+                {'name': 'From', 'value': 'someone@example.com'},
+            ],
+        },
+    }
+
+
+class FakeEmbeddings:
+    """Embeds each message to a fixed vector looked up by its subject."""
+
+    def __init__(self, vectors: Dict[str, List[float]]) -> None:
+        self.vectors = vectors
+        self.embedded: List[str] = []
+
+    def documents(self, texts: List[str]) -> List[List[float]]:
+        subjects = [text.split('\n')[0][len('Subject: '):] for text in texts]
+        self.embedded.extend(subjects)
+        return [self.vectors[subject] for subject in subjects]
+
+    def query(self, text: str) -> List[float]:
+        return self.vectors[text]
+
+
+@pytest.fixture
+def mirror(tmp_path: Any) -> GmailMirror:
+    mirror = GmailMirror(str(tmp_path / 'gmail.db'))
+    mirror.store_message(message('a', 'Budget', 'numbers for the year', 3))
+    mirror.store_message(message('b', 'Notes', 'the budget is attached', 2))
+    mirror.store_message(message('c', 'Lunch', 'see you tomorrow', 1))
+    return mirror
+
+
+def index(
+    mirror: GmailMirror, embeddings: Optional[FakeEmbeddings] = None,
+) -> EmailSearchIndex:
+    return EmailSearchIndex(
+        mirror.path,
+        embed_documents=embeddings.documents if embeddings else None,
+        embed_query=embeddings.query if embeddings else None,
+    )
+
+
+def ids(hits: List[Dict[str, Any]]) -> List[str]:
+    return [hit['message_id'] for hit in hits]
+
+
+def test_fts_query_drops_stopwords_and_duplicates() -> None:
+    assert to_fts_query('Emails from the Budget budget team') == (
+        '"budget" OR "team"'
+    )
+    assert to_fts_query('my emails') == ''
+
+
+def test_keyword_search_weights_the_subject(mirror: GmailMirror) -> None:
+    search = index(mirror)
+    assert ids(search.search('budget')) == ['a', 'b']
+    assert search.search('') == []
+    assert search.search('budget', user='someone else') == []
+
+
+def test_keyword_index_follows_the_mirror(mirror: GmailMirror) -> None:
+    search = index(mirror)
+    mirror.store_message(
+        message('c', 'Lunch', 'see you tomorrow'), body='Budget lunch',
+    )
+    assert sorted(ids(search.search('budget'))) == ['a', 'b', 'c']
+
+
+def test_rankings_are_fused(mirror: GmailMirror) -> None:
+    embeddings = FakeEmbeddings(
+        {
+            'Budget': [0.0, 1.0],
+            'Notes': [1.0, 0.0],
+            'Lunch': [0.8, 0.6],
+            'budget': [1.0, 0.0],
+        },
+    )
+    search = index(mirror, embeddings)
+    assert search.update_embeddings() == 3
+
+    # Keyword ranking a, b; vector ranking b, c, a
+    hits = search.search('budget')
+    assert ids(hits) == ['b', 'a', 'c']
+    scores = [hit['score'] for hit in hits]
+    assert scores == pytest.approx(
+        [
+            1 / (RRF_K + 2) + 1 / (RRF_K + 1),
+            1 / (RRF_K + 1) + 1 / (RRF_K + 3),
+            1 / (RRF_K + 2),
+        ],
+    )
+
+
+def test_embeddings_are_updated_incrementally(mirror: GmailMirror) -> None:
+    embeddings = FakeEmbeddings(
+        {
+            'Budget': [1.0, 0.0],
+            'Notes': [0.6, 0.8],
+            'Lunch': [0.0, 1.0],
+            'numbers': [1.0, 0.0],
+        },
+    )
+    search = index(mirror, embeddings)
+    assert search.update_embeddings() == 3
+    assert search.update_embeddings() == 0
+    assert ids(search.search('numbers')) == ['a', 'b', 'c']
+
+    # A body arriving later replaces the snippet's embedding
+    embeddings.vectors['Lunch'] = [0.8, 0.6]
+    mirror.store_message(
+        message('c', 'Lunch', 'see you tomorrow'), body='Full text',
+    )
+    embeddings.embedded.clear()
+    assert search.update_embeddings() == 1
+    assert embeddings.embedded == ['Lunch']
+    assert ids(search.search('numbers')) == ['a', 'c', 'b']
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Union
+
+import httplib2
+import pytest
+from agent.gmail_agent.tools import mirror as mirror_module
+from agent.gmail_agent.tools.mirror import GmailMirror
+from googleapiclient.errors import HttpError
+
+
+def message(
+    message_id: str, date: int, labels: Sequence[str] = ('INBOX',),
+) -> Dict[str, Any]:
+    return {
+        'id': message_id,
+        'threadId': message_id,
+        'internalDate': str(date),
+        'labelIds': list(labels),
+        'snippet': f'About {message_id}',
+        'payload': {
+            'headers': [
+                {'name': 'Subject', 'value': f'Subject {message_id}'},
+                {'name': 'From', 'value': 'someone@example.com'},
+                {'name': 'Date', 'value': 'Mon, 1 Jan 2030 10:00:00 +0000'},
+            ],
+        },
+    }
+
+
+class FakeRequest:
+    def __init__(self, response: Any) -> None:
+        self.response = response
+
+    def execute(self) -> Any:
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+class FakeGmailService:
+    """
+    Serves a mailbox like the Gmail API: the profile's history ID, pages of
+    message IDs, newest first, and the history records after an ID.
+    """
+
+    def __init__(self, page_size: int = 2) -> None:
+        self.page_size = page_size
+        self.mailbox: Dict[str, Dict[str, Any]] = {}
+        self.records: List[Dict[str, Any]] = []
+        self.history_expired = False
+
+    def users(self) -> FakeGmailService:
+        return self
+
+    def messages(self) -> FakeGmailService:
+        return self
+
+    def history(self) -> FakeGmailService:
+        return self
+
+    def getProfile(self, userId: str) -> FakeRequest:
+        return FakeRequest({'historyId': str(len(self.records))})
+
+    def list(self, **params: Any) -> FakeRequest:
+        if 'startHistoryId' in params:
+            if self.history_expired:
+                return FakeRequest(
+                    HttpError(httplib2.Response({'status': 404}), b''),
+                )
+            return FakeRequest(
+                {
+                    'history': self.records[int(params['startHistoryId']):],
+                    'historyId': str(len(self.records)),
+                },
+            )
+        newest = sorted(
+            self.mailbox.values(),
+            key=lambda m: int(m['internalDate']), reverse=True,
+        )
+        start = int(params.get('pageToken') or 0)
+        end = start + params['maxResults']
+        response: Dict[str, Any] = {
+            'messages': [{'id': m['id']} for m in newest[start:end]],
+        }
+        if end < len(newest):
+            response['nextPageToken'] = str(end)
+        return FakeRequest(response)
+
+    def get_many(
+        self, message_ids: Sequence[str],
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        return [
+            self.mailbox[message_id] if message_id in self.mailbox
+            else HttpError(httplib2.Response({'status': 404}), b'')
+            for message_id in message_ids
+        ]
+
+    def add(self, item: Dict[str, Any]) -> None:
+        self.mailbox[item['id']] = item
+        self.record(messagesAdded=[{'message': {'id': item['id']}}])
+
+    def delete(self, message_id: str) -> None:
+        del self.mailbox[message_id]
+        self.record(messagesDeleted=[{'message': {'id': message_id}}])
+
+    def relabel(self, message_id: str, labels: List[str]) -> None:
+        self.mailbox[message_id]['labelIds'] = labels
+        self.record(
+            labelsRemoved=[
+                {'message': {'id': message_id, 'labelIds': labels}},
+            ],
+        )
+
+    def record(self, **change: Any) -> None:
+        self.records.append({'id': str(len(self.records) + 1), **change})
+
+
+@pytest.fixture
+def service(monkeypatch: pytest.MonkeyPatch) -> FakeGmailService:
+    service = FakeGmailService()
+    for i in range(1, 6):
+        service.mailbox[f'm{i}'] = message(f'm{i}', i * 1000)
+    monkeypatch.setattr(
+        mirror_module, 'batch_get_messages',
+        lambda service, message_ids, **kwargs: service.get_many(message_ids),
+    )
+    return service
+
+
+@pytest.fixture
+def mirror(tmp_path: Any) -> GmailMirror:
+    return GmailMirror(str(tmp_path / 'gmail.db'), max_age=0, page_size=2)
+
+
+def inbox_ids(mirror: GmailMirror, limit: int = 10) -> List[str]:
+    return [m['message_id'] for m in mirror.inbox(limit)]
+
+
+def test_initial_sync_mirrors_the_newest_page(
+    mirror: GmailMirror, service: FakeGmailService,
+) -> None:
+    assert not mirror.has_synced()
+    mirror.sync(service)
+    assert mirror.has_synced()
+    assert inbox_ids(mirror) == ['m5', 'm4']
+    assert not mirror.is_complete(2, 3)
+
+    # Older mail is backfilled a page at a time
+    assert mirror.backfill(service)
+    assert not mirror.backfill(service)
+    assert inbox_ids(mirror) == ['m5', 'm4', 'm3', 'm2', 'm1']
+    assert not mirror.backfill(service)
+    assert mirror.is_complete(5, 10)
+
+
+def test_history_sync_applies_changes(
+    mirror: GmailMirror, service: FakeGmailService,
+) -> None:
+    mirror.sync(service)
+    service.add(message('m6', 6000))
+    service.delete('m5')
+    service.relabel('m4', ['ARCHIVED'])
+
+    mirror.sync(service)
+    assert inbox_ids(mirror) == ['m6']
+    assert mirror.message('m5') is None
+    assert mirror.message('m4')['subject'] == 'Subject m4'
+
+
+def test_added_then_deleted_message_is_not_fetched(
+    mirror: GmailMirror, service: FakeGmailService,
+) -> None:
+    mirror.sync(service)
+    service.add(message('m6', 6000))
+    service.delete('m6')
+
+    mirror.sync(service)
+    assert inbox_ids(mirror) == ['m5', 'm4']
+
+
+def test_expired_history_runs_a_full_sync(
+    mirror: GmailMirror, service: FakeGmailService,
+) -> None:
+    mirror.sync(service)
+    mirror.backfill(service)
+    service.mailbox.pop('m5')
+    service.mailbox['m7'] = message('m7', 7000)
+    service.history_expired = True
+
+    mirror.sync(service)
+    assert inbox_ids(mirror) == ['m7', 'm4']
+
+
+def test_sync_is_skipped_within_max_age(
+    tmp_path: Any, service: FakeGmailService,
+) -> None:
+    mirror = GmailMirror(str(tmp_path / 'gmail.db'), max_age=3600)
+    mirror.sync(service)
+    service.add(message('m6', 6000))
+
+    mirror.sync(service)
+    assert 'm6' not in inbox_ids(mirror)
+
+
+def test_stored_bodies_survive_metadata_updates(
+    mirror: GmailMirror, service: FakeGmailService,
+) -> None:
+    mirror.store_message(service.mailbox['m5'], body='Full text')
+    mirror.sync(service)
+    assert mirror.message('m5')['body'] == 'Full text'
+    assert mirror.message('m4')['body'] is None
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import pytest
+from agent.gmail_agent.tools.utils import html_to_text
+
+
+def words(html: str) -> str:
+    return ' '.join(html_to_text(html).split())
+
+
+@pytest.mark.parametrize(
+    ('html', 'expected'), [
+        (
+            '<html><head><meta charset=utf-8><title>T</title>'
+            '<body><p>Hello there</p></body></html>',
+            'Hello there',
+        ),
+        (
+            '<html><head><title>T</title></head>'
+            '<body><p>Hello there</p></body></html>',
+            'Hello there',
+        ),
+        ('<head><style>p {}</style><p>Hello there</p>', 'Hello there'),
+        ('<p>Hello</p><script>var x;</script><b>there</b>', 'Hello there'),
+    ],
+)
+def test_html_to_text_skips_head(html: str, expected: str) -> None:
+    assert words(html) == expected
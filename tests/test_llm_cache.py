@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+from typing import List
+
+import pytest
+from agent.shared.llm_cache import cache_key
+from agent.shared.llm_cache import CachedStructuredOutput
+from agent.shared.llm_cache import LLMResponseCache
+from langchain_core.messages import HumanMessage
+from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+
+class Route(BaseModel):
+    next: str
+
+
+@pytest.fixture
+def cache(tmp_path: Any) -> LLMResponseCache:
+    return LLMResponseCache(str(tmp_path / 'llm_cache.db'))
+
+
+def test_key_ignores_message_ids_and_whitespace() -> None:
+    first = [
+        SystemMessage(content='Route the message', id='1'),
+        HumanMessage(content='Check  my\ninbox', id='2'),
+    ]
+    second = [
+        SystemMessage(content='Route the message', id='3'),
+        HumanMessage(content='Check my inbox', id='4'),
+    ]
+    key = cache_key('gpt', 'Route', first)
+    assert key == cache_key('gpt', 'Route', second)
+    assert key != cache_key('gpt', 'Other', first)
+    assert key != cache_key('gpt', 'Route', first[1:])
+
+
+def test_hits_and_misses_are_counted_per_node(
+    cache: LLMResponseCache,
+) -> None:
+    assert cache.get('key', 'router') is None
+    cache.put('key', '{}', 'router')
+    assert cache.get('key', 'router') == '{}'
+    assert cache.get('key', 'classifier') == '{}'
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['entries'] == 1
+    assert stats['router.hit_ratio'] == 0.5
+    assert stats['classifier.hit_ratio'] == 1.0
+
+
+def test_expired_entries_are_misses(tmp_path: Any) -> None:
+    cache = LLMResponseCache(str(tmp_path / 'llm_cache.db'), ttl=-1)
+    cache.put('key', '{}')
+    assert cache.get('key') is None
+
+
+def test_least_recently_read_entries_are_evicted(tmp_path: Any) -> None:
+    path = str(tmp_path / 'llm_cache.db')
+    cache = LLMResponseCache(path)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, '{}')
+    cache.get('a')
+
+    # Eviction runs when the cache is opened and every few writes
+    cache = LLMResponseCache(path, max_entries=2)
+    assert cache.get('b') is None
+    assert cache.get('a') == '{}'
+    assert cache.get('c') == '{}'
+
+
+def test_structured_output_is_answered_from_the_cache(
+    cache: LLMResponseCache,
+) -> None:
+    calls: List[Any] = []
+
+    def route(messages: Any) -> Route:
+        calls.append(messages)
+        return Route(next='gmail_agent')
+
+    cached = CachedStructuredOutput(
+        RunnableLambda(route), Route, 'router', 'gpt', cache,
+    )
+    prompt = [HumanMessage(content='Check my inbox')]
+    assert cached.invoke(prompt) == Route(next='gmail_agent')
+    assert cached.invoke(prompt) == Route(next='gmail_agent')
+    assert asyncio.run(cached.ainvoke(prompt)) == Route(next='gmail_agent')
+    assert len(calls) == 1
+
+    cached.invoke([HumanMessage(content='Check my calendar')])
+    assert len(calls) == 2
+
+
+def test_failed_parses_are_not_cached(cache: LLMResponseCache) -> None:
+    calls: List[Any] = []
+
+    def route(messages: Any) -> None:
+        calls.append(messages)
+
+    cached = CachedStructuredOutput(
+        RunnableLambda(route), Route, 'router', 'gpt', cache,
+    )
+    cached.invoke('Check my inbox')
+    cached.invoke('Check my inbox')
+    assert len(calls) == 2
+    assert cache.stats()['entries'] == 0
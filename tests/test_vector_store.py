@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import re
+from typing import Any
+from typing import List
+from typing import Tuple
+
+import pytest
+from agent.shared.vector_store import NumpyVectorStore
+from langchain_core.embeddings import Embeddings
+from langgraph.store.base import BaseStore
+from langgraph.store.memory import InMemoryStore
+
+VOCABULARY = ['coffee', 'tea', 'flight', 'hotel', 'meeting', 'morning']
+
+MEMORIES = [
+    (('alice', 'memories'), '1', {'text': 'Likes coffee in the morning'}),
+    (('alice', 'memories'), '2', {'text': 'Prefers tea over coffee'}),
+    (('alice', 'memories'), '3', {'text': 'Flight to Paris, hotel booked'}),
+    (('alice', 'trips'), '4', {'text': 'Hotel near the meeting venue'}),
+    (('bob', 'memories'), '5', {'text': 'Morning meeting every Monday'}),
+]
+
+
+class FakeEmbeddings(Embeddings):
+    """Counts the words of a small vocabulary, recording what it embeds."""
+
+    def __init__(self) -> None:
+        self.embedded: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded.extend(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    @staticmethod
+    def _embed(text: str) -> List[float]:
+        words = re.findall(r'\w+', text.lower())
+        # The length keeps texts with the same known words apart
+        return [words.count(word) for word in VOCABULARY] + [len(words) / 10]
+
+
+def index(embeddings: Embeddings) -> Any:
+    return {
+        'embed': embeddings, 'dims': len(VOCABULARY) + 1, 'fields': ['text'],
+    }
+
+
+def fill(store: BaseStore) -> BaseStore:
+    for namespace, key, value in MEMORIES:
+        store.put(namespace, key, value)
+    return store
+
+
+def results(items: List[Any]) -> List[Tuple[Any, ...]]:
+    return [
+        (item.namespace, item.key, round(item.score or 0.0, 5))
+        for item in items
+    ]
+
+
+@pytest.fixture
+def embeddings() -> FakeEmbeddings:
+    return FakeEmbeddings()
+
+
+@pytest.fixture
+def store(tmp_path: Any, embeddings: FakeEmbeddings) -> NumpyVectorStore:
+    return NumpyVectorStore(str(tmp_path), index=index(embeddings))
+
+
+@pytest.mark.parametrize(
+    ('prefix', 'query', 'kwargs'), [
+        (('alice',), 'coffee', {}),
+        (('alice', 'memories'), 'hotel meeting', {}),
+        (('alice',), 'morning coffee', {'limit': 2}),
+        (('alice',), 'morning coffee', {'limit': 2, 'offset': 1}),
+        ((), 'meeting', {}),
+        (('alice',), 'coffee', {'filter': {'text': MEMORIES[1][2]['text']}}),
+        (('alice',), None, {}),
+    ],
+)
+def test_search_matches_the_in_memory_store(
+    store: NumpyVectorStore, embeddings: FakeEmbeddings, prefix: Any,
+    query: Any, kwargs: Any,
+) -> None:
+    expected = fill(InMemoryStore(index=index(embeddings)))
+    fill(store)
+    assert results(store.search(prefix, query=query, **kwargs)) == results(
+        expected.search(prefix, query=query, **kwargs),
+    )
+
+
+def test_list_namespaces_matches_the_in_memory_store(
+    store: NumpyVectorStore,
+) -> None:
+    expected = fill(InMemoryStore())
+    fill(store)
+    for kwargs in (
+        {}, {'prefix': ('alice',)}, {'suffix': ('memories',)},
+        {'max_depth': 1}, {'limit': 1, 'offset': 1},
+    ):
+        assert store.list_namespaces(**kwargs) == expected.list_namespaces(
+            **kwargs,
+        )
+
+
+def test_memories_survive_a_restart(
+    tmp_path: Any, store: NumpyVectorStore, embeddings: FakeEmbeddings,
+) -> None:
+    fill(store)
+    before = results(store.search(('alice',), query='coffee'))
+
+    embeddings.embedded.clear()
+    reopened = NumpyVectorStore(str(tmp_path), index=index(embeddings))
+    assert reopened.get(('alice', 'memories'), '2').value == MEMORIES[1][2]
+    assert results(reopened.search(('alice',), query='coffee')) == before
+    # The query's embedding came from the cache
+    assert embeddings.embedded == []
+
+
+def test_updates_and_deletes_replace_vectors(store: NumpyVectorStore) -> None:
+    fill(store)
+    store.put(('alice', 'memories'), '1', {'text': 'Drinks tea now'})
+    store.delete(('alice', 'memories'), '2')
+    store.put(('alice', 'memories'), '6', {'text': 'Flight home on Friday'})
+
+    stats = store.stats()
+    assert stats['items'] == 5
+    assert stats['vectors'] == 5
+    hits = store.search(('alice', 'memories'), query='tea')
+    assert [hit.key for hit in hits][0] == '1'
+    assert '2' not in [hit.key for hit in hits]
+
+
+def test_items_are_stored_without_an_index(tmp_path: Any) -> None:
+    store = fill(NumpyVectorStore(str(tmp_path)))
+    assert store.get(('bob', 'memories'), '5').value == MEMORIES[4][2]
+    items = store.search(('alice',))
+    assert [item.key for item in items] == ['1', '2', '3', '4']
+    assert all(item.score is None for item in items)